@@ -0,0 +1,259 @@
+"""
+Pagination helpers shared by the list views.
+
+CursorPaginationMixin adds an opt-in keyset ("cursor") mode to ListView:
+pages are fetched with ``WHERE (key, id) < (last key, last id) ORDER BY
+key DESC, id DESC LIMIT n + 1`` instead of OFFSET, and no COUNT(*) is
+run, so a page costs the same at any depth.
+
+CountedPaginator accepts a row count the view already has, e.g. from a
+summary aggregate, instead of issuing its own COUNT(*).
+
+CachedCountPaginator keeps the COUNT(*) of each filtered query in the
+shared cache until the next Sale or Product write, and answers for
+large unfiltered tables from the database's row estimate.
+"""
+import hashlib
+from django.core import signing
+from django.core.paginator import Paginator
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.http import Http404
+from django.utils.functional import cached_property
+from dashboard.cache import get_versioned
+
+
+# Unfiltered tables estimated to hold at least this many rows are not counted
+ESTIMATE_THRESHOLD = 10000
+
+
+class CountedPaginator(Paginator):
+    """Paginator that trusts a precomputed ``count`` when one is given"""
+    
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            # Shadows the cached_property so no COUNT(*) is issued
+            self.count = count
+
+
+def query_signature(queryset):
+    """
+    A digest of the SQL and parameters of ``queryset`` without its ordering.
+    
+    Filters that select the same rows give the same SQL however the query
+    string spelled them, so this serves as the normalized filter key.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    return hashlib.sha1(f'{sql}|{params!r}'.encode()).hexdigest()
+
+
+def estimate_row_count(model, using='default'):
+    """The number of rows in ``model``'s table according to the database, or None"""
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        elif connection.vendor == 'mysql':
+            cursor.execute('SELECT table_rows FROM information_schema.tables '
+                           'WHERE table_schema = DATABASE() AND table_name = %s', [model._meta.db_table])
+        elif connection.vendor == 'sqlite':
+            # Two lookups at the ends of the rowid b-tree; deleted rows make it an overestimate
+            cursor.execute(f'SELECT MAX(rowid) - MIN(rowid) + 1 FROM {table}')
+        else:
+            return None
+        row = cursor.fetchone()
+    # PostgreSQL reports -1 for tables that were never analysed
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator that does not run a COUNT(*) on every page.
+    
+    The count of a queryset is cached under its query_signature and the
+    data version (see dashboard.cache), so paging through one filtered
+    list counts it once. An unfiltered queryset over a table estimated at
+    ESTIMATE_THRESHOLD rows or more uses the estimate instead, since the
+    data version changes with every sale; ``count_is_estimate`` is then
+    True so templates can say "about".
+    
+    Estimates can run high: on SQLite the estimate is the span of rowids,
+    which still includes rows that were deleted. A table estimated past
+    the threshold is therefore checked to really hold that many rows (one
+    ``LIMIT 1 OFFSET`` lookup) and counted exactly if not; past the
+    threshold the estimate may stay above the true count.
+    """
+    count_is_estimate = False
+    
+    def _is_unfiltered(self, queryset):
+        query = queryset.query
+        return not query.where and not query.distinct and query.group_by is None and not query.is_sliced
+    
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return Paginator.count.func(self)
+        
+        if self._is_unfiltered(queryset):
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if (estimate is not None and estimate >= ESTIMATE_THRESHOLD
+                    and queryset.order_by()[ESTIMATE_THRESHOLD - 1:].exists()):
+                self.count_is_estimate = True
+                return estimate
+        return get_versioned(f'row-count:{query_signature(queryset)}', queryset.count)
+
+
+class CursorPage:
+    """A page of results with opaque tokens for its neighbours"""
+    
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None, query_params=None,
+                 cursor_param='cursor'):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.query_params = query_params
+        self.cursor_param = cursor_param
+    
+    def __iter__(self):
+        return iter(self.object_list)
+    
+    def __len__(self):
+        return len(self.object_list)
+    
+    def has_next(self):
+        return self.next_cursor is not None
+    
+    def has_previous(self):
+        return self.previous_cursor is not None
+    
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+    
+    def _query_with_cursor(self, cursor):
+        params = self.query_params.copy() if self.query_params is not None else None
+        if params is None:
+            return f'{self.cursor_param}={cursor}'
+        params.pop('page', None)
+        params[self.cursor_param] = cursor
+        return params.urlencode()
+    
+    @property
+    def next_query(self):
+        """Query string (without '?') for the next page, keeping the current filters"""
+        return self._query_with_cursor(self.next_cursor) if self.next_cursor else ''
+    
+    @property
+    def previous_query(self):
+        """Query string (without '?') for the previous page, keeping the current filters"""
+        return self._query_with_cursor(self.previous_cursor) if self.previous_cursor else ''
+
+
+class CursorPaginationMixin:
+    """
+    Opt-in keyset pagination for ListView.
+    
+    Enabled with ``?paginate=cursor`` (or by any request carrying a
+    cursor token), or for every request with ``cursor_pagination = True``.
+    ``cursor_ordering`` names a sort field and the tie-breaking primary
+    key, both descending, e.g. ``('-date_sold', '-id')``; the view's
+    queryset should have an index on that field.
+    """
+    cursor_pagination = False
+    cursor_ordering = None
+    cursor_param = 'cursor'
+    cursor_salt = 'cursor-pagination'
+    
+    def use_cursor_pagination(self):
+        params = self.request.GET
+        return (self.cursor_pagination
+                or params.get('paginate') == 'cursor'
+                or self.cursor_param in params)
+    
+    def paginate_queryset(self, queryset, page_size):
+        if not self.use_cursor_pagination():
+            return super().paginate_queryset(queryset, page_size)
+        
+        page = self.get_cursor_page(queryset, page_size)
+        return (None, page, page.object_list, page.has_other_pages())
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cursor_paginated'] = isinstance(context.get('page_obj'), CursorPage)
+        
+        # Query string switching between numbered and cursor pages, keeping the filters
+        params = self.request.GET.copy()
+        for name in ('page', 'paginate', self.cursor_param):
+            params.pop(name, None)
+        if not context['cursor_paginated']:
+            params['paginate'] = 'cursor'
+        context['pagination_toggle_query'] = params.urlencode()
+        return context
+    
+    def _cursor_fields(self):
+        key, pk = (name.lstrip('-') for name in self.cursor_ordering)
+        return key, pk
+    
+    def encode_cursor(self, obj, direction):
+        key, pk = self._cursor_fields()
+        field = obj._meta.get_field(key)
+        return signing.dumps(
+            [direction, field.value_to_string(obj), getattr(obj, pk)],
+            salt=self.cursor_salt,
+        )
+    
+    def decode_cursor(self, model, token):
+        try:
+            direction, value, pk_value = signing.loads(token, salt=self.cursor_salt)
+            key, _ = self._cursor_fields()
+            value = model._meta.get_field(key).to_python(value)
+        except (signing.BadSignature, ValueError, TypeError, ValidationError):
+            raise Http404("Invalid page cursor")
+        if direction not in ('next', 'prev'):
+            raise Http404("Invalid page cursor")
+        return direction, value, pk_value
+    
+    def get_cursor_page(self, queryset, page_size):
+        key, pk = self._cursor_fields()
+        token = self.request.GET.get(self.cursor_param)
+        direction = 'next'
+        
+        if token:
+            direction, value, pk_value = self.decode_cursor(queryset.model, token)
+            if direction == 'next':
+                # Rows after the cursor: key < value, or key == value and pk < pk_value.
+                # Written as a range on key so the key index bounds the scan.
+                queryset = queryset.filter(
+                    Q(**{f'{key}__lte': value}) & ~Q(**{key: value, f'{pk}__gte': pk_value}))
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{key}__gte': value}) & ~Q(**{key: value, f'{pk}__lte': pk_value}))
+        
+        if direction == 'next':
+            queryset = queryset.order_by(f'-{key}', f'-{pk}')
+        else:
+            queryset = queryset.order_by(key, pk)
+        
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if direction == 'prev':
+            rows.reverse()
+        
+        if direction == 'next':
+            has_next, has_previous = has_more, bool(token)
+        else:
+            has_next, has_previous = True, has_more
+        
+        return CursorPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], 'next') if rows and has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], 'prev') if rows and has_previous else None,
+            query_params=self.request.GET,
+            cursor_param=self.cursor_param,
+        )
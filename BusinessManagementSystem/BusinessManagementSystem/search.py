@@ -0,0 +1,74 @@
+"""
+Helpers shared by the SQLite FTS5 search indexes of the apps.
+
+The virtual tables themselves are created by migrations (and only where
+FTS5 is available), so callers check ``fts_table_exists`` and fall back
+to ``icontains`` filters when it returns False.
+
+The triggers that keep a table in sync live on the indexed model tables.
+SQLite drops them whenever a migration remakes one of those tables (as
+it does for most AlterField operations), so each app restores its
+triggers with ``restore_triggers`` after every migrate.
+"""
+import re
+from django.db import connections, transaction
+
+
+_existing_tables = {}
+
+
+def fts_table_exists(table, using='default'):
+    """Whether an FTS table exists on the given database (checked once per process)"""
+    connection = connections[using]
+    key = (using, str(connection.settings_dict['NAME']), table)
+    if key not in _existing_tables:
+        exists = False
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [table])
+                exists = cursor.fetchone() is not None
+        _existing_tables[key] = exists
+    return _existing_tables[key]
+
+
+def restore_triggers(table, triggers, rebuild, using='default'):
+    """
+    Recreate the missing ``triggers`` (name -> CREATE TRIGGER statement)
+    of an existing FTS ``table`` and refill it with the ``rebuild``
+    INSERT ... SELECT, since writes made without the triggers were not
+    indexed. Returns the names of the triggers recreated.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = {name for name, in cursor.fetchall()}
+        if table not in existing:
+            return []
+        missing = [name for name in triggers if name not in existing]
+        if missing:
+            with transaction.atomic(using=using):
+                for name in missing:
+                    cursor.execute(triggers[name])
+                cursor.execute(f'DELETE FROM {table}')
+                cursor.execute(rebuild)
+    return missing
+
+
+def prefix_match_expression(query):
+    """
+    Turn free text into an FTS5 MATCH expression.
+    
+    Each word becomes a quoted prefix term and all terms must match, so
+    user input can never inject FTS5 operators. Returns '' if the query
+    has no words.
+    """
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def phrase_match_expression(query):
+    """Quote free text as a single FTS5 phrase, e.g. for substring search on a trigram table"""
+    return '"{}"'.format(query.strip().replace('"', '""'))
@@ -84,10 +84,47 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Wait for concurrent writers instead of failing immediately
+            'timeout': 20,
+        },
+        'TEST': {
+            # File-backed so concurrent checkout tests see real SQLite locking
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'business-management-system',
+    },
+    # Shared between worker processes; holds the data version counter
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'TIMEOUT': 60 * 60,
+    },
+}
+
+# Cache alias used for dashboard KPIs and the data version counter
+DASHBOARD_CACHE_ALIAS = 'shared'
+
+# Seconds a cached KPI snapshot may live even if no write bumps the version
+DASHBOARD_KPI_TIMEOUT = 5 * 60
+
+# Seconds a cached report result may live; new sales are merged into it meanwhile
+REPORT_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Runs the tests against in-memory caches instead of the ones above
+TEST_RUNNER = 'BusinessManagementSystem.testing.LocalCacheTestRunner'
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -0,0 +1,34 @@
+"""
+Test runner that keeps the test suite off the deployment caches.
+
+The 'shared' cache is a file cache under BASE_DIR, and tests clear it to
+start from a known data version. Every alias is swapped for a private
+in-memory cache for the whole run, so a test run never wipes or fills the
+cache a running server is using.
+"""
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def local_caches():
+    """The configured cache aliases, each backed by its own in-memory cache"""
+    return {
+        alias: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': f'test-{alias}',
+            'TIMEOUT': config.get('TIMEOUT', 300),
+        }
+        for alias, config in settings.CACHES.items()
+    }
+
+
+class LocalCacheTestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_override = override_settings(CACHES=local_caches())
+        self.cache_override.enable()
+    
+    def teardown_test_environment(self, **kwargs):
+        self.cache_override.disable()
+        super().teardown_test_environment(**kwargs)
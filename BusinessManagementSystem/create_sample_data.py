@@ -15,7 +15,8 @@ django.setup()
 
 from django.contrib.auth.models import User
 from inventory.models import Product
-from sales.models import Sale
+from sales.models import Sale, DailySalesCumulative, DailySalesRollup, ProductSalesStats
+from reports.cache import bump_rewrite_version
 
 def create_sample_data():
     print("Creating sample data...")
@@ -140,14 +141,14 @@ def create_sample_data():
         available_products = [p for p in created_products if p.quantity > 0]
         if not available_products:
             break
-            
+        
         product = random.choice(available_products)
         
         # Random quantity (1-3, but not more than available stock)
         max_quantity = min(3, product.quantity)
         if max_quantity <= 0:
             continue
-            
+        
         quantity = random.randint(1, max_quantity)
         
         # Random customer
@@ -167,15 +168,22 @@ def create_sample_data():
             Sale.objects.filter(id=sale.id).update(date_sold=sale_date)
             
             print(f"Created sale: {product.name} x{quantity} - ${sale.total_cost}")
-            
+        
         except ValueError as e:
             print(f"Skipped sale for {product.name}: {e}")
             continue
     
+    # Backdated sales bypass Sale.save, so rebuild the aggregates from scratch
+    DailySalesRollup.rebuild()
+    DailySalesCumulative.rebuild()
+    ProductSalesStats.rebuild()
+    # ...and moved sales under cached report results
+    bump_rewrite_version()
+    
     print(f"\nSample data creation completed!")
     print(f"Total products: {Product.objects.count()}")
     print(f"Total sales: {Sale.objects.count()}")
-    print(f"Low stock products: {Product.objects.filter(quantity__lte=5).count()}")
+    print(f"Low stock products: {Product.needing_reorder().count()}")
 
 if __name__ == '__main__':
-    create_sample_data()
\ No newline at end of file
+    create_sample_data()
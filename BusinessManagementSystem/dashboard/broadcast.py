@@ -0,0 +1,60 @@
+"""
+In-process event broadcast for live dashboard updates.
+
+Each connected SSE client owns an asyncio queue on its event loop.
+Publishers (usually sync code running in a worker thread after a sale
+commits) hand events to every queue with ``call_soon_threadsafe``, so an
+idle client costs one waiting coroutine and no database queries.
+"""
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+
+
+class Broadcaster:
+    """Fan out events to every subscribed queue"""
+    
+    def __init__(self, max_queue_size=100):
+        self.max_queue_size = max_queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+    
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+    
+    @asynccontextmanager
+    async def subscribe(self):
+        """Register a queue on the running event loop for the duration of the block"""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=self.max_queue_size))
+        with self._lock:
+            self._subscribers.add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+    
+    def publish(self, event, **data):
+        """Send an event to every subscriber; safe to call from any thread"""
+        message = {'event': event, 'data': data}
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, message)
+            except RuntimeError:
+                # The subscriber's loop has already been closed
+                pass
+    
+    @staticmethod
+    def _deliver(queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Slow client: drop the oldest event rather than block publishers
+            queue.get_nowait()
+            queue.put_nowait(message)
+
+
+broadcaster = Broadcaster()
@@ -0,0 +1,76 @@
+"""
+Versioned caching for dashboard KPIs.
+
+Cache keys embed a data version counter that is bumped whenever a Sale
+or Product is written (see dashboard.signals). A bump makes every older
+entry unreachable, so repeat dashboard loads cost no aggregate queries
+until something actually changes. ``get_versioned`` applies the same
+scheme to other derived data, such as filter dropdown options.
+"""
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from .kpis import compute_dashboard_kpis
+
+
+DATA_VERSION_KEY = 'data-version'
+
+
+def get_cache():
+    return caches[settings.DASHBOARD_CACHE_ALIAS]
+
+
+def get_data_version():
+    """Return the current data version, initialising it if needed"""
+    cache = get_cache()
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        # Start from a clock value so a cleared counter never reuses old keys
+        cache.add(DATA_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(DATA_VERSION_KEY)
+    return version
+
+
+def bump_data_version():
+    """Invalidate every versioned cache entry"""
+    cache = get_cache()
+    try:
+        return cache.incr(DATA_VERSION_KEY)
+    except ValueError:
+        return get_data_version()
+
+
+def get_versioned(name, compute, timeout=None):
+    """Return ``compute()`` cached under ``name`` for the current data version"""
+    cache = get_cache()
+    key = f'{name}:{get_data_version()}'
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout if timeout is not None else settings.DASHBOARD_KPI_TIMEOUT)
+    return value
+
+
+def kpi_cache_key(version=None, today=None):
+    version = version if version is not None else get_data_version()
+    today = today or timezone.localdate()
+    return f'dashboard-kpis:{version}:{today.isoformat()}'
+
+
+def get_dashboard_kpis():
+    """Return the dashboard KPIs, computing them only on a version miss"""
+    cache = get_cache()
+    key = kpi_cache_key()
+    kpis = cache.get(key)
+    if kpis is None:
+        kpis = compute_dashboard_kpis()
+        cache.set(key, kpis, settings.DASHBOARD_KPI_TIMEOUT)
+    return kpis
+
+
+def warm_dashboard_kpis():
+    """Compute and store the KPIs for the current version; returns the key"""
+    key = kpi_cache_key()
+    get_cache().set(key, compute_dashboard_kpis(), settings.DASHBOARD_KPI_TIMEOUT)
+    return key
@@ -0,0 +1,48 @@
+from datetime import timedelta
+from django.db.models import Sum, Q
+from django.utils import timezone
+from inventory.models import Product
+from sales.models import Sale, DailySalesRollup
+
+
+def get_sales_totals(today=None):
+    """Today's, this week's and this month's sales totals from the daily rollup"""
+    today = today or timezone.localdate()
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    
+    totals = DailySalesRollup.objects.filter(
+        date__gte=min(week_start, month_start)
+    ).aggregate(
+        today_count=Sum('transactions', filter=Q(date=today)),
+        today_total=Sum('revenue', filter=Q(date=today)),
+        today_profit=Sum('profit', filter=Q(date=today)),
+        week_profit=Sum('profit', filter=Q(date__gte=week_start)),
+        month_profit=Sum('profit', filter=Q(date__gte=month_start)),
+    )
+    
+    return {
+        'today_sales_count': totals['today_count'] or 0,
+        'today_sales_total': totals['today_total'] or 0,
+        'today_profit': totals['today_profit'] or 0,
+        'week_profit': totals['week_profit'] or 0,
+        'month_profit': totals['month_profit'] or 0,
+    }
+
+
+def get_low_stock_count():
+    return Product.needing_reorder().count()
+
+
+def compute_dashboard_kpis():
+    """Run every query behind the dashboard page and return plain data"""
+    kpis = {
+        'total_products': Product.objects.count(),
+        'low_stock_count': get_low_stock_count(),
+    }
+    kpis.update(get_sales_totals())
+    kpis['low_stock_products'] = list(Product.needing_reorder()[:10])
+    kpis['recent_sales'] = list(
+        Sale.objects.select_related('product').order_by('-date_sold')[:5])
+    kpis['top_products'] = list(Sale.get_top_selling_products(5))
+    return kpis
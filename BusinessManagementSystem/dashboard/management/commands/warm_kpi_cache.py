@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+from dashboard.cache import get_data_version, warm_dashboard_kpis
+
+
+class Command(BaseCommand):
+    help = 'Precompute the dashboard KPIs so the next page load is served from cache'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Keep running and re-warm whenever the data version changes, '
+                 'checking every INTERVAL seconds'
+        )
+    
+    def handle(self, *args, **options):
+        interval = options['interval']
+        warmed_version = None
+        
+        while True:
+            version = get_data_version()
+            if version != warmed_version:
+                key = warm_dashboard_kpis()
+                warmed_version = version
+                self.stdout.write(self.style.SUCCESS(f'Warmed {key}'))
+            
+            if not interval:
+                break
+            time.sleep(interval)
@@ -0,0 +1,60 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from inventory.models import Product
+from sales.models import Sale
+from sales.signals import sales_batch_recorded
+from .broadcast import broadcaster
+from .cache import bump_data_version
+from .kpis import get_low_stock_count, get_sales_totals
+
+
+def publish_sale(sale):
+    """Push the new sale and the KPI/stock deltas it caused to live dashboards"""
+    if not broadcaster.subscriber_count:
+        return
+    
+    product = sale.product
+    # Stock is decremented in SQL, so read back the committed quantity
+    product.refresh_from_db(fields=['quantity'])
+    broadcaster.publish(
+        'sale',
+        id=sale.pk,
+        product=product.name,
+        quantity=sale.quantity_sold,
+        total_cost=sale.total_cost,
+        profit=sale.profit,
+        date_sold=sale.date_sold,
+    )
+    broadcaster.publish('kpis', low_stock_count=get_low_stock_count(), **get_sales_totals())
+    if product.is_low_stock:
+        broadcaster.publish(
+            'stock',
+            product_id=product.pk,
+            product=product.name,
+            category=product.get_category_display(),
+            quantity=product.quantity,
+        )
+
+
+@receiver(post_save, sender=Sale, dispatch_uid='dashboard_publish_sale')
+def sale_created(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: publish_sale(instance))
+
+
+@receiver(post_save, sender=Sale, dispatch_uid='dashboard_sale_saved')
+@receiver(post_delete, sender=Sale, dispatch_uid='dashboard_sale_deleted')
+@receiver(post_save, sender=Product, dispatch_uid='dashboard_product_saved')
+@receiver(post_delete, sender=Product, dispatch_uid='dashboard_product_deleted')
+def data_changed(sender, **kwargs):
+    # Bump after commit so readers never cache uncommitted data under the new version
+    transaction.on_commit(bump_data_version)
+
+
+@receiver(sales_batch_recorded, dispatch_uid='dashboard_sales_batch_recorded')
+def sales_batch_saved(sender, sales, **kwargs):
+    # Sent after commit; bulk inserts bypass post_save
+    bump_data_version()
+    if broadcaster.subscriber_count:
+        broadcaster.publish('kpis', low_stock_count=get_low_stock_count(), **get_sales_totals())
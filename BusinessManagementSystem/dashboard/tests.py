@@ -1,3 +1,430 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection
+from django.core.management import CommandError, call_command
+from django.db.models import Sum
+from django.test import AsyncRequestFactory, RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from inventory.models import Product
+from sales.batch import record_sales_batch
+from sales.models import DailySalesRollup, Sale
+from sales.utils import date_range_filter
+from .broadcast import broadcaster
+from .cache import bump_data_version, get_cache, get_dashboard_kpis, get_data_version, get_versioned
+from .kpis import compute_dashboard_kpis, get_low_stock_count, get_sales_totals
+from .timeseries import get_timeseries
+from .views import _live_event_stream, live_updates
 
-# Create your tests here.
+
+def sell(days_ago=0, sold_at=None, **kwargs):
+    """Record a sale through Sale.save as if it happened ``days_ago`` days ago (or at ``sold_at``)"""
+    sold_at = sold_at or timezone.now() - timedelta(days=days_ago)
+    with mock.patch('django.utils.timezone.now', return_value=sold_at):
+        return Sale.objects.create(**kwargs)
+
+
+class DailySalesRollupTests(TestCase):
+    """The rollup follows every sale write and matches a GROUP BY over the sales."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Product.objects.create(
+            name='Novel', category='books', buying_price=Decimal('4.00'),
+            selling_price=Decimal('10.00'), quantity=1000, supplier='Acme')
+        cls.lamp = Product.objects.create(
+            name='Lamp', category='home', buying_price=Decimal('12.50'),
+            selling_price=Decimal('20.00'), quantity=1000, supplier='Acme')
+    
+    def rollup(self):
+        return {
+            (row.date, row.product_id): (row.revenue, row.profit, row.units, row.transactions)
+            for row in DailySalesRollup.objects.exclude(transactions=0)
+        }
+    
+    def group_by(self):
+        """The rollup computed with a raw GROUP BY (TIME_ZONE is UTC, so SQLite's date() is the local day)"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT date(date_sold), product_id, SUM(total_cost), SUM(profit), '
+                'SUM(quantity_sold), COUNT(*) FROM sales_sale GROUP BY 1, 2')
+            rows = cursor.fetchall()
+        cents = Decimal('0.01')
+        return {
+            (date.fromisoformat(day), product_id):
+                (Decimal(str(revenue)).quantize(cents), Decimal(str(profit)).quantize(cents), units, count)
+            for day, product_id, revenue, profit, units, count in rows
+        }
+    
+    def test_save_adds_to_the_days_row(self):
+        sell(product=self.book, quantity_sold=2)
+        sale = sell(product=self.book, quantity_sold=1)
+        row = DailySalesRollup.objects.get(product=self.book)
+        self.assertEqual((row.date, row.category), (timezone.localdate(), 'books'))
+        self.assertEqual((row.revenue, row.profit, row.units, row.transactions),
+                         (Decimal('30.00'), Decimal('18.00'), 3, 2))
+        
+        sale.quantity_sold = 4
+        sale.save()
+        row.refresh_from_db()
+        self.assertEqual((row.revenue, row.units, row.transactions), (Decimal('60.00'), 6, 2))
+        self.assertEqual(self.rollup(), self.group_by())
+    
+    def test_delete_takes_the_sale_out(self):
+        keep = sell(product=self.lamp, quantity_sold=1)
+        sell(product=self.lamp, quantity_sold=3).delete()
+        row = DailySalesRollup.objects.get(product=self.lamp)
+        self.assertEqual((row.revenue, row.profit, row.units, row.transactions),
+                         (keep.total_cost, keep.profit, 1, 1))
+    
+    def test_queryset_delete_takes_the_sales_out(self):
+        for days_ago in (3, 3, 1, 0):
+            sell(days_ago, product=self.book, quantity_sold=days_ago + 1)
+            sell(days_ago, product=self.lamp, quantity_sold=1)
+        Sale.objects.filter(product=self.book, quantity_sold__gt=1).delete()
+        self.assertEqual(Sale.objects.filter(product=self.book).count(), 1)
+        self.assertEqual(self.rollup(), self.group_by())
+    
+    def test_rebuild_matches_a_raw_group_by(self):
+        for days_ago in (10, 4, 4, 0):
+            sell(days_ago, product=self.book, quantity_sold=2)
+            sell(days_ago, product=self.lamp, quantity_sold=days_ago % 3 + 1)
+        DailySalesRollup.objects.all().delete()
+        self.assertEqual(DailySalesRollup.rebuild(), 6)
+        self.assertEqual(self.rollup(), self.group_by())
+
+
+class VersionedCacheTests(TestCase):
+    """Writes bump the data version, and entries cached under an older version are never served."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name='Mug', category='home', buying_price=Decimal('2.00'),
+            selling_price=Decimal('5.00'), quantity=100, supplier='Acme')
+    
+    def setUp(self):
+        get_cache().clear()
+    
+    def test_tests_use_an_in_memory_cache(self):
+        self.assertIsInstance(get_cache(), LocMemCache)
+    
+    def test_version_is_stable_until_bumped(self):
+        version = get_data_version()
+        self.assertEqual(get_data_version(), version)
+        self.assertEqual(bump_data_version(), version + 1)
+        self.assertEqual(get_data_version(), version + 1)
+    
+    def test_bump_works_on_a_cleared_cache(self):
+        get_cache().clear()
+        self.assertIsNotNone(bump_data_version())
+        self.assertEqual(bump_data_version(), get_data_version())
+    
+    def test_stale_entries_are_not_served(self):
+        compute = iter(range(10)).__next__
+        self.assertEqual(get_versioned('numbers', compute), 0)
+        self.assertEqual(get_versioned('numbers', compute), 0)
+        bump_data_version()
+        self.assertEqual(get_versioned('numbers', compute), 1)
+    
+    def test_writes_bump_the_version_after_commit(self):
+        version = get_data_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            sale = Sale.objects.create(product=self.product, quantity_sold=2)
+        self.assertGreater(get_data_version(), version)
+        
+        version = get_data_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Large Mug'
+            self.product.save()
+        self.assertGreater(get_data_version(), version)
+        
+        version = get_data_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            sale.delete()
+        self.assertGreater(get_data_version(), version)
+    
+    def test_kpis_are_cached_until_a_sale_is_recorded(self):
+        self.assertEqual(get_dashboard_kpis()['today_sales_count'], 0)
+        with self.assertNumQueries(0):
+            get_dashboard_kpis()
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Sale.objects.create(product=self.product, quantity_sold=3)
+        kpis = get_dashboard_kpis()
+        self.assertEqual(kpis['today_sales_count'], 1)
+        self.assertEqual(kpis['today_sales_total'], Decimal('15.00'))
+
+
+def local(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class TimeseriesTests(TestCase):
+    """Chart buckets start on the hour, day, Monday or first of the month and match the ORM."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('manager', password='secret')
+        cls.book = Product.objects.create(
+            name='Atlas', category='books', buying_price=Decimal('4.00'),
+            selling_price=Decimal('10.00'), quantity=100, supplier='Acme')
+        cls.lamp = Product.objects.create(
+            name='Desk Lamp', category='home', buying_price=Decimal('15.00'),
+            selling_price=Decimal('25.00'), quantity=100, supplier='Acme')
+        # Sunday night, Monday either side of 11:00, and the first of April
+        sell(sold_at=local(2025, 3, 30, 23, 30), product=cls.book, quantity_sold=1)
+        sell(sold_at=local(2025, 3, 31, 10, 59, 59), product=cls.book, quantity_sold=2)
+        sell(sold_at=local(2025, 3, 31, 11), product=cls.lamp, quantity_sold=1)
+        sell(sold_at=local(2025, 4, 1), product=cls.book, quantity_sold=3)
+    
+    def test_day_buckets_match_the_orm(self):
+        start, end = date(2025, 3, 29), date(2025, 4, 2)
+        data = get_timeseries(start, end, 'day')
+        self.assertEqual(data['labels'], ['03/29', '03/30', '03/31', '04/01', '04/02'])
+        for index in range(5):
+            day = start + timedelta(days=index)
+            totals = Sale.objects.filter(**date_range_filter(day, day)).aggregate(
+                revenue=Sum('total_cost'), profit=Sum('profit'), units=Sum('quantity_sold'))
+            self.assertEqual(data['series']['revenue'][index], float(totals['revenue'] or 0), day)
+            self.assertEqual(data['series']['profit'][index], float(totals['profit'] or 0), day)
+            self.assertEqual(data['series']['units'][index], totals['units'] or 0, day)
+    
+    def test_hour_buckets_split_on_the_hour(self):
+        data = get_timeseries(date(2025, 3, 31), date(2025, 3, 31), 'hour', metrics=['units'])
+        self.assertEqual(len(data['labels']), 24)
+        self.assertEqual(data['labels'][10:12], ['03/31 10:00', '03/31 11:00'])
+        self.assertEqual(data['series']['units'][10:12], [2, 1])
+        self.assertEqual(sum(data['series']['units']), 3)
+    
+    def test_week_buckets_start_on_monday(self):
+        data = get_timeseries(date(2025, 3, 30), date(2025, 4, 1), 'week', metrics=['units'])
+        self.assertEqual(data['labels'], ['03/24', '03/31'])
+        self.assertEqual(data['series']['units'], [1, 6])
+    
+    def test_month_buckets_start_on_the_first(self):
+        data = get_timeseries(date(2025, 3, 30), date(2025, 4, 1), 'month', metrics=['revenue'])
+        self.assertEqual(data['labels'], ['Mar 2025', 'Apr 2025'])
+        self.assertEqual(data['series']['revenue'], [55.0, 30.0])
+    
+    def test_category_and_product_filters(self):
+        data = get_timeseries(date(2025, 3, 30), date(2025, 4, 1), 'day', metrics=['units'], category='home')
+        self.assertEqual(data['series']['units'], [0, 1, 0])
+        data = get_timeseries(date(2025, 3, 30), date(2025, 4, 1), 'day', metrics=['units'], product_id=self.book.pk)
+        self.assertEqual(data['series']['units'], [1, 2, 3])
+    
+    def test_api_answers_bad_parameters_with_fixed_messages(self):
+        self.client.force_login(self.user)
+        url = reverse('dashboard:timeseries')
+        response = self.client.get(url, {'start': '2025-03-31', 'end': '2025-03-31', 'granularity': 'hour'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum(response.json()['series']['units']), 3)
+        
+        for params, parameter in [
+            ({'days': 'abc'}, 'days'),
+            ({'days': '0'}, 'days'),
+            ({'days': str(10 ** 12)}, 'days'),
+            ({'start': '2025-02-30'}, 'start'),
+            ({'end': 'yesterday'}, 'end'),
+            ({'granularity': 'year'}, 'granularity'),
+            ({'metrics': 'revenue,margin'}, 'metrics'),
+            ({'product': 'abc'}, 'product'),
+        ]:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertEqual(response.json(), {'error': f"Invalid '{parameter}' parameter"})
+        
+        response = self.client.get(url, {'start': '2025-04-02', 'end': '2025-04-01'})
+        self.assertEqual(response.json(), {'error': "'start' must not be after 'end'"})
+        response = self.client.get(url, {'start': '2025-01-01', 'end': '2025-04-01', 'granularity': 'hour'})
+        self.assertEqual(response.json(), {'error': "Range too long for 'hour' granularity (max 31 days)"})
+
+
+class LiveUpdateTests(TestCase):
+    """A committed sale pushes its payload, the KPI totals and low-stock changes to subscribers."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name='Kettle', category='home', buying_price=Decimal('11.00'),
+            selling_price=Decimal('19.50'), quantity=12, supplier='Acme')
+    
+    def subscribe(self):
+        """Subscribe on an idle event loop; events are delivered whenever it next runs"""
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        subscription = broadcaster.subscribe()
+        queue = loop.run_until_complete(subscription.__aenter__())
+        self.addCleanup(loop.run_until_complete, subscription.__aexit__(None, None, None))
+        return loop, queue
+    
+    def received(self, loop, queue):
+        loop.run_until_complete(asyncio.sleep(0))
+        messages = []
+        while not queue.empty():
+            messages.append(queue.get_nowait())
+        return {message['event']: message['data'] for message in messages}
+    
+    def test_sale_publishes_sale_kpis_and_stock_events(self):
+        loop, queue = self.subscribe()
+        with self.captureOnCommitCallbacks(execute=True):
+            sale = Sale.objects.create(product=self.product, quantity_sold=8)
+        events = self.received(loop, queue)
+        
+        self.assertEqual(events['sale'], {
+            'id': sale.pk, 'product': 'Kettle', 'quantity': 8, 'total_cost': Decimal('156.00'),
+            'profit': Decimal('68.00'), 'date_sold': sale.date_sold})
+        self.assertEqual(events['kpis'], {'low_stock_count': get_low_stock_count(), **get_sales_totals()})
+        self.assertEqual((events['kpis']['today_sales_count'], events['kpis']['today_sales_total']),
+                         (1, Decimal('156.00')))
+        # 4 left is at or below the default reorder point
+        self.assertEqual(events['stock'], {'product_id': self.product.pk, 'product': 'Kettle',
+                                           'category': 'Home & Garden', 'quantity': 4})
+    
+    def test_nothing_is_published_before_commit(self):
+        loop, queue = self.subscribe()
+        with self.captureOnCommitCallbacks(execute=False):
+            Sale.objects.create(product=self.product, quantity_sold=1)
+        self.assertEqual(self.received(loop, queue), {})
+    
+    def test_stream_formats_server_sent_events(self):
+        async def read():
+            stream = _live_event_stream()
+            chunks = [await stream.__anext__()]
+            broadcaster.publish('sale', id=7, total_cost=Decimal('2.50'))
+            chunks.append(await stream.__anext__())
+            await stream.aclose()
+            return chunks
+        
+        retry, event = asyncio.run(read())
+        self.assertEqual(retry, 'retry: 5000\n\n')
+        name, data, blank = event.split('\n', 2)
+        self.assertEqual((name, blank), ('event: sale', '\n'))
+        self.assertEqual(json.loads(data.removeprefix('data: ')), {'id': 7, 'total_cost': '2.50'})
+        self.assertEqual(broadcaster.subscriber_count, 0)
+    
+    def test_stream_is_only_served_over_asgi(self):
+        user = User.objects.create_user('viewer', password='secret')
+        
+        async def auser():
+            return user
+        
+        # runserver and other WSGI servers would buffer the endless stream
+        request = RequestFactory().get('/dashboard/api/live/')
+        request.auser = auser
+        response = asyncio.run(live_updates(request))
+        self.assertEqual(response.status_code, 204)
+        
+        request = AsyncRequestFactory().get('/dashboard/api/live/')
+        request.auser = auser
+        response = asyncio.run(live_updates(request))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(response.streaming)
+
+
+class SalesIngestionKpiTests(TestCase):
+    """Bulk-ingested sales feed the same KPIs as single sales, matching the ORM over raw sales."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pos', password='secret')
+        cls.products = [
+            Product.objects.create(
+                name=f'Item {i}', category='other', buying_price=Decimal('2.00') + i,
+                selling_price=Decimal('3.25') + 2 * i, quantity=40 - 12 * i, supplier='Acme')
+            for i in range(3)
+        ]
+    
+    def setUp(self):
+        get_cache().clear()
+    
+    def profit_since(self, day):
+        return Sale.objects.filter(**date_range_filter(day, timezone.localdate())).aggregate(
+            total=Sum('profit'))['total'] or 0
+    
+    def test_kpis_match_the_orm(self):
+        for days_ago, product, quantity in [(40, 0, 3), (9, 1, 2), (2, 2, 1), (0, 0, 4)]:
+            sell(days_ago, product=self.products[product], quantity_sold=quantity)
+        record_sales_batch([{'product': self.products[1].pk, 'quantity': 5},
+                            {'product': self.products[0].pk, 'quantity': 1}])
+        
+        today = timezone.localdate()
+        todays = Sale.objects.filter(**date_range_filter(today, today))
+        kpis = compute_dashboard_kpis()
+        self.assertEqual(kpis['total_products'], 3)
+        self.assertEqual(kpis['low_stock_count'], sum(product.is_low_stock for product in Product.objects.all()))
+        self.assertEqual(kpis['today_sales_count'], todays.count())
+        self.assertEqual(kpis['today_sales_total'], todays.aggregate(total=Sum('total_cost'))['total'])
+        self.assertEqual(kpis['today_profit'], todays.aggregate(total=Sum('profit'))['total'])
+        self.assertEqual(kpis['week_profit'], self.profit_since(today - timedelta(days=today.weekday())))
+        self.assertEqual(kpis['month_profit'], self.profit_since(today.replace(day=1)))
+        self.assertEqual(
+            [(row['product__id'], row['total_quantity']) for row in kpis['top_products']],
+            list(Sale.objects.values_list('product__id').annotate(total=Sum('quantity_sold')).order_by('-total')))
+        self.assertEqual([sale.pk for sale in kpis['recent_sales']],
+                         list(Sale.objects.order_by('-date_sold').values_list('pk', flat=True)[:5]))
+    
+    def test_batch_api_records_and_refreshes_the_kpis(self):
+        self.client.force_login(self.user)
+        self.assertEqual(get_dashboard_kpis()['today_sales_count'], 0)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('sales:sales_batch_api'), {'sales': [
+                {'product': self.products[0].pk, 'quantity': 2, 'customer_name': 'Ann'},
+                {'product': self.products[2].pk, 'quantity': 1},
+            ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'created': 2, 'total_sales': '13.75', 'total_profit': '5.75'})
+        
+        kpis = get_dashboard_kpis()
+        self.assertEqual((kpis['today_sales_count'], kpis['today_sales_total']), (2, Decimal('13.75')))
+        self.products[2].refresh_from_db()
+        self.assertEqual(self.products[2].quantity, 15)
+    
+    def test_batch_api_rejects_the_whole_batch(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('sales:sales_batch_api'), {'sales': [
+            {'product': self.products[0].pk, 'quantity': 1},
+            {'product': self.products[2].pk, 'quantity': 17},
+            {'product': 'abc', 'quantity': 1},
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['line'] for error in response.json()['errors']], [2, 3])
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(DailySalesRollup.objects.exists())
+        
+        response = self.client.post(reverse('sales:sales_batch_api'), 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+    
+    def write_file(self, suffix, content):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+    
+    def test_import_sales_command(self):
+        path = self.write_file('.csv', f'product,quantity,customer_name,notes\n'
+                                       f'{self.products[0].pk},3,Bea,\n{self.products[1].pk},2,,till 2\n')
+        call_command('import_sales', path, dry_run=True, stdout=io.StringIO())
+        self.assertFalse(Sale.objects.exists())
+        
+        call_command('import_sales', path, user='pos', stdout=io.StringIO())
+        self.assertEqual(list(Sale.objects.order_by('id').values_list('quantity_sold', 'customer_name', 'notes')),
+                         [(3, 'Bea', None), (2, None, 'till 2')])
+        self.assertEqual(set(Sale.objects.values_list('sold_by__username', flat=True)), {'pos'})
+        self.assertEqual(compute_dashboard_kpis()['today_sales_count'], 2)
+        
+        path = self.write_file('.json', json.dumps([{'product': self.products[2].pk, 'quantity': 99}]))
+        with self.assertRaisesMessage(CommandError, 'nothing was imported'):
+            call_command('import_sales', path, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(Sale.objects.count(), 2)
@@ -0,0 +1,132 @@
+"""
+Time-series aggregation for the dashboard charts.
+
+All requested metrics are computed together in a single GROUP BY query
+over a truncated date; buckets without sales are zero-filled in Python.
+Day, week and month buckets read the daily rollup table, hourly buckets
+read the raw sales table.
+"""
+from datetime import timedelta
+
+from django.db.models import F, Sum
+from django.db.models.functions import TruncHour, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from sales.models import Sale, DailySalesRollup
+from sales.utils import date_range_filter, local_date_range
+
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+METRICS = ('revenue', 'profit', 'units')
+
+# Longest range (in days) accepted for each granularity
+MAX_RANGE_DAYS = {
+    'hour': 31,
+    'day': 366,
+    'week': 366 * 3,
+    'month': 366 * 10,
+}
+
+LABEL_FORMATS = {
+    'hour': '%m/%d %H:00',
+    'day': '%m/%d',
+    'week': '%m/%d',
+    'month': '%b %Y',
+}
+
+
+def _bucket_starts(start_date, end_date, granularity):
+    """Yield every bucket key between start_date and end_date (inclusive)"""
+    if granularity == 'hour':
+        current, stop = local_date_range(start_date, end_date)
+        while current < stop:
+            yield current
+            current = timezone.localtime(current + timedelta(hours=1))
+    elif granularity == 'day':
+        current = start_date
+        while current <= end_date:
+            yield current
+            current += timedelta(days=1)
+    elif granularity == 'week':
+        current = start_date - timedelta(days=start_date.weekday())
+        while current <= end_date:
+            yield current
+            current += timedelta(weeks=1)
+    else:
+        current = start_date.replace(day=1)
+        while current <= end_date:
+            yield current
+            current = (current + timedelta(days=32)).replace(day=1)
+
+
+def _grouped_totals(start_date, end_date, granularity, metrics, category=None, product_id=None):
+    """Run the single GROUP BY query and return {bucket: {metric: total}}"""
+    if granularity == 'hour':
+        queryset = Sale.objects.filter(**date_range_filter(start_date, end_date))
+        bucket = TruncHour('date_sold')
+        columns = {'revenue': 'total_cost', 'profit': 'profit', 'units': 'quantity_sold'}
+        category_lookup = 'product__category'
+    else:
+        queryset = DailySalesRollup.objects.filter(date__gte=start_date, date__lte=end_date)
+        bucket = {
+            'day': F('date'),
+            'week': TruncWeek('date'),
+            'month': TruncMonth('date'),
+        }[granularity]
+        columns = {'revenue': 'revenue', 'profit': 'profit', 'units': 'units'}
+        category_lookup = 'category'
+    
+    if category:
+        queryset = queryset.filter(**{category_lookup: category})
+    if product_id:
+        queryset = queryset.filter(product_id=product_id)
+    
+    rows = queryset.values(bucket_key=bucket).annotate(
+        **{f'total_{metric}': Sum(columns[metric]) for metric in metrics}
+    ).order_by()
+    
+    return {
+        row['bucket_key']: {metric: row[f'total_{metric}'] for metric in metrics}
+        for row in rows
+    }
+
+
+def get_timeseries(start_date, end_date, granularity='day', metrics=METRICS,
+                   category=None, product_id=None):
+    """
+    Return zero-filled chart series for the given local date range.
+    
+    The result has ``labels`` plus one list per requested metric under
+    ``series``, all aligned on the same buckets.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity '{granularity}'")
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(sorted(unknown))}")
+    if end_date < start_date:
+        raise ValueError("End date must not be before start date")
+    if (end_date - start_date).days + 1 > MAX_RANGE_DAYS[granularity]:
+        raise ValueError(
+            f"Range too long for '{granularity}' granularity "
+            f"(max {MAX_RANGE_DAYS[granularity]} days)"
+        )
+    
+    totals = _grouped_totals(start_date, end_date, granularity, metrics, category, product_id)
+    
+    labels = []
+    series = {metric: [] for metric in metrics}
+    for bucket in _bucket_starts(start_date, end_date, granularity):
+        labels.append(bucket.strftime(LABEL_FORMATS[granularity]))
+        bucket_totals = totals.get(bucket, {})
+        for metric in metrics:
+            value = bucket_totals.get(metric) or 0
+            series[metric].append(int(value) if metric == 'units' else float(value))
+    
+    return {
+        'granularity': granularity,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'labels': labels,
+        'series': series,
+    }
@@ -5,6 +5,8 @@ app_name = 'dashboard'
 
 urlpatterns = [
     path('', views.DashboardView.as_view(), name='home'),
+    path('api/live/', views.live_updates, name='live_updates'),
+    path('api/timeseries/', views.timeseries_data, name='timeseries'),
     path('api/sales-chart-data/', views.sales_chart_data, name='sales_chart_data'),
     path('api/profit-chart-data/', views.profit_chart_data, name='profit_chart_data'),
 ]
\ No newline at end of file
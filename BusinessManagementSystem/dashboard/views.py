@@ -2,12 +2,21 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.contrib.auth.views import redirect_to_login
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Sum, Count
 from django.utils import timezone
 from datetime import datetime, timedelta
+import asyncio
+import json
 from inventory.models import Product
+from sales.filters import parse_product_id
 from sales.models import Sale
+from .broadcast import broadcaster
+from .cache import get_dashboard_kpis
+from .timeseries import GRANULARITIES, MAX_RANGE_DAYS, METRICS, get_timeseries
 
 
 class DashboardView(LoginRequiredMixin, TemplateView):
@@ -16,62 +25,87 @@ class DashboardView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        # Get date ranges
-        today = timezone.now().date()
-        week_start = today - timedelta(days=today.weekday())
-        month_start = today.replace(day=1)
-        
-        # Basic stats
-        context['total_products'] = Product.objects.count()
-        context['low_stock_count'] = Product.objects.filter(quantity__lte=5).count()
-        
-        # Sales stats
-        today_sales = Sale.objects.filter(date_sold__date=today)
-        week_sales = Sale.objects.filter(date_sold__date__gte=week_start)
-        month_sales = Sale.objects.filter(date_sold__date__gte=month_start)
-        
-        context['today_sales_count'] = today_sales.count()
-        context['today_sales_total'] = today_sales.aggregate(
-            total=Sum('total_cost'))['total'] or 0
-        context['today_profit'] = today_sales.aggregate(
-            total=Sum('profit'))['total'] or 0
-        
-        context['week_profit'] = week_sales.aggregate(
-            total=Sum('profit'))['total'] or 0
-        context['month_profit'] = month_sales.aggregate(
-            total=Sum('profit'))['total'] or 0
-        
-        # Low stock products
-        context['low_stock_products'] = Product.objects.filter(
-            quantity__lte=5).order_by('quantity')[:10]
-        
-        # Recent sales
-        context['recent_sales'] = Sale.objects.select_related('product').order_by('-date_sold')[:5]
-        
-        # Top selling products
-        context['top_products'] = Sale.get_top_selling_products(5)
+        # Product counts, sales totals, low stock, recent and top sales;
+        # cached until the next Sale/Product write bumps the data version
+        context.update(get_dashboard_kpis())
         
         return context
 
 
+def _parse_date(value, default):
+    if not value:
+        return default
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _invalid_parameter(name):
+    # A fixed message, so no exception text reaches the client
+    return JsonResponse({'error': f"Invalid '{name}' parameter"}, status=400)
+
+
+@login_required
+def timeseries_data(request):
+    """
+    API endpoint returning revenue, profit and units per time bucket.
+    
+    Query parameters: ``start``/``end`` (YYYY-MM-DD) or ``days``,
+    ``granularity`` (hour/day/week/month), ``metrics`` (comma separated)
+    and optional ``category`` / ``product`` filters.
+    """
+    params = request.GET
+    try:
+        end_date = _parse_date(params.get('end'), timezone.localdate())
+    except ValueError:
+        return _invalid_parameter('end')
+    days = params.get('days', '7')
+    try:
+        if not (days.isascii() and days.isdigit()) or int(days) < 1:
+            raise ValueError
+        default_start = end_date - timedelta(days=int(days) - 1)
+    except (ValueError, OverflowError):
+        return _invalid_parameter('days')
+    try:
+        start_date = _parse_date(params.get('start'), default_start)
+    except ValueError:
+        return _invalid_parameter('start')
+    if start_date > end_date:
+        return JsonResponse({'error': "'start' must not be after 'end'"}, status=400)
+    
+    granularity = params.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        return _invalid_parameter('granularity')
+    if (end_date - start_date).days + 1 > MAX_RANGE_DAYS[granularity]:
+        return JsonResponse({'error': f"Range too long for '{granularity}' granularity "
+                                      f"(max {MAX_RANGE_DAYS[granularity]} days)"}, status=400)
+    metrics = [m for m in params.get('metrics', ','.join(METRICS)).split(',') if m]
+    if set(metrics) - set(METRICS):
+        return _invalid_parameter('metrics')
+    product_id = parse_product_id(params.get('product'))
+    if params.get('product') and product_id is None:
+        return _invalid_parameter('product')
+    
+    return JsonResponse(get_timeseries(
+        start_date,
+        end_date,
+        granularity=granularity,
+        metrics=metrics,
+        category=params.get('category') or None,
+        product_id=product_id,
+    ))
+
+
+def _last_week_series(metric):
+    """Return (labels, data) for the last 7 days of a single metric"""
+    end_date = timezone.localdate()
+    data = get_timeseries(end_date - timedelta(days=6), end_date, metrics=[metric])
+    return data['labels'], data['series'][metric]
+
+
 @login_required
 def sales_chart_data(request):
     """API endpoint for sales chart data"""
     # Get last 7 days of sales data
-    end_date = timezone.now().date()
-    start_date = end_date - timedelta(days=6)
-    
-    sales_data = []
-    labels = []
-    
-    for i in range(7):
-        current_date = start_date + timedelta(days=i)
-        daily_sales = Sale.objects.filter(
-            date_sold__date=current_date
-        ).aggregate(total=Sum('total_cost'))['total'] or 0
-        
-        sales_data.append(float(daily_sales))
-        labels.append(current_date.strftime('%m/%d'))
+    labels, sales_data = _last_week_series('revenue')
     
     return JsonResponse({
         'labels': labels,
@@ -83,22 +117,49 @@ def sales_chart_data(request):
 def profit_chart_data(request):
     """API endpoint for profit chart data"""
     # Get last 7 days of profit data
-    end_date = timezone.now().date()
-    start_date = end_date - timedelta(days=6)
-    
-    profit_data = []
-    labels = []
-    
-    for i in range(7):
-        current_date = start_date + timedelta(days=i)
-        daily_profit = Sale.objects.filter(
-            date_sold__date=current_date
-        ).aggregate(total=Sum('profit'))['total'] or 0
-        
-        profit_data.append(float(daily_profit))
-        labels.append(current_date.strftime('%m/%d'))
+    labels, profit_data = _last_week_series('profit')
     
     return JsonResponse({
         'labels': labels,
         'data': profit_data
     })
+
+
+# Seconds between keep-alive comments on idle event streams
+LIVE_UPDATES_HEARTBEAT = 15
+
+
+async def _live_event_stream():
+    """Yield Server-Sent Events for every broadcast dashboard delta"""
+    async with broadcaster.subscribe() as queue:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=LIVE_UPDATES_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            data = json.dumps(message['data'], cls=DjangoJSONEncoder)
+            yield f"event: {message['event']}\ndata: {data}\n\n"
+
+
+async def live_updates(request):
+    """
+    Async SSE endpoint pushing new sales, KPI totals and low-stock changes.
+    
+    Serve the project through ``BusinessManagementSystem.asgi`` so each
+    open dashboard holds a single idle coroutine instead of polling. A
+    WSGI server (including runserver) would read the endless stream to
+    the end before responding and tie up a thread per dashboard, so it
+    gets 204 No Content instead, which tells EventSource not to reconnect.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path())
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    
+    response = StreamingHttpResponse(_live_event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,17 +1,66 @@
+from decimal import Decimal
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Product
+from BusinessManagementSystem.pagination import CachedCountPaginator
+from .models import Product, StockMovement
+
+
+class RangeListFilter(admin.SimpleListFilter):
+    """Filter on bands of a numeric column; ``bands`` maps a value to (label, low, high)"""
+    field = None
+    bands = {}
+    
+    def lookups(self, request, model_admin):
+        return [(value, label) for value, (label, _, _) in self.bands.items()]
+    
+    def queryset(self, request, queryset):
+        if self.value() not in self.bands:
+            return queryset
+        _, low, high = self.bands[self.value()]
+        if low is not None:
+            queryset = queryset.filter(**{f'{self.field}__gte': low})
+        if high is not None:
+            queryset = queryset.filter(**{f'{self.field}__lt': high})
+        return queryset
+
+
+class MarginFilter(RangeListFilter):
+    title = 'margin'
+    parameter_name = 'margin'
+    field = 'margin_percent'
+    bands = {
+        'under10': ('Under 10%', None, 10),
+        '10to25': ('10% to 25%', 10, 25),
+        '25to50': ('25% to 50%', 25, 50),
+        'over50': ('50% and over', 50, None),
+    }
+
+
+class StockValueFilter(RangeListFilter):
+    title = 'stock value'
+    parameter_name = 'stock_value'
+    field = 'stock_value'
+    bands = {
+        'none': ('No stock', None, Decimal('0.01')),
+        'under100': ('Under $100', Decimal('0.01'), 100),
+        '100to1000': ('$100 to $1,000', 100, 1000),
+        'over1000': ('$1,000 and over', 1000, None),
+    }
 
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
+    # Page counts come from the cache or the table estimate, not a COUNT(*) per page
+    paginator = CachedCountPaginator
+    show_full_result_count = False
     list_display = [
         'name', 'category', 'quantity', 'buying_price', 
-        'selling_price', 'profit_per_unit', 'stock_status', 'date_added'
+        'selling_price', 'unit_margin', 'margin', 'stock_value', 'stock_status', 'date_added'
     ]
-    list_filter = ['category', 'date_added', 'supplier']
+    list_filter = ['category', MarginFilter, StockValueFilter, 'date_added', 'supplier']
     search_fields = ['name', 'supplier', 'category']
-    readonly_fields = ['date_added', 'profit_per_unit', 'profit_percentage', 'total_value']
+    readonly_fields = ['date_added', 'profit_per_unit', 'profit_percentage', 'total_value',
+                       'reorder_point', 'sales_velocity', 'days_of_stock']
     list_editable = ['quantity', 'buying_price', 'selling_price']
     
     fieldsets = (
@@ -22,7 +71,7 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('buying_price', 'selling_price', 'profit_per_unit', 'profit_percentage')
         }),
         ('Stock', {
-            'fields': ('quantity', 'total_value')
+            'fields': ('quantity', 'total_value', 'reorder_point', 'sales_velocity', 'days_of_stock')
         }),
         ('Metadata', {
             'fields': ('date_added', 'added_by'),
@@ -40,7 +89,30 @@ class ProductAdmin(admin.ModelAdmin):
         )
     stock_status.short_description = 'Stock Status'
     
+    @admin.display(description='Margin %', ordering='margin_percent')
+    def margin(self, obj):
+        return f'{obj.margin_percent:.1f}%' if obj.margin_percent is not None else '-'
+    
     def save_model(self, request, obj, form, change):
         if not change:  # If creating new product
             obj.added_by = request.user
+        obj.stock_changed_by = request.user
         super().save_model(request, obj, form, change)
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    """Read-only view of the stock ledger; movements are recorded by stock changes"""
+    list_display = ['created_at', 'product', 'change', 'reason', 'note', 'created_by']
+    list_filter = ['reason', 'created_at']
+    search_fields = ['product__name', 'note']
+    list_select_related = ['product', 'created_by']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
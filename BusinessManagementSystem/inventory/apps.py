@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+    
+    def ready(self):
+        from .search import restore_search_index
+        post_migrate.connect(restore_search_index, sender=self, dispatch_uid='inventory_restore_search_index')
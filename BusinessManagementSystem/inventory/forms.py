@@ -1,7 +1,73 @@
 from django import forms
+from django.forms.utils import flatatt
+from django.urls import reverse
+from django.utils.html import format_html
 from .models import Product
 
 
+class ProductAutocompleteWidget(forms.Widget):
+    """
+    Product picker backed by the autocomplete endpoint.
+    
+    Renders a hidden input holding the product id and a search box; only
+    the selected product (if any) is loaded, so render cost does not grow
+    with the catalogue. The hidden input carries the selected product's
+    name, price, cost and stock as data attributes for client-side previews.
+    """
+    
+    def __init__(self, attrs=None, in_stock=True):
+        self.in_stock = in_stock
+        super().__init__(attrs)
+    
+    def id_for_label(self, id_):
+        return f'{id_}_search' if id_ else id_
+    
+    def selected_product(self, value):
+        if value in (None, ''):
+            return None
+        try:
+            return Product.objects.filter(pk=value).values(
+                'id', 'name', 'selling_price', 'buying_price', 'quantity').first()
+        except (TypeError, ValueError):
+            return None
+    
+    def render(self, name, value, attrs=None, renderer=None):
+        attrs = self.build_attrs(self.attrs, attrs)
+        input_id = attrs.pop('id', f'id_{name}')
+        product = self.selected_product(value)
+        
+        hidden_attrs = {'type': 'hidden', 'name': name, 'id': input_id, 'value': product['id'] if product else ''}
+        if product:
+            hidden_attrs.update({
+                'data-name': product['name'],
+                'data-price': product['selling_price'],
+                'data-cost': product['buying_price'],
+                'data-stock': product['quantity'],
+            })
+        
+        url = reverse('inventory:product_autocomplete')
+        search_attrs = {
+            **attrs,
+            'type': 'search',
+            'id': f'{input_id}_search',
+            'value': product['name'] if product else '',
+            'autocomplete': 'off',
+            'placeholder': attrs.get('placeholder', 'Start typing a product name'),
+            'data-autocomplete-url': f'{url}?in_stock=1' if self.in_stock else url,
+            'data-target': input_id,
+        }
+        return format_html(
+            '<input{}><input{}><ul id="{}_results" class="{}" hidden></ul>',
+            flatatt(hidden_attrs),
+            flatatt(search_attrs),
+            input_id,
+            'absolute z-10 mt-1 w-full bg-white border border-gray-300 rounded-md shadow-lg max-h-60 overflow-auto',
+        )
+    
+    def value_from_datadict(self, data, files, name):
+        return data.get(name)
+
+
 class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
@@ -48,4 +114,15 @@ class ProductForm(forms.ModelForm):
                     "Selling price must be greater than buying price to ensure profit."
                 )
         
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+
+class ProductImportForm(forms.Form):
+    file = forms.FileField(
+        label="CSV file",
+        help_text="Columns: name, category, buying_price, selling_price, quantity, supplier",
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'mt-1 block w-full text-sm text-gray-700',
+            'accept': '.csv,text/csv',
+        }),
+    )
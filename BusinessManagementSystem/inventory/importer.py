@@ -0,0 +1,189 @@
+"""
+Streaming bulk import of products from CSV, e.g. supplier catalogues.
+
+Rows are read from a text stream with csv.DictReader and handled in
+batches. Each row is validated with ProductForm, so the rules of the
+add/edit pages apply. The existing products of the whole batch are
+looked up by (name, supplier) in one query, and the batch is written
+with one bulk_create and one bulk_update in its own transaction. A row
+for an existing product replaces its category, prices and stock, like a
+stocktake; stock changes are recorded in the stock ledger.
+
+Invalid rows are rejected. Of rows repeating a (name, supplier) key
+within a batch the last one is imported and the earlier ones are
+skipped. If a rejected-rows writer is given, both are copied to it with
+their line number and the reason.
+"""
+import csv
+from itertools import islice
+from django.db import transaction
+from django.utils import timezone
+from dashboard.cache import bump_data_version
+from .forms import ProductForm
+from .models import Product, StockMovement
+
+
+COLUMNS = ProductForm.Meta.fields
+
+# Rows validated and written per transaction
+BATCH_SIZE = 1000
+
+# Fields an import may change on an existing product
+UPDATE_FIELDS = ['category', 'buying_price', 'selling_price', 'quantity']
+
+
+class ProductImportError(Exception):
+    """Raised when the file cannot be imported at all (e.g. missing columns)"""
+
+
+class ImportStats:
+    """Running totals of an import, passed to the progress callback after each batch"""
+    
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.rejected = 0
+        self.skipped = 0
+    
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'rejected': self.rejected,
+            'skipped': self.skipped,
+        }
+
+
+def rejected_rows_writer(output):
+    """A csv.DictWriter for rejected and skipped rows, with the header already written"""
+    writer = csv.DictWriter(output, fieldnames=['line', *COLUMNS, 'errors'], extrasaction='ignore')
+    writer.writeheader()
+    return writer
+
+
+def _form_errors(form):
+    return '; '.join(
+        f'{field}: {message}' if field != '__all__' else message
+        for field, messages in form.errors.items()
+        for message in messages
+    )
+
+
+def validate_rows(numbered_rows, rejected=None):
+    """
+    Validate ``(line, row)`` pairs with ProductForm.
+    
+    Returns the cleaned rows keyed by (name, supplier), the number of rows
+    rejected and the number skipped. Of rows repeating a key, the last one
+    wins and the earlier ones are skipped. Rejected and skipped rows are
+    written to the ``rejected`` writer with their reasons.
+    """
+    valid = {}
+    lines = {}
+    rejected_count = skipped_count = 0
+    for line, row in numbered_rows:
+        form = ProductForm(data={field: (row.get(field) or '').strip() for field in COLUMNS})
+        if not form.is_valid():
+            rejected_count += 1
+            if rejected is not None:
+                rejected.writerow({**row, 'line': line, 'errors': _form_errors(form)})
+            continue
+        cleaned = form.cleaned_data
+        key = cleaned['name'], cleaned['supplier']
+        if key in lines:
+            skipped_count += 1
+            if rejected is not None:
+                skipped_line, skipped_row = lines[key]
+                rejected.writerow({**skipped_row, 'line': skipped_line,
+                                 'errors': f'Skipped: same name and supplier as line {line}'})
+        valid[key] = cleaned
+        lines[key] = line, row
+    return valid, rejected_count, skipped_count
+
+
+def existing_products(keys):
+    """The oldest product for each (name, supplier) key that exists, in one query"""
+    keys = set(keys)
+    names = {name for name, _ in keys}
+    existing = {}
+    # Newest first, so the oldest product with a key is the one kept. Locked
+    # so the stock recorded as changed is the stock being replaced
+    for product in Product.objects.select_for_update().filter(name__in=names).order_by('-id'):
+        if (product.name, product.supplier) in keys:
+            existing[product.name, product.supplier] = product
+    return existing
+
+
+def _import_movement(product, change, user, note='CSV import'):
+    reason = StockMovement.RESTOCK if change > 0 else StockMovement.ADJUSTMENT
+    return StockMovement(product=product, change=change, reason=reason, created_by=user, note=note)
+
+
+@transaction.atomic
+def upsert_batch(rows, user=None):
+    """Create or update the cleaned ``rows``; returns (created, updated, unchanged)"""
+    existing = existing_products(rows) if rows else {}
+    now = timezone.now()
+    to_create, to_update, movements = [], [], []
+    for key, cleaned in rows.items():
+        product = existing.get(key)
+        if product is None:
+            to_create.append(Product(**cleaned, added_by=user))
+            continue
+        if all(getattr(product, field) == cleaned[field] for field in UPDATE_FIELDS):
+            continue
+        # bulk_update bypasses Product.save, so stamp catalog changes and
+        # record stock changes here
+        if any(getattr(product, field) != cleaned[field] for field in Product.CATALOG_FIELDS):
+            product.catalog_changed_at = now
+        change = cleaned['quantity'] - product.quantity
+        if change:
+            movements.append(_import_movement(product, change, user))
+        for field in UPDATE_FIELDS:
+            setattr(product, field, cleaned[field])
+        to_update.append(product)
+    
+    Product.objects.bulk_create(to_create)
+    Product.objects.bulk_update(to_update, [*UPDATE_FIELDS, 'catalog_changed_at'])
+    movements.extend(_import_movement(product, product.quantity, user, 'Opening stock')
+                     for product in to_create if product.quantity)
+    StockMovement.objects.bulk_create(movements)
+    return len(to_create), len(to_update), len(rows) - len(to_create) - len(to_update)
+
+
+def import_products(stream, user=None, rejected=None, progress=None, batch_size=BATCH_SIZE):
+    """
+    Import products from the CSV text ``stream``; returns ImportStats.
+    
+    ``rejected`` is an optional writer from rejected_rows_writer, which
+    receives the rejected and skipped rows, and ``progress`` an optional
+    callable receiving the stats after each batch.
+    """
+    reader = csv.DictReader(stream)
+    missing = [column for column in COLUMNS if column not in (reader.fieldnames or [])]
+    if missing:
+        raise ProductImportError(f"Missing column(s): {', '.join(missing)}")
+    
+    stats = ImportStats()
+    # The header is line 1
+    numbered = enumerate(reader, start=2)
+    while batch := list(islice(numbered, batch_size)):
+        rows, rejected_count, skipped_count = validate_rows(batch, rejected)
+        created, updated, unchanged = upsert_batch(rows, user)
+        stats.rows += len(batch)
+        stats.created += created
+        stats.updated += updated
+        stats.unchanged += unchanged
+        stats.rejected += rejected_count
+        stats.skipped += skipped_count
+        if progress:
+            progress(stats)
+    
+    # Bulk writes send no signals
+    if stats.created or stats.updated:
+        bump_data_version()
+    return stats
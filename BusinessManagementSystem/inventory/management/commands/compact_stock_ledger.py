@@ -0,0 +1,37 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from inventory.stock import KEEP_DAYS, compact_stock_ledger, ledger_drift
+
+
+class Command(BaseCommand):
+    help = ('Fold stock movements older than the retention period into per-product snapshots '
+            'and check that the ledger still adds up to each product\'s stock')
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-days', type=int, default=KEEP_DAYS,
+                            help=f'Days of movements to keep in the ledger (default: {KEEP_DAYS})')
+        parser.add_argument('--check', action='store_true',
+                            help='Only compare the ledger with the stored stock, without compacting')
+    
+    def handle(self, *args, **options):
+        if options['keep_days'] < 0:
+            raise CommandError('--keep-days cannot be negative')
+        
+        if not options['check']:
+            before = timezone.now() - timedelta(days=options['keep_days'])
+            products, movements = compact_stock_ledger(before)
+            self.stdout.write(f'Folded {movements} movements of {products} products into their snapshots.')
+        
+        mismatches = 0
+        for product in ledger_drift().order_by('id').only('id', 'name', 'quantity'):
+            mismatches += 1
+            self.stdout.write(self.style.WARNING(
+                f'Product {product.id} ({product.name}): stock is {product.quantity}, '
+                f'ledger says {product.ledger_stock}'
+            ))
+        
+        if mismatches:
+            self.stdout.write(self.style.ERROR(f'{mismatches} products do not match their stock ledger.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Stock ledger is consistent.'))
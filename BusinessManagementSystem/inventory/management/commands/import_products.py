@@ -0,0 +1,58 @@
+import os
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from inventory.importer import BATCH_SIZE, ProductImportError, import_products, rejected_rows_writer
+
+
+class Command(BaseCommand):
+    help = ('Create or update products from a CSV file (e.g. a supplier catalogue), matching '
+            'existing products on name and supplier')
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV with name,category,buying_price,selling_price,quantity,supplier columns')
+        parser.add_argument('--rejected', help='Where to write rejected and skipped rows (default: PATH with .rejected.csv)')
+        parser.add_argument('--user', help='Username to record as adding the new products')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help=f'Rows per transaction (default: {BATCH_SIZE})')
+    
+    def handle(self, *args, **options):
+        added_by = None
+        if options['user']:
+            try:
+                added_by = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        
+        rejected_path = options['rejected'] or f"{os.path.splitext(options['path'])[0]}.rejected.csv"
+        started = time.perf_counter()
+        
+        def progress(stats):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{stats.rows} rows ({stats.rows / elapsed:,.0f}/sec): {stats.created} created, '
+                f'{stats.updated} updated, {stats.unchanged} unchanged, {stats.rejected} rejected, '
+                f'{stats.skipped} skipped'
+            )
+        
+        try:
+            with open(options['path'], newline='', encoding='utf-8-sig') as source, \
+                    open(rejected_path, 'w', newline='', encoding='utf-8') as rejected:
+                stats = import_products(source, user=added_by, rejected=rejected_rows_writer(rejected),
+                                        progress=progress, batch_size=options['batch_size'])
+        except OSError as e:
+            raise CommandError(f'Could not read {options["path"]}: {e}')
+        except ProductImportError as e:
+            os.remove(rejected_path)
+            raise CommandError(str(e))
+        
+        if stats.rejected or stats.skipped:
+            self.stdout.write(self.style.WARNING(
+                f'{stats.rejected} rejected and {stats.skipped} skipped rows written to {rejected_path}'))
+        else:
+            os.remove(rejected_path)
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {stats.rows - stats.rejected - stats.skipped} of {stats.rows} rows: {stats.created} created, '
+            f'{stats.updated} updated, {stats.unchanged} unchanged.'
+        ))
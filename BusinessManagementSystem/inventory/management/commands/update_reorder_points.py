@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from inventory.reorder import LEAD_DAYS, SAFETY_DAYS, update_reorder_points
+
+
+class Command(BaseCommand):
+    help = ('Recompute each product\'s sales velocity and reorder point from recent sales; '
+            'run nightly, after midnight, so the day just ended is included')
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--lead-days', type=int, default=LEAD_DAYS,
+                            help=f'Days between ordering and receiving stock (default: {LEAD_DAYS})')
+        parser.add_argument('--safety-days', type=int, default=SAFETY_DAYS,
+                            help=f'Extra days of cover kept as safety stock (default: {SAFETY_DAYS})')
+    
+    def handle(self, *args, **options):
+        count = update_reorder_points(lead_days=options['lead_days'], safety_days=options['safety_days'])
+        self.stdout.write(self.style.SUCCESS(f'Updated reorder points of {count} products.'))
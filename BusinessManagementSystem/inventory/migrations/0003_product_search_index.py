@@ -0,0 +1,76 @@
+# Full-text search indexes over products, kept in sync by triggers
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+# Word-prefix index (ranked) and trigram index (substring matches)
+TABLES = {
+    'inventory_product_fts': "tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'",
+    'inventory_product_trigram': "tokenize = 'trigram'",
+}
+
+
+def create_statements(table, options):
+    return [
+        f"CREATE VIRTUAL TABLE {table} USING fts5(name, category, supplier, {options})",
+        f"""
+        CREATE TRIGGER {table}_insert AFTER INSERT ON inventory_product BEGIN
+            INSERT INTO {table} (rowid, name, category, supplier)
+            VALUES (new.id, new.name, new.category, new.supplier);
+        END
+        """,
+        f"""
+        CREATE TRIGGER {table}_update AFTER UPDATE OF name, category, supplier ON inventory_product BEGIN
+            DELETE FROM {table} WHERE rowid = old.id;
+            INSERT INTO {table} (rowid, name, category, supplier)
+            VALUES (new.id, new.name, new.category, new.supplier);
+        END
+        """,
+        f"""
+        CREATE TRIGGER {table}_delete AFTER DELETE ON inventory_product BEGIN
+            DELETE FROM {table} WHERE rowid = old.id;
+        END
+        """,
+        f"""
+        INSERT INTO {table} (rowid, name, category, supplier)
+        SELECT id, name, category, supplier FROM inventory_product
+        """,
+    ]
+
+
+def create_search_indexes(apps, schema_editor):
+    # Other databases, and SQLite builds without FTS5 or the trigram
+    # tokenizer (3.34+), keep the icontains search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table, options in TABLES.items():
+            statements = create_statements(table, options)
+            try:
+                cursor.execute(statements[0])
+            except OperationalError:
+                continue
+            for statement in statements[1:]:
+                cursor.execute(statement)
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in TABLES:
+            for suffix in ('insert', 'update', 'delete'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {table}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {table}')
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('inventory', '0002_product_date_added_idx'),
+    ]
+    
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_product_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='catalog_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Last change to the name, category or prices', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['catalog_changed_at'], name='product_catalog_changed_idx'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:43
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_product_catalog_changed_at'),
+    ]
+
+    # Nullable and virtual columns only: SQLite adds them with ALTER TABLE,
+    # where anything else rebuilds the table and drops the search triggers
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sales_velocity',
+            field=models.FloatField(blank=True, editable=False, help_text='Units sold per day, from update_reorder_points', null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reorder_point',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Reorder when stock falls to this level, from update_reorder_points', null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reorder_gap',
+            field=models.GeneratedField(db_persist=False, expression=models.F('quantity') - Coalesce('reorder_point', 5), null=True, output_field=models.IntegerField()),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='days_of_stock',
+            field=models.GeneratedField(db_persist=False, expression=models.Case(models.When(sales_velocity__gt=0, then=models.F('quantity') / models.F('sales_velocity'))), null=True, output_field=models.FloatField()),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['reorder_gap', 'days_of_stock'], name='product_reorder_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_product_reorder_point'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name', 'supplier'], name='product_name_supplier_idx'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_snapshots(apps, schema_editor):
+    # Existing stock becomes the opening snapshot; the ledger starts empty
+    Product = apps.get_model('inventory', 'Product')
+    StockSnapshot = apps.get_model('inventory', 'StockSnapshot')
+    now = timezone.now()
+    StockSnapshot.objects.bulk_create(
+        (StockSnapshot(product_id=pk, quantity=quantity, last_movement_id=0, taken_at=now)
+         for pk, quantity in Product.objects.values_list('id', 'quantity').iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('inventory', '0006_product_name_supplier_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(help_text='Stock once the folded movements are applied')),
+                ('last_movement_id', models.BigIntegerField(default=0, help_text='Highest movement id folded in')),
+                ('taken_at', models.DateTimeField(help_text='When the snapshot was last compacted')),
+                ('product', models.OneToOneField(help_text='Product this snapshot belongs to', on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshot', to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Stock Snapshot',
+                'verbose_name_plural': 'Stock Snapshots',
+            },
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('change', models.IntegerField(help_text='Units added (positive) or removed (negative)')),
+                ('reason', models.CharField(choices=[('sale', 'Sale'), ('restock', 'Restock'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(blank=True, help_text='User who made the change', null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('product', models.ForeignKey(help_text='Product whose stock changed', on_delete=django.db.models.deletion.CASCADE, related_name='stock_movements', to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Stock Movement',
+                'verbose_name_plural': 'Stock Movements',
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['product', 'id'], name='stock_movement_product_idx'), models.Index(fields=['created_at'], name='stock_movement_created_idx')],
+            },
+        ),
+        migrations.RunPython(populate_snapshots, migrations.RunPython.noop),
+    ]
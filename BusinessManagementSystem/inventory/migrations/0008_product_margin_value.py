@@ -0,0 +1,38 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:59
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('inventory', '0007_stock_ledger'),
+    ]
+    
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='margin_percent',
+            field=models.GeneratedField(db_persist=False, expression=models.Case(models.When(buying_price__gt=0, then=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(models.F('selling_price'), '-', models.F('buying_price')), models.FloatField()), '*', models.Value(100)), '/', django.db.models.functions.comparison.Cast('buying_price', models.FloatField())))), null=True, output_field=models.FloatField(), verbose_name='Margin %'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stock_value',
+            field=models.GeneratedField(db_persist=False, expression=django.db.models.expressions.CombinedExpression(models.F('buying_price'), '*', models.F('quantity')), null=True, output_field=models.DecimalField(decimal_places=2, max_digits=14), verbose_name='Stock value'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='unit_margin',
+            field=models.GeneratedField(db_persist=False, expression=django.db.models.expressions.CombinedExpression(models.F('selling_price'), '-', models.F('buying_price')), null=True, output_field=models.DecimalField(decimal_places=2, max_digits=10), verbose_name='Profit per unit'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['margin_percent', 'id'], name='product_margin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock_value', 'id'], name='product_stock_value_idx'),
+        ),
+    ]
@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, When
+from django.db.models.functions import Cast, Coalesce
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 from decimal import Decimal
 
 
@@ -21,6 +24,15 @@ class Product(models.Model):
         ('other', 'Other'),
     ]
     
+    # Low-stock threshold for products without a computed reorder point
+    DEFAULT_REORDER_POINT = 5
+    
+    # Fields shown or totalled by the reports; changing one stamps catalog_changed_at
+    CATALOG_FIELDS = ('name', 'category', 'buying_price', 'selling_price')
+    
+    # User recorded on the stock movement of the next save (set by the views and admin)
+    stock_changed_by = None
+    
     name = models.CharField(max_length=200, help_text="Product name")
     category = models.CharField(
         max_length=50, 
@@ -46,6 +58,63 @@ class Product(models.Model):
     )
     supplier = models.CharField(max_length=200, help_text="Supplier name")
     date_added = models.DateTimeField(auto_now_add=True)
+    sales_velocity = models.FloatField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Units sold per day, from update_reorder_points"
+    )
+    reorder_point = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Reorder when stock falls to this level, from update_reorder_points"
+    )
+    # Virtual columns: computed on read, with their values kept in the indexes below
+    reorder_gap = models.GeneratedField(
+        expression=F('quantity') - Coalesce('reorder_point', DEFAULT_REORDER_POINT),
+        output_field=models.IntegerField(),
+        db_persist=False,
+        null=True,
+    )
+    days_of_stock = models.GeneratedField(
+        expression=Case(When(sales_velocity__gt=0, then=F('quantity') / F('sales_velocity'))),
+        output_field=models.FloatField(),
+        db_persist=False,
+        null=True,
+    )
+    # Virtual columns mirroring profit_per_unit, profit_percentage and
+    # total_value, so the lists can sort, filter and total them in SQL
+    unit_margin = models.GeneratedField(
+        verbose_name="Profit per unit",
+        expression=F('selling_price') - F('buying_price'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=False,
+        null=True,
+    )
+    margin_percent = models.GeneratedField(
+        verbose_name="Margin %",
+        # Cast so SQLite does not divide whole-number prices as integers
+        expression=Case(When(buying_price__gt=0, then=(
+            Cast(F('selling_price') - F('buying_price'), FloatField()) * 100
+            / Cast('buying_price', FloatField())))),
+        output_field=models.FloatField(),
+        db_persist=False,
+        null=True,
+    )
+    stock_value = models.GeneratedField(
+        verbose_name="Stock value",
+        expression=F('buying_price') * F('quantity'),
+        output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        db_persist=False,
+        null=True,
+    )
+    catalog_changed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Last change to the name, category or prices"
+    )
     added_by = models.ForeignKey(
         User, 
         on_delete=models.SET_NULL, 
@@ -58,10 +127,80 @@ class Product(models.Model):
         ordering = ['-date_added']
         verbose_name = "Product"
         verbose_name_plural = "Products"
+        indexes = [
+            models.Index(fields=['date_added', 'id'], name='product_date_added_idx'),
+            models.Index(fields=['catalog_changed_at'], name='product_catalog_changed_idx'),
+            models.Index(fields=['reorder_gap', 'days_of_stock'], name='product_reorder_idx'),
+            models.Index(fields=['name', 'supplier'], name='product_name_supplier_idx'),
+            models.Index(fields=['margin_percent', 'id'], name='product_margin_idx'),
+            models.Index(fields=['stock_value', 'id'], name='product_stock_value_idx'),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.category})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_catalog = instance.catalog_values()
+        if 'quantity' not in instance.get_deferred_fields():
+            instance._loaded_quantity = instance.quantity
+        return instance
+    
+    def catalog_values(self):
+        """The loaded values of CATALOG_FIELDS (deferred fields are left out)"""
+        deferred = self.get_deferred_fields()
+        return {name: getattr(self, name) for name in self.CATALOG_FIELDS if name not in deferred}
+    
+    def save(self, *args, **kwargs):
+        """
+        Override save to stamp catalog_changed_at when a report-visible
+        field changes and to record stock changes in the ledger.
+        
+        The quantity of an existing product is never written back as it
+        was read: an edit is applied as the difference from the loaded
+        value, so sales made meanwhile are kept. More stock is recorded as
+        a restock and less as an adjustment.
+        """
+        loaded = getattr(self, '_loaded_catalog', None)
+        # New products have no sales yet, so they cannot change a report
+        if loaded and any(getattr(self, name) != value for name, value in loaded.items()):
+            self.catalog_changed_at = timezone.now()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'catalog_changed_at'}
+        
+        with transaction.atomic():
+            if self._state.adding:
+                super().save(*args, **kwargs)
+                if self.quantity:
+                    StockMovement.objects.create(
+                        product=self, change=self.quantity, reason=StockMovement.RESTOCK,
+                        created_by=self.stock_changed_by or self.added_by, note='Opening stock')
+            else:
+                self._save_with_stock_change(*args, **kwargs)
+        self._loaded_catalog = self.catalog_values()
+        self._loaded_quantity = self.quantity
+    
+    def _save_with_stock_change(self, *args, **kwargs):
+        loaded_quantity = getattr(self, '_loaded_quantity', None)
+        if loaded_quantity is None and 'quantity' not in self.get_deferred_fields():
+            loaded_quantity = Product.objects.filter(pk=self.pk).values_list('quantity', flat=True).first()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            deferred = self.get_deferred_fields()
+            update_fields = [field.name for field in self._meta.concrete_fields
+                             if not field.primary_key and not field.generated and field.attname not in deferred]
+        kwargs['update_fields'] = {*update_fields} - {'quantity'}
+        
+        super().save(*args, **kwargs)
+        change = self.quantity - loaded_quantity if loaded_quantity is not None else 0
+        if change:
+            reason = StockMovement.RESTOCK if change > 0 else StockMovement.ADJUSTMENT
+            self.quantity = loaded_quantity
+            if not self.adjust_stock(change, reason, user=self.stock_changed_by):
+                raise ValueError(f"Insufficient stock. Available: {self.quantity}, Requested: {-change}")
+    
     @property
     def profit_per_unit(self):
         """Calculate profit per unit"""
@@ -74,24 +213,191 @@ class Product(models.Model):
             return ((self.selling_price - self.buying_price) / self.buying_price) * 100
         return 0
     
+    @property
+    def reorder_level(self):
+        """The reorder point, or the default threshold until one is computed"""
+        return self.reorder_point if self.reorder_point is not None else self.DEFAULT_REORDER_POINT
+    
     @property
     def is_low_stock(self):
-        """Check if product is low in stock (≤ 5 units)"""
-        return self.quantity <= 5
+        """Check if product is at or below its reorder point"""
+        return self.quantity <= self.reorder_level
+    
+    @classmethod
+    def needing_reorder(cls):
+        """
+        Products at or below their reorder point, most urgent first.
+        
+        Filters on the indexed reorder_gap column; products that will run
+        out soonest come first, then those without recent sales.
+        """
+        return (cls.objects
+                .filter(reorder_gap__lte=0)
+                .order_by(F('days_of_stock').asc(nulls_last=True), 'reorder_gap', 'id'))
     
     @property
     def total_value(self):
         """Calculate total inventory value at buying price"""
         return self.buying_price * self.quantity
     
+    @classmethod
+    def category_valuation(cls, queryset=None):
+        """
+        Products, units and stock value at cost and at selling price per
+        category, largest stock value first, in one grouped query.
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        return (queryset
+                .order_by()
+                .values('category')
+                .annotate(
+                    products=Count('id'),
+                    units=Sum('quantity'),
+                    value=Sum('stock_value'),
+                    retail_value=Sum(F('selling_price') * F('quantity')),
+                    potential_profit=Sum(F('unit_margin') * F('quantity')))
+                .order_by('-value', 'category'))
+    
     def can_sell(self, quantity):
         """Check if we can sell the requested quantity"""
         return self.quantity >= quantity
     
-    def reduce_stock(self, quantity):
-        """Reduce stock quantity after a sale"""
-        if self.can_sell(quantity):
-            self.quantity -= quantity
-            self.save()
+    def adjust_stock(self, change, reason, user=None, note=''):
+        """
+        Add ``change`` units (negative to remove) and record the movement.
+        
+        Runs a single conditional ``UPDATE ... SET quantity = quantity + n
+        WHERE quantity >= -n`` so concurrent sales can never oversell, and
+        reports insufficient stock from the affected-row count.
+        """
+        queryset = Product.objects.filter(pk=self.pk)
+        if change < 0:
+            queryset = queryset.filter(quantity__gte=-change)
+        with transaction.atomic(savepoint=False):
+            updated = queryset.update(quantity=F('quantity') + change)
+            if updated:
+                StockMovement.objects.create(
+                    product=self, change=change, reason=reason, created_by=user, note=note)
+        if updated:
+            self.quantity += change
+            self._loaded_quantity = self.quantity
             return True
+        
+        # Refresh so callers can report the stock that is actually left
+        self.refresh_from_db(fields=['quantity'])
+        self._loaded_quantity = self.quantity
         return False
+    
+    def reduce_stock(self, quantity, user=None):
+        """Reduce stock quantity after a sale; False if there is not enough left"""
+        return self.adjust_stock(-quantity, StockMovement.SALE, user=user)
+    
+    @classmethod
+    def reduce_stock_bulk(cls, quantities, chunk_size=200, user=None):
+        """
+        Reduce stock for many products, given a {product_id: quantity} dict.
+        
+        Each chunk of products is one conditional ``UPDATE ... SET quantity =
+        CASE ...`` that only touches rows with enough stock, and the sale
+        movements are inserted in one go. Returns False if any product fell
+        short; callers must run this inside a transaction and roll it back
+        in that case.
+        """
+        items = list(quantities.items())
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            condition = Q()
+            whens = []
+            for product_id, quantity in chunk:
+                condition |= Q(pk=product_id, quantity__gte=quantity)
+                whens.append(When(pk=product_id, then=F('quantity') - quantity))
+            updated = cls.objects.filter(condition).update(
+                quantity=Case(*whens, default=F('quantity')))
+            if updated != len(chunk):
+                return False
+        StockMovement.objects.bulk_create(
+            [StockMovement(product_id=product_id, change=-quantity, reason=StockMovement.SALE, created_by=user)
+             for product_id, quantity in items],
+            batch_size=500)
+        return True
+
+
+class StockMovement(models.Model):
+    """
+    One change to a product's stock. Rows are only ever inserted.
+    
+    Every write to Product.quantity records its delta here in the same
+    transaction, so the ledger is the audit trail of the stock. Old
+    movements are folded into StockSnapshot by compact_stock_ledger; the
+    current stock of any product set can be rebuilt from the ledger with
+    inventory.stock.with_ledger_stock.
+    """
+    SALE = 'sale'
+    RESTOCK = 'restock'
+    ADJUSTMENT = 'adjustment'
+    REASON_CHOICES = [
+        (SALE, 'Sale'),
+        (RESTOCK, 'Restock'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+    
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_movements',
+        help_text="Product whose stock changed"
+    )
+    change = models.IntegerField(help_text="Units added (positive) or removed (negative)")
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    note = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        help_text="User who made the change"
+    )
+    
+    class Meta:
+        ordering = ['-id']
+        verbose_name = "Stock Movement"
+        verbose_name_plural = "Stock Movements"
+        indexes = [
+            models.Index(fields=['product', 'id'], name='stock_movement_product_idx'),
+            models.Index(fields=['created_at'], name='stock_movement_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id}: {self.change:+d} ({self.reason})"
+    
+    def save(self, *args, **kwargs):
+        """Override save to keep recorded movements unchanged"""
+        if not self._state.adding:
+            raise ValueError("Stock movements cannot be changed once recorded")
+        super().save(*args, **kwargs)
+
+
+class StockSnapshot(models.Model):
+    """
+    A product's stock folded from its movements up to ``last_movement_id``.
+    
+    Current stock is the snapshot plus the movements recorded after it.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='stock_snapshot',
+        help_text="Product this snapshot belongs to"
+    )
+    quantity = models.IntegerField(help_text="Stock once the folded movements are applied")
+    last_movement_id = models.BigIntegerField(default=0, help_text="Highest movement id folded in")
+    taken_at = models.DateTimeField(help_text="When the snapshot was last compacted")
+    
+    class Meta:
+        verbose_name = "Stock Snapshot"
+        verbose_name_plural = "Stock Snapshots"
+    
+    def __str__(self):
+        return f"{self.product_id}: {self.quantity} through movement {self.last_movement_id}"
@@ -0,0 +1,96 @@
+"""
+Demand-driven reorder points, recomputed nightly by update_reorder_points.
+
+The units each product sold on each of the last LONG_WINDOW full days are
+read from the daily sales rollup into a products x days matrix. Short and
+long moving averages of every row come from one cumulative sum, divided
+by the days the product has actually been listed so new products are not
+undercounted. The higher of the two is the product's sales velocity (so a
+product that has started selling faster is caught within a week), and
+its reorder point is the stock that covers the supplier lead time plus
+the safety stock at that velocity.
+
+Days of stock left and the gap to the reorder point are virtual columns
+of Product that follow every stock change between runs.
+"""
+import math
+import numpy as np
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from dashboard.cache import bump_data_version
+from sales.models import DailySalesRollup
+from .models import Product
+
+
+SHORT_WINDOW = 7
+LONG_WINDOW = 28
+
+# Days between placing an order and the stock arriving
+LEAD_DAYS = 7
+
+# Extra days of cover kept against demand spikes and late deliveries
+SAFETY_DAYS = 3
+
+# Products written per UPDATE
+BATCH_SIZE = 500
+
+
+def moving_averages(units, listed_days, windows):
+    """
+    Average daily units over the trailing ``windows`` of a products x days
+    matrix (oldest day first), one column per window.
+    
+    A product listed for fewer days than a window is averaged over the
+    days it was listed (at least one).
+    """
+    cumulative = np.zeros((units.shape[0], units.shape[1] + 1))
+    np.cumsum(units, axis=1, out=cumulative[:, 1:])
+    averages = np.empty((units.shape[0], len(windows)))
+    for column, window in enumerate(windows):
+        window_total = cumulative[:, -1] - cumulative[:, -1 - min(window, units.shape[1])]
+        averages[:, column] = window_total / np.clip(listed_days, 1, window)
+    return averages
+
+
+def daily_units(product_ids, start, days):
+    """Units sold per product (rows, in ``product_ids`` order) and day from ``start``"""
+    units = np.zeros((len(product_ids), days))
+    rows = (DailySalesRollup.objects
+            .filter(date__gte=start, date__lt=start + timedelta(days=days))
+            .values_list('product_id', 'date', 'units'))
+    data = np.array([(pk, (day - start).days, count) for pk, day, count in rows], dtype=np.int64).reshape(-1, 3)
+    position = np.searchsorted(product_ids, data[:, 0])
+    np.add.at(units, (position, data[:, 1]), data[:, 2])
+    return units
+
+
+def update_reorder_points(today=None, lead_days=LEAD_DAYS, safety_days=SAFETY_DAYS):
+    """Recompute every product's sales velocity and reorder point; returns the number updated"""
+    today = today or timezone.localdate()
+    start = today - timedelta(days=LONG_WINDOW)
+    
+    products = list(Product.objects.order_by('id').only('id', 'date_added', 'sales_velocity', 'reorder_point'))
+    if not products:
+        return 0
+    product_ids = np.array([product.pk for product in products], dtype=np.int64)
+    listed_days = np.array([(today - timezone.localdate(product.date_added)).days for product in products])
+    
+    units = daily_units(product_ids, start, LONG_WINDOW)
+    velocity = moving_averages(units, listed_days, (SHORT_WINDOW, LONG_WINDOW)).max(axis=1)
+    
+    changed = []
+    for product, rate in zip(products, velocity.tolist()):
+        rate = round(rate, 3)
+        # Rounded first so float noise (0.3 * 10 = 3.0000000000000004) cannot add a unit
+        point = math.ceil(round(rate * (lead_days + safety_days), 6))
+        if (product.sales_velocity, product.reorder_point) != (rate, point):
+            product.sales_velocity, product.reorder_point = rate, point
+            changed.append(product)
+    
+    with transaction.atomic():
+        Product.objects.bulk_update(changed, ['sales_velocity', 'reorder_point'], batch_size=BATCH_SIZE)
+    # bulk_update sends no signals; the low stock KPIs depend on these fields
+    if changed:
+        bump_data_version()
+    return len(changed)
@@ -0,0 +1,148 @@
+"""
+Product search and autocomplete.
+
+On SQLite with FTS5, migration 0003 maintains two indexes over product
+name, category and supplier: ``inventory_product_fts`` matches word
+prefixes ranked by bm25, and ``inventory_product_trigram`` matches
+substrings of three or more characters anywhere in the text. Databases
+without them fall back to ``icontains`` filters.
+
+Their triggers are restored after every migrate by
+``restore_search_index``, in case a migration remade inventory_product
+and dropped them.
+"""
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from BusinessManagementSystem.search import (
+    fts_table_exists, phrase_match_expression, prefix_match_expression, restore_triggers,
+)
+from .models import Product
+
+
+PREFIX_TABLE = 'inventory_product_fts'
+TRIGRAM_TABLE = 'inventory_product_trigram'
+
+# Trigram matching needs at least one full trigram
+MIN_TRIGRAM_LENGTH = 3
+
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+
+def search_triggers(table):
+    """The triggers of migration 0003 for one index table"""
+    return {
+        f'{table}_insert': f"""
+            CREATE TRIGGER {table}_insert AFTER INSERT ON inventory_product BEGIN
+                INSERT INTO {table} (rowid, name, category, supplier)
+                VALUES (new.id, new.name, new.category, new.supplier);
+            END
+        """,
+        f'{table}_update': f"""
+            CREATE TRIGGER {table}_update AFTER UPDATE OF name, category, supplier ON inventory_product BEGIN
+                DELETE FROM {table} WHERE rowid = old.id;
+                INSERT INTO {table} (rowid, name, category, supplier)
+                VALUES (new.id, new.name, new.category, new.supplier);
+            END
+        """,
+        f'{table}_delete': f"""
+            CREATE TRIGGER {table}_delete AFTER DELETE ON inventory_product BEGIN
+                DELETE FROM {table} WHERE rowid = old.id;
+            END
+        """,
+    }
+
+
+def restore_search_index(sender, using='default', verbosity=1, **kwargs):
+    """post_migrate handler recreating dropped index triggers and reindexing the products"""
+    for table in (PREFIX_TABLE, TRIGRAM_TABLE):
+        rebuild = (f'INSERT INTO {table} (rowid, name, category, supplier) '
+                   f'SELECT id, name, category, supplier FROM inventory_product')
+        restored = restore_triggers(table, search_triggers(table), rebuild, using)
+        if restored and verbosity >= 1:
+            print(f"  Restored product search triggers: {', '.join(restored)}")
+
+
+def _matches(table, expression):
+    return RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [expression])
+
+
+def _rank(table, expression):
+    return RawSQL(
+        f'SELECT rank FROM {table} WHERE {table} MATCH %s AND rowid = inventory_product.id',
+        [expression],
+    )
+
+
+def _use_trigram(query, using):
+    return len(query.strip()) >= MIN_TRIGRAM_LENGTH and fts_table_exists(TRIGRAM_TABLE, using)
+
+
+def search_products(queryset, query):
+    """
+    Filter a Product queryset to products matching ``query``.
+    
+    A product matches if every word prefixes a word of its name, category
+    or supplier, or if the query occurs anywhere in them (the substring
+    semantics of the previous ``icontains`` search).
+    """
+    expression = prefix_match_expression(query)
+    if not expression or not fts_table_exists(PREFIX_TABLE, queryset.db):
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(category__icontains=query) |
+            Q(supplier__icontains=query)
+        )
+    
+    condition = Q(id__in=_matches(PREFIX_TABLE, expression))
+    if _use_trigram(query, queryset.db):
+        condition |= Q(id__in=_matches(TRIGRAM_TABLE, phrase_match_expression(query)))
+    return queryset.filter(condition)
+
+
+def autocomplete_products(query, limit=AUTOCOMPLETE_LIMIT, in_stock=False):
+    """
+    Return up to ``limit`` best matches for ``query`` as dicts with id,
+    name, price, cost and stock.
+    
+    Word-prefix matches come first in rank order; remaining slots are
+    filled with substring (trigram) matches. Each step is one LIMITed
+    query, so the cost does not depend on the catalogue size.
+    """
+    queryset = Product.objects.all()
+    if in_stock:
+        queryset = queryset.filter(quantity__gt=0)
+    fields = ('id', 'name', 'selling_price', 'buying_price', 'quantity')
+    
+    expression = prefix_match_expression(query)
+    if not expression:
+        return []
+    
+    if not fts_table_exists(PREFIX_TABLE, queryset.db):
+        rows = list(queryset.filter(name__icontains=query.strip()).order_by('name').values(*fields)[:limit])
+    else:
+        rows = list(queryset
+                    .filter(id__in=_matches(PREFIX_TABLE, expression))
+                    .annotate(search_rank=_rank(PREFIX_TABLE, expression))
+                    .order_by('search_rank', 'name')
+                    .values(*fields)[:limit])
+        
+        if len(rows) < limit and _use_trigram(query, queryset.db):
+            phrase = phrase_match_expression(query)
+            rows += list(queryset
+                         .filter(id__in=_matches(TRIGRAM_TABLE, phrase))
+                         .exclude(id__in=[row['id'] for row in rows])
+                         .annotate(search_rank=_rank(TRIGRAM_TABLE, phrase))
+                         .order_by('search_rank', 'name')
+                         .values(*fields)[:limit - len(rows)])
+    
+    return [
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'price': row['selling_price'],
+            'cost': row['buying_price'],
+            'stock': row['quantity'],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,85 @@
+"""
+Reading and compacting the stock movement ledger.
+
+A product's stock according to the ledger is its StockSnapshot quantity
+plus the movements recorded after the snapshot. with_ledger_stock
+annotates any product queryset with that sum in one query: the later
+movements of each product are a range scan of the (product, id) index.
+
+Compaction folds every movement older than a cutoff into the snapshots
+and deletes it, so the ledger only keeps recent history. It works on a
+fixed range of movement ids, so sales recorded while it runs are left
+for the next run.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Product, StockMovement, StockSnapshot
+
+
+# Days of movements compact_stock_ledger leaves in the ledger by default
+KEEP_DAYS = 90
+
+# Snapshots written per query
+BATCH_SIZE = 500
+
+
+def with_ledger_stock(queryset=None):
+    """Annotate products (default: all) with ``ledger_stock``, the snapshot plus later movements"""
+    if queryset is None:
+        queryset = Product.objects.all()
+    later = (StockMovement.objects
+             .filter(product=OuterRef('pk'),
+                     id__gt=Coalesce(OuterRef('stock_snapshot__last_movement_id'), Value(0)))
+             .order_by()
+             .values('product')
+             .annotate(total=Sum('change'))
+             .values('total'))
+    return queryset.annotate(
+        ledger_stock=Coalesce('stock_snapshot__quantity', Value(0)) + Coalesce(Subquery(later), Value(0)))
+
+
+def ledger_drift(queryset=None):
+    """Products whose quantity does not match their ledger stock"""
+    return with_ledger_stock(queryset).exclude(ledger_stock=F('quantity'))
+
+
+@transaction.atomic
+def compact_stock_ledger(before):
+    """
+    Fold the movements recorded before ``before`` into the snapshots and
+    delete them; returns (products, movements) folded.
+    """
+    through = (StockMovement.objects
+               .filter(created_at__lt=before)
+               .aggregate(last=Max('id'))['last'])
+    if through is None:
+        return 0, 0
+    
+    folded = list(StockMovement.objects
+                  .filter(id__lte=through)
+                  .values('product_id')
+                  .annotate(total=Sum('change'), movements=Count('id'))
+                  .order_by())
+    totals = {row['product_id']: row['total'] for row in folded}
+    movements = sum(row['movements'] for row in folded)
+    
+    snapshots = StockSnapshot.objects.select_for_update().in_bulk(list(totals), field_name='product_id')
+    now = timezone.now()
+    to_update, to_create = [], []
+    for product_id, total in totals.items():
+        snapshot = snapshots.get(product_id)
+        if snapshot is None:
+            to_create.append(StockSnapshot(
+                product_id=product_id, quantity=total, last_movement_id=through, taken_at=now))
+            continue
+        snapshot.quantity += total
+        snapshot.last_movement_id = through
+        snapshot.taken_at = now
+        to_update.append(snapshot)
+    
+    StockSnapshot.objects.bulk_update(to_update, ['quantity', 'last_movement_id', 'taken_at'], batch_size=BATCH_SIZE)
+    StockSnapshot.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+    StockMovement.objects.filter(id__lte=through).delete()
+    return len(totals), movements
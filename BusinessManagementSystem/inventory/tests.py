@@ -1,3 +1,459 @@
-from django.test import TestCase
+import csv
+import io
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+import numpy as np
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from dashboard.cache import get_cache
+from sales.forms import SaleForm
+from sales.models import DailySalesRollup, Order, Sale
+from .importer import ProductImportError, import_products, rejected_rows_writer
+from .models import Product, StockMovement, StockSnapshot
+from .reorder import moving_averages, update_reorder_points
+from .search import autocomplete_products, search_products
+from .stock import compact_stock_ledger, ledger_drift, with_ledger_stock
+from .views import ProductImportView, ProductListView
 
-# Create your tests here.
+
+def make_product(name, quantity=10, supplier='Acme', category='other'):
+    return Product.objects.create(
+        name=name,
+        category=category,
+        buying_price=Decimal('2.00'),
+        selling_price=Decimal('3.50'),
+        quantity=quantity,
+        supplier=supplier,
+    )
+
+
+class ProductSearchTests(TestCase):
+    """Product search uses the prefix and trigram indexes with icontains semantics."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.charger = make_product('Phone Charger')
+        cls.headphones = make_product('Headphones', supplier='Sound Co')
+        cls.microphone = make_product('Microphone', quantity=0)
+        cls.kettle = make_product('Kettle', category='home')
+    
+    def names(self, results):
+        return [result['name'] for result in results]
+    
+    def test_prefix_matches_rank_before_substring_matches(self):
+        results = autocomplete_products('phon')
+        self.assertEqual(results[0]['name'], 'Phone Charger')
+        self.assertEqual(set(self.names(results[1:])), {'Headphones', 'Microphone'})
+    
+    def test_autocomplete_limit_and_stock_filter(self):
+        self.assertEqual(len(autocomplete_products('phon', limit=2)), 2)
+        self.assertNotIn('Microphone', self.names(autocomplete_products('phon', in_stock=True)))
+        self.assertEqual(autocomplete_products('  '), [])
+    
+    def test_search_keeps_substring_semantics(self):
+        self.assertEqual(
+            set(search_products(Product.objects.all(), 'phone')),
+            {self.charger, self.headphones, self.microphone})
+        self.assertEqual(list(search_products(Product.objects.all(), 'sound')), [self.headphones])
+        self.assertEqual(list(search_products(Product.objects.all(), 'home')), [self.kettle])
+        self.assertEqual(list(search_products(Product.objects.all(), 'ph "OR')), [])
+    
+    def test_index_follows_product_edits(self):
+        Product.objects.filter(pk=self.kettle.pk).update(name='Toaster')
+        self.assertEqual(self.names(autocomplete_products('toast')), ['Toaster'])
+        self.assertEqual(autocomplete_products('kett'), [])
+        
+        self.kettle.delete()
+        self.assertEqual(autocomplete_products('toast'), [])
+    
+    def test_autocomplete_endpoint(self):
+        user = User.objects.create_user('clerk', password='secret')
+        self.client.force_login(user)
+        response = self.client.get(reverse('inventory:product_autocomplete'), {'q': 'kett'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [{
+            'id': self.kettle.pk, 'name': 'Kettle', 'price': '3.50', 'cost': '2.00', 'stock': 10,
+        }])
+        
+        response = self.client.get(reverse('inventory:product_autocomplete'), {'q': 'kett', 'limit': 'x'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_sale_form_render_does_not_list_the_catalogue(self):
+        for index in range(20):
+            make_product(f'Filler {index}')
+        with CaptureQueriesContext(connection) as ctx:
+            html = SaleForm().as_p()
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertNotIn('Filler', html)
+        
+        with CaptureQueriesContext(connection) as ctx:
+            html = SaleForm(initial={'product': self.kettle.pk}).as_p()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn('data-name="Kettle"', html)
+
+
+class ReorderPointTests(TestCase):
+    """Reorder points follow each product's sales velocity and drive the low stock lists."""
+    
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.fast = make_product('Fast mover', quantity=80)
+        self.slow = make_product('Slow mover', quantity=3)
+        self.idle = make_product('Never sold', quantity=4)
+        Product.objects.update(date_added=timezone.now() - timedelta(days=90))
+    
+    def sell(self, product, units, days_ago):
+        DailySalesRollup.objects.create(date=self.today - timedelta(days=days_ago), product=product,
+                                        category=product.category, units=units, transactions=1)
+    
+    def test_moving_averages(self):
+        units = np.array([[1, 1, 1, 1, 4, 4], [0, 0, 0, 0, 0, 6]])
+        averages = moving_averages(units, np.array([30, 2]), (2, 6))
+        self.assertEqual(averages.tolist(), [[4.0, 2.0], [3.0, 3.0]])
+    
+    def test_points_follow_velocity(self):
+        for days_ago in range(1, 29):
+            self.sell(self.fast, 10, days_ago)
+        for days_ago in (4, 11, 18, 25):
+            self.sell(self.slow, 1, days_ago)
+        self.sell(self.slow, 1, 0)  # today is not a full day yet
+        self.assertEqual(update_reorder_points(), 3)
+        
+        self.fast.refresh_from_db()
+        self.slow.refresh_from_db()
+        self.idle.refresh_from_db()
+        self.assertEqual((self.fast.sales_velocity, self.fast.reorder_point), (10.0, 100))
+        self.assertEqual((self.slow.sales_velocity, self.slow.reorder_point), (0.143, 2))
+        self.assertEqual((self.idle.sales_velocity, self.idle.reorder_point), (0.0, 0))
+        self.assertEqual(self.fast.days_of_stock, 8.0)
+        self.assertTrue(self.fast.is_low_stock)
+        self.assertFalse(self.slow.is_low_stock)
+        # Nothing changed, nothing written
+        self.assertEqual(update_reorder_points(), 0)
+    
+    def test_low_stock_lists_rank_by_urgency(self):
+        # Before the first run every product uses the default threshold of 5
+        self.assertEqual(list(Product.needing_reorder()), [self.slow, self.idle])
+        
+        for days_ago in range(1, 8):
+            self.sell(self.fast, 10, days_ago)
+            self.sell(self.slow, 1, days_ago)
+        update_reorder_points()
+        Product.objects.filter(pk=self.idle.pk).update(quantity=0)
+        with self.assertNumQueries(1):
+            ranked = list(Product.needing_reorder())
+        # 3 days of stock left, then 8, then no recent sales
+        self.assertEqual(ranked, [self.slow, self.fast, self.idle])
+        
+        with connection.cursor() as cursor:
+            sql, params = Product.needing_reorder().query.sql_with_params()
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            self.assertIn('product_reorder_idx', str(cursor.fetchall()))
+        
+        view = ProductListView()
+        view.setup(RequestFactory().get('/inventory/', {'stock': 'low'}))
+        self.assertEqual(view.get_queryset().count(), 3)
+
+
+class ProductImportTests(TestCase):
+    """Streaming CSV import keyed on name and supplier"""
+    
+    HEADER = 'name,category,buying_price,selling_price,quantity,supplier\n'
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='importer', password='testpass123')
+        self.existing = Product.objects.create(
+            name='Desk Lamp', category='home', buying_price=Decimal('10.00'),
+            selling_price=Decimal('15.00'), quantity=4, supplier='Acme', added_by=self.user,
+        )
+        self.other_supplier = Product.objects.create(
+            name='Desk Lamp', category='home', buying_price=Decimal('9.00'),
+            selling_price=Decimal('14.00'), quantity=2, supplier='Globex', added_by=self.user,
+        )
+    
+    def run_import(self, rows, **kwargs):
+        rejected = io.StringIO()
+        stats = import_products(io.StringIO(self.HEADER + rows), user=self.user,
+                                rejected=rejected_rows_writer(rejected), **kwargs)
+        return stats, list(csv.DictReader(io.StringIO(rejected.getvalue())))
+    
+    def test_import_creates_updates_and_rejects(self):
+        stats, rejected = self.run_import(
+            'Desk Lamp,home,10.00,18.00,30,Acme\n'        # price and stock change
+            'Desk Lamp,home,9.00,14.00,2,Globex\n'        # identical
+            'Desk Lamp,home,9.00,14.00,2,Initech\n'       # same name, new supplier
+            'Cable,electronics,1.00,3.00,100,Acme\n'
+            'Broken,garden,5.00,4.00,-1,Acme\n'
+        )
+        self.assertEqual(stats.as_dict(), {'rows': 5, 'created': 2, 'updated': 1, 'unchanged': 1, 'rejected': 1, 'skipped': 0})
+        
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.selling_price, self.existing.quantity), (Decimal('18.00'), 30))
+        self.assertIsNotNone(self.existing.catalog_changed_at)
+        self.assertEqual(Product.objects.filter(name='Desk Lamp').count(), 3)
+        self.assertEqual(Product.objects.get(name='Cable').added_by, self.user)
+        
+        self.assertEqual(len(rejected), 1)
+        self.assertEqual(rejected[0]['line'], '6')
+        self.assertEqual(rejected[0]['name'], 'Broken')
+        self.assertIn('category', rejected[0]['errors'])
+        self.assertIn('quantity', rejected[0]['errors'])
+    
+    def test_repeated_rows_are_skipped_and_reported(self):
+        stats, report = self.run_import(
+            'Cable,electronics,1.00,3.00,100,Acme\n'
+            'Desk Lamp,home,10.00,15.00,6,Acme\n'
+            ' Cable ,electronics,1.00,3.50,80,Acme\n'   # same key once cleaned
+            'Cable,electronics,1.00,3.00,100,Globex\n'
+        )
+        self.assertEqual(stats.as_dict(), {'rows': 4, 'created': 2, 'updated': 1, 'unchanged': 0,
+                                           'rejected': 0, 'skipped': 1})
+        self.assertEqual(Product.objects.get(name='Cable', supplier='Acme').quantity, 80)
+        self.assertEqual([(row['line'], row['quantity'], row['errors']) for row in report],
+                         [('2', '100', 'Skipped: same name and supplier as line 4')])
+    
+    def test_stock_only_change_is_not_a_catalog_change(self):
+        stats, _ = self.run_import('Desk Lamp,home,10.00,15.00,40,Acme\n')
+        self.assertEqual(stats.updated, 1)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.quantity, 40)
+        self.assertIsNone(self.existing.catalog_changed_at)
+    
+    def test_batches_use_constant_queries(self):
+        rows = ''.join(f'Item {i},books,1.00,2.00,{i},Acme\n' for i in range(10))
+        seen = []
+        with CaptureQueriesContext(connection) as queries:
+            stats, _ = self.run_import(rows, batch_size=4, progress=lambda s: seen.append(s.rows))
+        self.assertEqual(stats.created, 10)
+        self.assertEqual(seen, [4, 8, 10])
+        # Per batch: savepoint, lookup, product insert, movement insert and
+        # release, whatever the batch size
+        self.assertLessEqual(len(queries), 3 * 5)
+    
+    def test_missing_columns_are_refused(self):
+        with self.assertRaisesMessage(ProductImportError, 'quantity, supplier'):
+            import_products(io.StringIO('name,category,buying_price,selling_price\n'))
+    
+    def test_upload_page_reports_results(self):
+        upload = SimpleUploadedFile('products.csv', (
+            self.HEADER + 'Cable,electronics,1.00,3.00,100,Acme\nBroken,toys,5.00,4.00,1,Acme\n'
+        ).encode('utf-8-sig'), content_type='text/csv')
+        request = RequestFactory().post(reverse('inventory:product_import'), {'file': upload})
+        request.user = self.user
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        view = ProductImportView()
+        view.setup(request)
+        form = view.get_form()
+        self.assertTrue(form.is_valid())
+        
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with self.settings(MEDIA_ROOT=media_root):
+            response = view.form_valid(form)
+            self.assertEqual(response.context_data['stats'].created, 1)
+            self.assertEqual(response.context_data['stats'].rejected, 1)
+            self.assertIn('rejected-products-', response.context_data['rejected_url'])
+
+
+class StockLedgerTests(TestCase):
+    """Insert-only stock movements, snapshots and compaction"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(username='stock', password='testpass123')
+        self.product = Product.objects.create(
+            name='Notebook', category='books', buying_price=Decimal('2.00'),
+            selling_price=Decimal('4.00'), quantity=10, supplier='Paperco', added_by=self.user,
+        )
+    
+    def movements(self, product=None):
+        return list(StockMovement.objects.filter(product=product or self.product)
+                    .order_by('id').values_list('change', 'reason'))
+    
+    def test_every_stock_change_is_recorded(self):
+        Sale.objects.create(product=self.product, quantity_sold=3, sold_by=self.user)
+        other = Product.objects.create(
+            name='Pen', category='books', buying_price=Decimal('1.00'),
+            selling_price=Decimal('2.00'), quantity=5, supplier='Paperco',
+        )
+        Order.create_with_lines([{'product': self.product.pk, 'quantity': 1},
+                                 {'product': other.pk, 'quantity': 2}], sold_by=self.user)
+        
+        self.assertEqual(self.movements(), [(10, 'restock'), (-3, 'sale'), (-1, 'sale')])
+        self.assertEqual(self.movements(other), [(5, 'restock'), (-2, 'sale')])
+        self.assertFalse(StockMovement.objects.filter(reason='sale').exclude(created_by=self.user).exists())
+        with self.assertRaises(ValueError):
+            StockMovement.objects.first().save()
+    
+    def test_edit_applies_the_difference_from_the_loaded_stock(self):
+        edited = Product.objects.get(pk=self.product.pk)
+        # A sale lands while the edit form is open
+        Sale.objects.create(product=self.product, quantity_sold=2)
+        
+        edited.quantity = 15  # five units received
+        edited.stock_changed_by = self.user
+        edited.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 13)
+        self.assertEqual(self.movements()[-1], (5, 'restock'))
+        
+        edited.quantity = 0
+        Sale.objects.create(product=self.product, quantity_sold=3)
+        with self.assertRaises(ValueError):
+            edited.save()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 10)
+        
+        # Saving without touching the stock leaves concurrent sales alone
+        edited.refresh_from_db()
+        Sale.objects.create(product=self.product, quantity_sold=1)
+        edited.supplier = 'Paperco Ltd'
+        edited.save()
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.quantity, self.product.supplier), (9, 'Paperco Ltd'))
+        self.assertFalse(ledger_drift().exists())
+    
+    def test_compaction_folds_old_movements_into_snapshots(self):
+        # Stock from before the ledger existed comes from the snapshot
+        legacy = Product.objects.create(
+            name='Folder', category='books', buying_price=Decimal('1.00'),
+            selling_price=Decimal('3.00'), quantity=0, supplier='Paperco',
+        )
+        Product.objects.filter(pk=legacy.pk).update(quantity=7)
+        StockSnapshot.objects.create(product=legacy, quantity=7, taken_at=timezone.now())
+        for quantity in (1, 2, 3):
+            Sale.objects.create(product=self.product, quantity_sold=quantity)
+        Sale.objects.create(product=legacy, quantity_sold=1)
+        
+        old = StockMovement.objects.order_by('id')[:3]
+        StockMovement.objects.filter(id__in=[movement.id for movement in old]).update(
+            created_at=timezone.now() - timedelta(days=100))
+        
+        self.assertEqual(compact_stock_ledger(timezone.now() - timedelta(days=90)), (1, 3))
+        snapshot = StockSnapshot.objects.get(product=self.product)
+        self.assertEqual(snapshot.quantity, 10 - 1 - 2)
+        self.assertEqual(self.movements(), [(-3, 'sale')])
+        
+        with self.assertNumQueries(1):
+            stock = {product.pk: (product.quantity, product.ledger_stock) for product in with_ledger_stock()}
+        self.assertEqual(stock, {self.product.pk: (4, 4), legacy.pk: (6, 6)})
+        self.assertEqual(compact_stock_ledger(timezone.now() - timedelta(days=90)), (0, 0))
+        
+        Product.objects.filter(pk=legacy.pk).update(quantity=50)
+        output = io.StringIO()
+        call_command('compact_stock_ledger', '--keep-days', '0', stdout=output)
+        self.assertIn('Folded 2 movements of 2 products', output.getvalue())
+        self.assertIn('stock is 50, ledger says 6', output.getvalue())
+        self.assertFalse(StockMovement.objects.exists())
+
+
+class ProductValuationTests(TestCase):
+    """Margin and stock value columns, list sorting and the category valuation"""
+    
+    def setUp(self):
+        # Counts and valuations are cached per data version, which TestCase never bumps
+        get_cache().clear()
+        self.user = User.objects.create_superuser(username='valuer', password='testpass123')
+        self.factory = RequestFactory()
+        # (name, category, buying, selling, quantity): margins 50%, 100%, 10%, 25%
+        specs = [
+            ('Kettle', 'home', '10.00', '15.00', 4),
+            ('Novel', 'books', '3.00', '6.00', 50),
+            ('Blender', 'home', '40.00', '44.00', 30),
+            ('Atlas', 'books', '20.00', '25.00', 0),
+        ]
+        self.products = {
+            name: Product.objects.create(
+                name=name, category=category, buying_price=Decimal(buying),
+                selling_price=Decimal(selling), quantity=quantity, supplier='Acme')
+            for name, category, buying, selling, quantity in specs
+        }
+    
+    def list_view(self, **params):
+        view = ProductListView()
+        view.setup(self.factory.get('/inventory/', params))
+        return view
+    
+    def names(self, **params):
+        return [product.name for product in self.list_view(**params).get_queryset()]
+    
+    def test_columns_match_the_properties(self):
+        for product in Product.objects.all():
+            self.assertEqual(product.unit_margin, product.profit_per_unit)
+            self.assertAlmostEqual(product.margin_percent, float(product.profit_percentage))
+            self.assertEqual(product.stock_value, product.total_value)
+    
+    def test_list_sorts_and_filters_by_margin_and_value(self):
+        self.assertEqual(self.names(sort='margin_desc'), ['Novel', 'Kettle', 'Atlas', 'Blender'])
+        self.assertEqual(self.names(sort='value_desc'), ['Blender', 'Novel', 'Kettle', 'Atlas'])
+        self.assertEqual(self.names(sort='margin_desc', min_margin='25', max_margin='60'), ['Kettle', 'Atlas'])
+        self.assertEqual(self.names(sort='value_asc', min_value='0.01', max_value='200'), ['Kettle', 'Novel'])
+        # Invalid values are ignored, unknown sorts fall back to newest first
+        self.assertEqual(len(self.names(min_margin='lots', sort='cheapest')), 4)
+        for params in ({'min_margin': 'sNaN'}, {'min_value': 'NaN'}, {'max_value': '-Infinity'},
+                       {'max_margin': 'inf'}):
+            with self.subTest(**params):
+                self.assertEqual(len(self.names(**params)), 4)
+        
+        with connection.cursor() as cursor:
+            sql, params = self.list_view(sort='value_desc', min_value='100').get_queryset().query.sql_with_params()
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            self.assertIn('product_stock_value_idx', str(cursor.fetchall()))
+        
+        # Cursor pages only follow the date order
+        self.assertFalse(self.list_view(sort='margin_desc', paginate='cursor').use_cursor_pagination())
+        self.assertTrue(self.list_view(paginate='cursor').use_cursor_pagination())
+    
+    def test_category_valuation_is_one_grouped_query(self):
+        with self.assertNumQueries(1):
+            rows = list(Product.category_valuation())
+        self.assertEqual(rows, [
+            {'category': 'home', 'products': 2, 'units': 34, 'value': Decimal('1240.00'),
+             'retail_value': Decimal('1380.00'), 'potential_profit': Decimal('140.00')},
+            {'category': 'books', 'products': 2, 'units': 50, 'value': Decimal('150.00'),
+             'retail_value': Decimal('300.00'), 'potential_profit': Decimal('150.00')},
+        ])
+        
+        view = self.list_view(search='Novel')
+        view.object_list = view.get_queryset()
+        context = view.get_context_data()
+        self.assertEqual([row['label'] for row in context['category_valuation']], ['Books'])
+        self.assertEqual(context['valuation_totals']['value'], Decimal('150.00'))
+    
+    def test_paging_reuses_the_count_and_valuation(self):
+        for number in range(25):
+            Product.objects.create(
+                name=f'Mug {number}', category='home', buying_price=Decimal('2.00'),
+                selling_price=Decimal('5.00'), quantity=1, supplier='Acme')
+        
+        def page(params):
+            view = ProductListView()
+            view.setup(self.factory.get('/inventory/', params))
+            view.object_list = view.get_queryset()
+            return view.get_context_data()
+        
+        first = page({'category': 'home', 'min_margin': '20'})
+        self.assertEqual(first['paginator'].count, 26)  # Blender's 10% margin is filtered out
+        # Same filters in another order, next page: no COUNT(*) and no regrouping
+        with CaptureQueriesContext(connection) as ctx:
+            second = page({'page': '2', 'min_margin': '20.0', 'category': 'home'})
+            self.assertEqual(len(second['products']), 6)
+        self.assertEqual(second['category_valuation'][0]['products'], 26)
+        self.assertEqual(len(ctx.captured_queries), 1)
+    
+    def test_admin_sorts_and_filters_on_the_columns(self):
+        self.client.force_login(self.user)
+        url = reverse('admin:inventory_product_changelist')
+        response = self.client.get(url, {'margin': 'over50', 'o': '7'})
+        self.assertEqual([product.name for product in response.context['cl'].result_list], ['Kettle', 'Novel'])
+        response = self.client.get(url, {'stock_value': 'over1000'})
+        self.assertEqual([product.name for product in response.context['cl'].result_list], ['Blender'])
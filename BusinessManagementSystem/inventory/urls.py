@@ -6,8 +6,10 @@ app_name = 'inventory'
 urlpatterns = [
     path('', views.ProductListView.as_view(), name='product_list'),
     path('add/', views.ProductCreateView.as_view(), name='product_add'),
+    path('import/', views.ProductImportView.as_view(), name='product_import'),
     path('<int:pk>/', views.ProductDetailView.as_view(), name='product_detail'),
     path('<int:pk>/edit/', views.ProductUpdateView.as_view(), name='product_edit'),
     path('<int:pk>/delete/', views.ProductDeleteView.as_view(), name='product_delete'),
     path('low-stock/', views.LowStockView.as_view(), name='low_stock'),
+    path('api/autocomplete/', views.product_autocomplete, name='product_autocomplete'),
 ]
\ No newline at end of file
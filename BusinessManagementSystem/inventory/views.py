@@ -1,30 +1,73 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
-from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
+from django.contrib.auth.decorators import login_required
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, FormView
 from django.urls import reverse_lazy
-from django.db.models import Q
+import io
+import tempfile
+from decimal import Decimal, InvalidOperation
 from .models import Product
-from .forms import ProductForm
+from .forms import ProductForm, ProductImportForm
+from .importer import ProductImportError, import_products, rejected_rows_writer
+from .search import AUTOCOMPLETE_LIMIT, AUTOCOMPLETE_MAX_LIMIT, autocomplete_products, search_products
+from dashboard.cache import get_versioned
+from BusinessManagementSystem.pagination import CachedCountPaginator, CursorPaginationMixin, query_signature
 
 
-class ProductListView(LoginRequiredMixin, ListView):
+def _parse_decimal(value):
+    try:
+        number = Decimal(value) if value else None
+    except InvalidOperation:
+        return None
+    # NaN and Infinity parse but cannot be compared in a filter
+    return number if number is not None and number.is_finite() else None
+
+
+class ProductListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = Product
     template_name = 'inventory/product_list.html'
     context_object_name = 'products'
     paginate_by = 20
+    paginator_class = CachedCountPaginator
+    cursor_ordering = ('-date_added', '-id')
     
-    def get_queryset(self):
+    # ?sort= value -> (label, ordering); margin and value sorts use their indexes
+    SORT_OPTIONS = {
+        'newest': ('Newest first', ('-date_added', '-id')),
+        'margin_desc': ('Highest margin', ('-margin_percent', '-id')),
+        'margin_asc': ('Lowest margin', ('margin_percent', 'id')),
+        'value_desc': ('Highest stock value', ('-stock_value', '-id')),
+        'value_asc': ('Lowest stock value', ('stock_value', 'id')),
+    }
+    
+    # Range filter parameter -> lookup
+    RANGE_FILTERS = {
+        'min_margin': 'margin_percent__gte',
+        'max_margin': 'margin_percent__lte',
+        'min_value': 'stock_value__gte',
+        'max_value': 'stock_value__lte',
+    }
+    
+    def get_sort(self):
+        sort = self.request.GET.get('sort')
+        return sort if sort in self.SORT_OPTIONS else 'newest'
+    
+    def use_cursor_pagination(self):
+        # Cursors follow the date order; the other sorts use numbered pages
+        return self.get_sort() == 'newest' and super().use_cursor_pagination()
+    
+    def get_filtered_queryset(self):
         queryset = Product.objects.all()
         
         # Search functionality
         search_query = self.request.GET.get('search')
         if search_query:
-            queryset = queryset.filter(
-                Q(name__icontains=search_query) |
-                Q(category__icontains=search_query) |
-                Q(supplier__icontains=search_query)
-            )
+            queryset = search_products(queryset, search_query)
         
         # Category filter
         category = self.request.GET.get('category')
@@ -34,11 +77,21 @@ class ProductListView(LoginRequiredMixin, ListView):
         # Stock filter
         stock_filter = self.request.GET.get('stock')
         if stock_filter == 'low':
-            queryset = queryset.filter(quantity__lte=5)
+            queryset = queryset.filter(reorder_gap__lte=0)
         elif stock_filter == 'out':
             queryset = queryset.filter(quantity=0)
         
-        return queryset.order_by('-date_added')
+        # Margin (%) and stock value ranges; invalid values are ignored
+        for param, lookup in self.RANGE_FILTERS.items():
+            value = _parse_decimal(self.request.GET.get(param))
+            if value is not None:
+                queryset = queryset.filter(**{lookup: value})
+        
+        return queryset
+    
+    def get_queryset(self):
+        _, ordering = self.SORT_OPTIONS[self.get_sort()]
+        return self.get_filtered_queryset().order_by(*ordering)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -46,6 +99,24 @@ class ProductListView(LoginRequiredMixin, ListView):
         context['search_query'] = self.request.GET.get('search', '')
         context['selected_category'] = self.request.GET.get('category', '')
         context['selected_stock'] = self.request.GET.get('stock', '')
+        context['sort_options'] = [(value, label) for value, (label, _) in self.SORT_OPTIONS.items()]
+        context['selected_sort'] = self.get_sort()
+        context['ranges'] = {param: self.request.GET.get(param, '') for param in self.RANGE_FILTERS}
+        context['filtered'] = any(self.request.GET.get(param) for param in (
+            'search', 'category', 'stock', 'sort', *self.RANGE_FILTERS))
+        
+        labels = dict(Product.CATEGORY_CHOICES)
+        filtered = self.get_filtered_queryset()
+        # Cached like the page count, so paging does not regroup the products
+        valuation = get_versioned(f'product-valuation:{query_signature(filtered)}',
+                                  lambda: list(Product.category_valuation(filtered)))
+        for row in valuation:
+            row['label'] = labels.get(row['category'], row['category'])
+        context['category_valuation'] = valuation
+        context['valuation_totals'] = {
+            name: sum(row[name] or 0 for row in valuation)
+            for name in ('products', 'units', 'value', 'retail_value', 'potential_profit')
+        }
         return context
 
 
@@ -76,6 +147,7 @@ class ProductUpdateView(LoginRequiredMixin, UpdateView):
         return reverse_lazy('inventory:product_detail', kwargs={'pk': self.object.pk})
     
     def form_valid(self, form):
+        form.instance.stock_changed_by = self.request.user
         messages.success(self.request, f'Product "{form.instance.name}" has been updated successfully!')
         return super().form_valid(form)
 
@@ -91,10 +163,68 @@ class ProductDeleteView(LoginRequiredMixin, DeleteView):
         return super().delete(request, *args, **kwargs)
 
 
+class ProductImportView(LoginRequiredMixin, FormView):
+    """
+    Upload a CSV of products to create or update in bulk.
+    
+    The upload is read as a stream and imported in batches (see
+    inventory.importer); rejected and skipped rows are saved under
+    MEDIA_ROOT/imports/ for download.
+    """
+    form_class = ProductImportForm
+    template_name = 'inventory/product_import.html'
+    
+    def form_valid(self, form):
+        stream = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+        with tempfile.TemporaryFile('w+', newline='', encoding='utf-8') as rejected:
+            try:
+                stats = import_products(stream, user=self.request.user, rejected=rejected_rows_writer(rejected))
+            except (ProductImportError, UnicodeDecodeError) as e:
+                message = str(e) if isinstance(e, ProductImportError) else 'The file must be UTF-8 encoded CSV.'
+                form.add_error('file', message)
+                return self.form_invalid(form)
+            finally:
+                stream.detach()
+            
+            rejected_url = None
+            if stats.rejected or stats.skipped:
+                rejected.seek(0)
+                name = default_storage.save(
+                    f"imports/rejected-products-{timezone.now():%Y%m%d-%H%M%S}.csv", File(rejected))
+                rejected_url = default_storage.url(name)
+        
+        imported = stats.rows - stats.rejected - stats.skipped
+        messages.success(self.request, f'Imported {imported} of {stats.rows} rows.')
+        return self.render_to_response(self.get_context_data(
+            form=self.form_class(), stats=stats, rejected_url=rejected_url))
+
+
 class LowStockView(LoginRequiredMixin, ListView):
     model = Product
     template_name = 'inventory/low_stock.html'
     context_object_name = 'products'
     
     def get_queryset(self):
-        return Product.objects.filter(quantity__lte=5).order_by('quantity')
+        return Product.needing_reorder()
+
+
+@login_required
+def product_autocomplete(request):
+    """
+    API endpoint returning the best product matches for a search box.
+    
+    Query parameters: ``q`` (search text), ``limit`` (default 10, at most
+    50) and ``in_stock=1`` to skip sold-out products.
+    """
+    try:
+        limit = int(request.GET.get('limit', AUTOCOMPLETE_LIMIT))
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a whole number'}, status=400)
+    limit = max(1, min(limit, AUTOCOMPLETE_MAX_LIMIT))
+    
+    results = autocomplete_products(
+        request.GET.get('q', ''),
+        limit=limit,
+        in_stock=request.GET.get('in_stock') in ('1', 'true'),
+    )
+    return JsonResponse({'results': results})
@@ -1,3 +1,17 @@
 from django.contrib import admin
+from .models import ReportJob
 
-# Register your models here.
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'report_format', 'status', 'size', 'requested_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'report_format', 'created_at']
+    readonly_fields = [
+        'report_format', 'params', 'signature', 'watermark', 'status', 'artifact',
+        'size', 'error', 'requested_by', 'created_at', 'started_at', 'finished_at',
+    ]
+    date_hierarchy = 'created_at'
+    
+    def has_add_permission(self, request):
+        # Jobs are queued from the reports page or the jobs endpoint
+        return False
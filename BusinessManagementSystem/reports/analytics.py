@@ -0,0 +1,378 @@
+"""
+Columnar sales analytics for the report pages.
+
+``SalesColumns.load`` reads the sale time, product, quantity, revenue
+and profit of every matching sale in one query straight into NumPy
+arrays. Rows come off the database cursor without going through model
+field converters: the time arrives as UTC text and money as integer
+cents, so the sums stay exact. Times are turned into local calendar days
+with one time zone lookup per distinct hour, and category is attached
+through a product -> category lookup array. Group-bys by day, product and category are ``np.unique`` plus
+``np.bincount``; margins and period-over-period changes are computed on
+whole arrays.
+
+Each report loads the selected period together with the period of equal
+length just before it. The sales are compacted to one row per day and
+product and kept in the watermarked result cache (see reports.cache), so
+a repeat request reads nothing and new sales are merged in without
+reading the period again.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import chain
+from decimal import Decimal
+import numpy as np
+from django.db import connections
+from django.db.models import BigIntegerField, CharField, F
+from django.db.models.functions import Cast, Round
+from django.utils import timezone
+from inventory.models import Product
+from sales.models import Sale
+from sales.utils import date_range_filter
+from .cache import cached_columns
+
+
+# Period shown when no dates are given
+DEFAULT_PERIOD_DAYS = 30
+
+# Rows fetched from the database per round-trip
+CHUNK_SIZE = 5000
+
+CATEGORY_KEYS = [key for key, _ in Product.CATEGORY_CHOICES]
+CATEGORY_LABELS = dict(Product.CATEGORY_CHOICES)
+
+# 'when' keeps the 'YYYY-MM-DD HH:MM:SS' prefix of the UTC timestamp text
+ROW_DTYPE = np.dtype([
+    ('when', 'S19'),
+    ('product', np.int64),
+    ('quantity', np.int64),
+    ('revenue', np.int64),
+    ('profit', np.int64),
+])
+
+METRICS = ('transactions', 'units', 'revenue', 'profit')
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _cents(field):
+    return Cast(Round(F(field) * 100), output_field=BigIntegerField())
+
+
+def _money(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def local_days(when):
+    """Local calendar days of UTC timestamps, with one time zone lookup per distinct hour"""
+    when = when.astype('datetime64[s]')
+    hours, index = np.unique(when.astype('datetime64[h]'), return_inverse=True)
+    offsets = np.array([
+        timezone.localtime(hour.replace(tzinfo=dt_timezone.utc)).utcoffset().total_seconds()
+        for hour in hours.tolist()
+    ], dtype=np.int64).astype('timedelta64[s]')
+    return (when + offsets[index]).astype('datetime64[D]')
+
+
+def report_params(params):
+    """Keep the valid report filters from ``params`` (e.g. request.GET) as strings"""
+    normalized = {}
+    for name in ('start_date', 'end_date'):
+        day = _parse_date(params.get(name))
+        if day:
+            normalized[name] = day.isoformat()
+    category = params.get('category')
+    if category in CATEGORY_LABELS:
+        normalized['category'] = category
+    product = (params.get('product') or '').strip()
+    if product.isdigit():
+        normalized['product'] = product
+    return normalized
+
+
+def report_period(params):
+    """
+    Return ``(start, end, previous_start, previous_end)`` as dates.
+    
+    The period defaults to the last DEFAULT_PERIOD_DAYS days ending today;
+    the previous period has the same length and ends the day before start.
+    """
+    end = _parse_date(params.get('end_date')) or timezone.localdate()
+    start = _parse_date(params.get('start_date')) or end - timedelta(days=DEFAULT_PERIOD_DAYS - 1)
+    if start > end:
+        start, end = end, start
+    days = (end - start).days + 1
+    return start, end, start - timedelta(days=days), start - timedelta(days=1)
+
+
+class SalesColumns:
+    """
+    Sales as parallel NumPy arrays, one element per sale or, once
+    compacted, per day and product with ``transactions`` sales behind it.
+    """
+    
+    def __init__(self, day, product, quantity, revenue, profit, category, products=None, transactions=None):
+        self.day = day
+        self.product = product
+        self.quantity = quantity
+        self.revenue = revenue
+        self.profit = profit
+        self.category = category
+        # product id -> (name, category) for every product in the arrays
+        self.products = products or {}
+        self.transactions = transactions if transactions is not None else np.ones(len(day), np.int64)
+    
+    @classmethod
+    def load(cls, queryset, chunk_size=CHUNK_SIZE):
+        """Read every sale in ``queryset`` into arrays with a single query"""
+        # All expressions, so the SELECT lists them in this order
+        query = queryset.order_by().values_list(
+            Cast('date_sold', output_field=CharField()),
+            F('product_id'),
+            F('quantity_sold'),
+            _cents('total_cost'),
+            _cents('profit'),
+        ).query
+        sql, params = query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = chain.from_iterable(iter(lambda: cursor.fetchmany(chunk_size), []))
+            data = np.fromiter(rows, dtype=ROW_DTYPE)
+        
+        product_ids = np.unique(data['product'])
+        products = {
+            pk: (name, category)
+            for pk, name, category in Product.objects
+            .filter(id__in=product_ids.tolist())
+            .values_list('id', 'name', 'category')
+        }
+        # Category codes index CATEGORY_KEYS; looked up per product, not per row
+        codes = np.array([CATEGORY_KEYS.index(products[pk][1]) for pk in product_ids.tolist()], dtype=np.int64)
+        category = codes[np.searchsorted(product_ids, data['product'])]
+        
+        return cls(local_days(data['when']), data['product'], data['quantity'], data['revenue'], data['profit'],
+                   category, products)
+    
+    @classmethod
+    def load_compact(cls, queryset):
+        return cls.load(queryset).compact()
+    
+    def __len__(self):
+        return len(self.day)
+    
+    def where(self, mask):
+        return SalesColumns(self.day[mask], self.product[mask], self.quantity[mask], self.revenue[mask],
+                            self.profit[mask], self.category[mask], self.products, self.transactions[mask])
+    
+    def between(self, start, end):
+        """Sales on local days start..end inclusive"""
+        return self.where((self.day >= np.datetime64(start, 'D')) & (self.day <= np.datetime64(end, 'D')))
+    
+    def totals(self):
+        return {
+            'transactions': self.transactions.sum(),
+            'units': self.quantity.sum(),
+            'revenue': self.revenue.sum(),
+            'profit': self.profit.sum(),
+        }
+    
+    def group_by(self, key):
+        """
+        Total the metrics per distinct value of ``key`` ('day', 'product' or
+        'category'); returns a dict of arrays sorted by key.
+        """
+        keys, index = np.unique(getattr(self, key), return_inverse=True)
+        groups = {'key': keys}
+        for metric, column in self.metric_columns():
+            groups[metric] = _sum_by(index, column, len(keys))
+        return groups
+    
+    def metric_columns(self):
+        return (('transactions', self.transactions), ('units', self.quantity), ('revenue', self.revenue),
+                ('profit', self.profit))
+    
+    def compact(self):
+        """The same totals with one row per distinct (day, product)"""
+        pairs = np.stack([self.day.astype(np.int64), self.product])
+        keys, first, index = np.unique(pairs, axis=1, return_index=True, return_inverse=True)
+        index = index.reshape(-1)
+        count = keys.shape[1]
+        sums = {metric: _sum_by(index, column, count) for metric, column in self.metric_columns()}
+        return SalesColumns(keys[0].astype('datetime64[D]'), keys[1], sums['units'], sums['revenue'], sums['profit'],
+                            self.category[first], self.products, sums['transactions'])
+    
+    def merge(self, other):
+        """Compacted columns holding the sales of both"""
+        day, product, quantity, revenue, profit, category, transactions = (
+            np.concatenate(pair) for pair in zip(self.arrays(), other.arrays()))
+        return SalesColumns(day, product, quantity, revenue, profit, category,
+                            {**self.products, **other.products}, transactions).compact()
+    
+    def arrays(self):
+        return (self.day, self.product, self.quantity, self.revenue, self.profit, self.category, self.transactions)
+
+
+def _sum_by(index, column, length):
+    """Per-group sums of an integer column"""
+    # float64 sums of integer cents are exact below 2**53 cents
+    return np.rint(np.bincount(index, weights=column, minlength=length)).astype(np.int64)
+
+
+def align(groups, keys):
+    """Reindex ``groups`` onto the sorted ``keys``, with zeros for keys it does not have"""
+    aligned = {'key': keys}
+    if not len(groups['key']):
+        for metric in METRICS:
+            aligned[metric] = np.zeros(len(keys), np.int64)
+        return aligned
+    position = np.searchsorted(groups['key'], keys).clip(max=len(groups['key']) - 1)
+    found = groups['key'][position] == keys
+    for metric in METRICS:
+        aligned[metric] = np.where(found, groups[metric][position], 0)
+    return aligned
+
+
+def margin(profit, revenue):
+    """Profit as a percentage of revenue; 0 where there was no revenue"""
+    profit = np.asarray(profit, dtype=np.float64)
+    revenue = np.asarray(revenue, dtype=np.float64)
+    return np.divide(profit * 100, revenue, out=np.zeros_like(profit), where=revenue != 0)
+
+
+def percent_change(current, previous):
+    """Relative change in percent; NaN where the previous value was 0"""
+    current = np.asarray(current, dtype=np.float64)
+    previous = np.asarray(previous, dtype=np.float64)
+    return np.divide((current - previous) * 100, np.abs(previous),
+                     out=np.full_like(current, np.nan), where=previous != 0)
+
+
+def compare(current, previous):
+    """Metrics, margins and changes of two aligned groupings as a list of row dicts"""
+    current_margin = margin(current['profit'], current['revenue'])
+    previous_margin = margin(previous['profit'], previous['revenue'])
+    changes = {metric: percent_change(current[metric], previous[metric]) for metric in METRICS}
+    total_revenue = current['revenue'].sum()
+    share = current['revenue'] * 100 / total_revenue if total_revenue else np.zeros(len(current['key']))
+    
+    rows = []
+    for i in range(len(current['key'])):
+        rows.append({
+            'transactions': int(current['transactions'][i]),
+            'units': int(current['units'][i]),
+            'revenue': _money(current['revenue'][i]),
+            'profit': _money(current['profit'][i]),
+            'margin': round(float(current_margin[i]), 2),
+            'revenue_share': round(float(share[i]), 2),
+            'previous_revenue': _money(previous['revenue'][i]),
+            'previous_profit': _money(previous['profit'][i]),
+            'previous_margin': round(float(previous_margin[i]), 2),
+            'margin_change': round(float(current_margin[i] - previous_margin[i]), 2),
+            'changes': {
+                metric: None if np.isnan(changes[metric][i]) else round(float(changes[metric][i]), 1)
+                for metric in METRICS
+            },
+        })
+    return rows
+
+
+def _as_groups(totals):
+    return {'key': np.zeros(1, np.int64), **{metric: np.array([totals[metric]]) for metric in METRICS}}
+
+
+class PeriodComparison:
+    """The selected period and the one before it, loaded from one query or the result cache"""
+    
+    def __init__(self, params):
+        self.params = params = report_params(params)
+        self.start, self.end, self.previous_start, self.previous_end = report_period(params)
+        
+        queryset = Sale.objects.filter(**date_range_filter(self.previous_start, self.end))
+        if params.get('category'):
+            queryset = queryset.filter(product__category=params['category'])
+        if params.get('product'):
+            queryset = queryset.filter(product_id=params['product'])
+        
+        # Keyed on the resolved dates so the default period moves on at midnight
+        key = (f"report-columns:{self.previous_start}:{self.end}:"
+               f"{params.get('category', '')}:{params.get('product', '')}")
+        columns = cached_columns(key, queryset, SalesColumns.load_compact)
+        self.products = columns.products
+        self.current = columns.between(self.start, self.end)
+        self.previous = columns.between(self.previous_start, self.previous_end)
+    
+    def grouped(self, key):
+        """Aligned current and previous groupings over the union of their keys"""
+        current = self.current.group_by(key)
+        previous = self.previous.group_by(key)
+        keys = np.union1d(current['key'], previous['key'])
+        return keys, align(current, keys), align(previous, keys)
+    
+    def summary(self):
+        return {
+            'start': self.start,
+            'end': self.end,
+            'previous_start': self.previous_start,
+            'previous_end': self.previous_end,
+            'days': (self.end - self.start).days + 1,
+            'totals': compare(_as_groups(self.current.totals()), _as_groups(self.previous.totals()))[0],
+        }
+    
+    def daily(self):
+        """One row per day of the period, zero-filled, with the matching day of the previous period"""
+        days = np.arange(np.datetime64(self.start, 'D'), np.datetime64(self.end, 'D') + 1)
+        current = align(self.current.group_by('day'), days)
+        previous = align(self.previous.group_by('day'), days - len(days))
+        rows = compare(current, previous)
+        for day, row in zip(days.tolist(), rows):
+            row['date'] = day
+        return rows
+    
+    def by_category(self):
+        keys, current, previous = self.grouped('category')
+        rows = compare(current, previous)
+        for code, row in zip(keys.tolist(), rows):
+            row['category'] = CATEGORY_KEYS[code]
+            row['category_label'] = CATEGORY_LABELS[CATEGORY_KEYS[code]]
+        return sorted(rows, key=lambda row: row['revenue'], reverse=True)
+    
+    def by_product(self):
+        keys, current, previous = self.grouped('product')
+        rows = compare(current, previous)
+        for pk, row in zip(keys.tolist(), rows):
+            name, category = self.products[pk]
+            row.update(product_id=pk, name=name, category=category, category_label=CATEGORY_LABELS[category])
+        return sorted(rows, key=lambda row: (row['revenue'], row['profit']), reverse=True)
+
+
+def sales_report(params):
+    """Daily revenue, profit and units with category breakdown vs the previous period"""
+    comparison = PeriodComparison(params)
+    return {**comparison.summary(), 'daily': comparison.daily(), 'categories': comparison.by_category()}
+
+
+def profit_report(params):
+    """Margins by day, category and product vs the previous period"""
+    comparison = PeriodComparison(params)
+    products = [row for row in comparison.by_product() if row['revenue']]
+    by_margin = sorted(products, key=lambda row: row['margin'], reverse=True)
+    return {
+        **comparison.summary(),
+        'daily': comparison.daily(),
+        'categories': sorted(comparison.by_category(), key=lambda row: row['profit'], reverse=True),
+        'highest_margin': by_margin[:10],
+        'lowest_margin': by_margin[::-1][:10],
+    }
+
+
+def product_performance(params):
+    """Every product sold in either period ranked by revenue, with share and changes"""
+    comparison = PeriodComparison(params)
+    products = comparison.by_product()
+    for rank, row in enumerate(products, start=1):
+        row['rank'] = rank
+    return {**comparison.summary(), 'products': products, 'categories': comparison.by_category()}
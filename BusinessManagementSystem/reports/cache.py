@@ -0,0 +1,111 @@
+"""
+Watermarked result cache for the analytics reports.
+
+An entry holds the compacted sales of one filter set (one row per day
+and product) together with the watermark they were read at: the highest
+Sale id included and a generation made of the last product catalog
+change and the sale rewrite counter. New sales only ever raise the
+highest id, so on lookup:
+
+* same id and generation: the entry is served as it is (a hit);
+* same generation, higher id: only the sales above the cached id are
+  read and merged into the entry (a merge);
+* anything else: the filter set is read again in full (a miss).
+
+Name, category and price changes stamp Product.catalog_changed_at; sale
+edits and deletes and product deletes bump the rewrite counter (see
+reports.signals). Hit, miss and merge counts are kept in the shared
+cache for monitoring.
+"""
+import time
+from django.conf import settings
+from django.db.models import Max
+from dashboard.cache import get_cache
+from inventory.models import Product
+from sales.models import Sale
+
+
+REWRITE_VERSION_KEY = 'report-rewrite-version'
+
+STATS_KEY = 'report-cache-stats:{}'
+
+STATS = ('hits', 'misses', 'merges')
+
+
+def get_rewrite_version():
+    """Return the sale rewrite counter, initialising it if needed"""
+    cache = get_cache()
+    version = cache.get(REWRITE_VERSION_KEY)
+    if version is None:
+        # Start from a clock value so a cleared counter never matches old entries
+        cache.add(REWRITE_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(REWRITE_VERSION_KEY)
+    return version
+
+
+def bump_rewrite_version():
+    """Stop cached report results from being reused or merged into"""
+    cache = get_cache()
+    try:
+        return cache.incr(REWRITE_VERSION_KEY)
+    except ValueError:
+        return get_rewrite_version()
+
+
+def current_watermark():
+    """Return ``(highest sale id, generation)`` for the data as it is now"""
+    generation = get_rewrite_version()
+    catalog_changed_at = Product.objects.aggregate(latest=Max('catalog_changed_at'))['latest']
+    max_id = Sale.objects.aggregate(latest=Max('id'))['latest'] or 0
+    stamp = catalog_changed_at.isoformat() if catalog_changed_at else ''
+    return max_id, f'{generation}:{stamp}'
+
+
+def _count(event):
+    cache = get_cache()
+    key = STATS_KEY.format(event)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(key, 1, timeout=None)
+
+
+def cache_stats():
+    """Hit, miss and merge counts since the last reset"""
+    cache = get_cache()
+    counts = cache.get_many([STATS_KEY.format(event) for event in STATS])
+    return {event: counts.get(STATS_KEY.format(event), 0) for event in STATS}
+
+
+def reset_cache_stats():
+    get_cache().delete_many([STATS_KEY.format(event) for event in STATS])
+
+
+def cached_columns(key, queryset, load):
+    """
+    Return the compacted columns of ``queryset``, cached under ``key``.
+    
+    ``load(queryset)`` reads sales into compacted columns, which must
+    provide ``merge(other)``.
+    """
+    cache = get_cache()
+    max_id, generation = current_watermark()
+    entry = cache.get(key)
+    
+    if entry and entry['generation'] == generation and entry['max_id'] == max_id:
+        _count('hits')
+        return entry['columns']
+    
+    if entry and entry['generation'] == generation and entry['max_id'] < max_id:
+        added = load(queryset.filter(id__gt=entry['max_id'], id__lte=max_id))
+        columns, event = entry['columns'].merge(added), 'merges'
+    else:
+        # Bounded by the watermark so sales committed meanwhile are merged next time
+        columns, event = load(queryset.filter(id__lte=max_id)), 'misses'
+    
+    cache.set(key, {'max_id': max_id, 'generation': generation, 'columns': columns},
+              settings.REPORT_CACHE_TIMEOUT)
+    _count(event)
+    return columns
@@ -0,0 +1,66 @@
+"""
+Streaming sales exports.
+
+Rows are read with ``values_list(...).iterator()`` in fixed-size chunks
+and written out as they arrive, so memory use stays flat no matter how
+many sales match. The CSV can optionally be gzip-compressed on the fly.
+"""
+import csv
+import io
+import zlib
+from sales.models import Sale
+
+
+CSV_HEADER = ['Date', 'Product', 'Quantity', 'Total Cost', 'Profit', 'Customer', 'Sold By']
+
+CSV_FIELDS = (
+    'date_sold', 'product__name', 'quantity_sold', 'total_cost', 'profit',
+    'customer_name', 'sold_by__username',
+)
+
+# Rows fetched from the database per round-trip
+CHUNK_SIZE = 2000
+
+# Bytes of CSV text buffered before a chunk is handed to the response
+FLUSH_SIZE = 64 * 1024
+
+
+def sales_export_queryset(queryset=None):
+    """Sales in export order: newest first, id as tie-breaker"""
+    queryset = Sale.objects.all() if queryset is None else queryset
+    return queryset.order_by('-date_sold', '-id')
+
+
+def iter_sales_csv(queryset, chunk_size=CHUNK_SIZE):
+    """Yield the CSV export of ``queryset`` as text chunks of about FLUSH_SIZE"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    
+    rows = queryset.values_list(*CSV_FIELDS).iterator(chunk_size=chunk_size)
+    for date_sold, product, quantity, total_cost, profit, customer, sold_by in rows:
+        writer.writerow([
+            date_sold.strftime('%Y-%m-%d %H:%M'),
+            product,
+            quantity,
+            total_cost,
+            profit,
+            customer or 'N/A',
+            sold_by or 'N/A',
+        ])
+        if buffer.tell() >= FLUSH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    
+    yield buffer.getvalue()
+
+
+def gzip_stream(chunks, level=6):
+    """Gzip-compress an iterable of text chunks, yielding compressed bytes"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
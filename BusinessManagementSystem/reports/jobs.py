@@ -0,0 +1,196 @@
+"""
+Background generation of report exports.
+
+Views queue a ReportJob with ``request_report``; ``run_report_worker``
+claims pending jobs and runs ``run_job`` for each in a process pool.
+Artifacts are stored under MEDIA_ROOT/reports/ and reused for as long as
+the data watermark (the dashboard data version, bumped on every Sale or
+Product write) is unchanged.
+"""
+import hashlib
+import json
+import tempfile
+from datetime import timedelta
+from django.core.files import File
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from dashboard.cache import get_data_version
+from sales.filters import FILTER_PARAMS, filter_sales, parse_product_id
+from sales.models import Sale
+from .columnar import COLUMNAR_FORMATS, dataset_queryset, write_columnar
+from .exports import gzip_stream, iter_sales_csv, sales_export_queryset
+from .models import ReportJob
+from .pdf import SalesReport
+
+
+def _write_csv(queryset, output):
+    for chunk in iter_sales_csv(sales_export_queryset(queryset)):
+        output.write(chunk.encode('utf-8'))
+
+
+def _write_csv_gz(queryset, output):
+    for chunk in gzip_stream(iter_sales_csv(sales_export_queryset(queryset))):
+        output.write(chunk)
+
+
+def _write_pdf(queryset, output):
+    SalesReport(queryset).build(output)
+
+
+def _columnar_writer(report_format):
+    def write(queryset, output):
+        write_columnar('sales', dataset_queryset('sales', queryset), output, report_format)
+    return write
+
+
+# Report format -> (file extension, content type, writer(queryset, binary file))
+FORMATS = {
+    'csv': ('csv', 'text/csv', _write_csv),
+    'csv_gz': ('csv.gz', 'application/gzip', _write_csv_gz),
+    'pdf': ('pdf', 'application/pdf', _write_pdf),
+    **{
+        name: (extension, content_type, _columnar_writer(name))
+        for name, (extension, content_type) in COLUMNAR_FORMATS.items()
+    },
+}
+
+# Running jobs older than this are assumed to belong to a dead worker
+STALE_AFTER = timedelta(hours=1)
+
+
+def normalize_params(params):
+    """
+    Keep the known, non-empty sales filters with surrounding whitespace
+    removed. The product id is stored as a plain number (or dropped if it
+    is not one), like filter_sales reads it.
+    """
+    normalized = {}
+    for name in FILTER_PARAMS:
+        value = (params.get(name) or '').strip()
+        if name == 'product' and value:
+            product_id = parse_product_id(value)
+            value = str(product_id) if product_id is not None else ''
+        if value:
+            normalized[name] = value
+    return normalized
+
+
+def job_signature(report_format, params):
+    payload = json.dumps({'format': report_format, 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def current_watermark():
+    return str(get_data_version())
+
+
+def request_report(report_format, params, user=None):
+    """
+    Return ``(job, created)`` for a report of the given format and filters.
+    
+    An existing job for the same signature and watermark is reused while it
+    is pending, running or done with its artifact still on disk.
+    """
+    if report_format not in FORMATS:
+        raise ValueError(f"Unknown report format: {report_format}")
+    
+    params = normalize_params(params)
+    signature = job_signature(report_format, params)
+    watermark = current_watermark()
+    
+    existing = (ReportJob.objects
+                .filter(signature=signature, watermark=watermark,
+                        status__in=[ReportJob.STATUS_PENDING, ReportJob.STATUS_RUNNING, ReportJob.STATUS_DONE])
+                .order_by('-created_at')
+                .first())
+    if existing and (existing.status != ReportJob.STATUS_DONE or existing.artifact.storage.exists(existing.artifact.name)):
+        return existing, False
+    
+    job = ReportJob.objects.create(
+        report_format=report_format,
+        params=params,
+        signature=signature,
+        watermark=watermark,
+        requested_by=user if user and user.is_authenticated else None,
+    )
+    return job, True
+
+
+def claim_next_job():
+    """Atomically move the oldest pending job to running; returns it or None"""
+    while True:
+        job = ReportJob.objects.filter(status=ReportJob.STATUS_PENDING).order_by('created_at', 'id').first()
+        if job is None:
+            return None
+        claimed = (ReportJob.objects
+                   .filter(pk=job.pk, status=ReportJob.STATUS_PENDING)
+                   .update(status=ReportJob.STATUS_RUNNING, started_at=timezone.now()))
+        if claimed:
+            job.refresh_from_db()
+            return job
+        # Another worker claimed it first; try the next one
+
+
+def requeue_stale_jobs(older_than):
+    """Return jobs stuck in running (e.g. after a worker crash) to the queue"""
+    return (ReportJob.objects
+            .filter(status=ReportJob.STATUS_RUNNING, started_at__lt=timezone.now() - older_than)
+            .update(status=ReportJob.STATUS_PENDING, started_at=None))
+
+
+def run_job(job_id):
+    """Generate the artifact of a claimed job; runs inside a worker process"""
+    job = ReportJob.objects.get(pk=job_id)
+    extension, _, write = FORMATS[job.report_format]
+    try:
+        queryset = filter_sales(Sale.objects.all(), job.params)
+        with tempfile.TemporaryFile() as output:
+            write(queryset, output)
+            size = output.tell()
+            output.seek(0)
+            job.artifact.save(f'{job.signature[:16]}-{job.watermark}.{extension}', File(output), save=False)
+    except Exception as e:
+        job.status = ReportJob.STATUS_FAILED
+        job.error = f'{type(e).__name__}: {e}'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return job.status
+    
+    with transaction.atomic():
+        job.status = ReportJob.STATUS_DONE
+        job.size = size
+        job.finished_at = timezone.now()
+        job.save(update_fields=['artifact', 'status', 'size', 'finished_at'])
+        expire_superseded(job)
+    return job.status
+
+
+def expire_superseded(job):
+    """Delete the artifacts of older finished runs of the same report"""
+    older = (ReportJob.objects
+             .filter(signature=job.signature, status=ReportJob.STATUS_DONE, created_at__lt=job.created_at)
+             .exclude(pk=job.pk))
+    for old in older:
+        old.artifact.delete(save=False)
+        old.status = ReportJob.STATUS_EXPIRED
+        old.save(update_fields=['artifact', 'status'])
+
+
+def job_payload(job):
+    """JSON-serialisable status of a job for the polling endpoints"""
+    payload = {
+        'id': job.pk,
+        'format': job.report_format,
+        'params': job.params,
+        'status': job.status,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+        'size': job.size,
+        'status_url': reverse('reports:job_status', args=[job.pk]),
+    }
+    if job.status == ReportJob.STATUS_DONE:
+        payload['download_url'] = reverse('reports:job_download', args=[job.pk])
+    if job.status == ReportJob.STATUS_FAILED:
+        payload['error'] = job.error
+    return payload
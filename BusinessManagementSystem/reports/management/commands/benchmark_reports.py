@@ -0,0 +1,177 @@
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from inventory.models import Product
+from sales.models import Sale
+from reports.analytics import SalesColumns
+from reports.columnar import COLUMNAR_FORMATS, dataset_queryset, write_columnar
+from reports.exports import FLUSH_SIZE, gzip_stream, iter_sales_csv, sales_export_queryset
+from reports.pdf import SalesReport
+
+
+def pdf_export(queryset, stats):
+    """Build the PDF report into a temporary file and yield its contents"""
+    with tempfile.TemporaryFile() as output:
+        stats['pages'] = SalesReport(queryset).build(output)
+        output.seek(0)
+        yield from iter(lambda: output.read(FLUSH_SIZE), b'')
+
+
+def columnar_export(report_format):
+    """Write the Parquet or Arrow file into a temporary file and yield its contents"""
+    def export(queryset, stats):
+        with tempfile.TemporaryFile() as output:
+            write_columnar('sales', dataset_queryset('sales', queryset), output, report_format)
+            output.seek(0)
+            yield from iter(lambda: output.read(FLUSH_SIZE), b'')
+    return export
+
+
+# Export formats under test: name -> callable(queryset, stats) yielding output
+# chunks; a format may record extra figures such as 'pages' in ``stats``
+FORMATS = {
+    'csv': lambda queryset, stats: iter_sales_csv(queryset),
+    'csv.gz': lambda queryset, stats: gzip_stream(iter_sales_csv(queryset)),
+    'pdf': pdf_export,
+    **{name: columnar_export(name) for name in COLUMNAR_FORMATS},
+}
+
+# The PDF lays out ~45 rows per page, so it is only run when asked for
+DEFAULT_FORMATS = ['csv', 'csv.gz']
+
+
+def orm_group_bys(queryset):
+    """Totals per day, product and category with one ORM annotate query each"""
+    metrics = {
+        'transactions': Count('id'),
+        'units': Sum('quantity_sold'),
+        'revenue': Sum('total_cost'),
+        'profit': Sum('profit'),
+    }
+    queryset = queryset.order_by()
+    return [
+        list(queryset.annotate(day=TruncDate('date_sold')).values('day').annotate(**metrics).order_by('day')),
+        list(queryset.values('product_id').annotate(**metrics).order_by('product_id')),
+        list(queryset.values('product__category').annotate(**metrics).order_by('product__category')),
+    ]
+
+
+def columnar_group_bys(queryset):
+    """The same totals from one columnar load of the sales"""
+    columns = SalesColumns.load(queryset)
+    return [columns.group_by(key) for key in ('day', 'product', 'category')]
+
+
+def seed_sales(products, count, days, start_index=0):
+    """Bulk-insert ``count`` synthetic sales spread evenly over the last ``days`` days"""
+    now = timezone.now()
+    batch = []
+    first_id = None
+    for index in range(start_index, start_index + count):
+        product = products[index % len(products)]
+        batch.append(Sale(
+            product=product,
+            quantity_sold=1 + index % 3,
+            total_cost=product.selling_price * (1 + index % 3),
+            profit=(product.selling_price - product.buying_price) * (1 + index % 3),
+            customer_name=f'Customer {index % 500}',
+        ))
+        if len(batch) == 10000:
+            created = Sale.objects.bulk_create(batch)
+            first_id = first_id or created[0].pk
+            batch = []
+    if batch:
+        created = Sale.objects.bulk_create(batch)
+        first_id = first_id or created[0].pk
+    
+    # date_sold is auto_now_add, so spread the rows over the period afterwards
+    per_day = max(count // days, 1)
+    for day in range(days):
+        lower = first_id + day * per_day
+        upper = first_id + (day + 1) * per_day if day < days - 1 else first_id + count
+        Sale.objects.filter(id__gte=lower, id__lt=upper).update(
+            date_sold=now - timedelta(days=day, minutes=day % 600))
+
+
+class Command(BaseCommand):
+    help = ('Measure throughput and peak Python memory of the sales exports at growing '
+            'row counts. Synthetic sales are inserted in a transaction that is rolled back.')
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000],
+                            help='Row counts to measure (default: 10k, 100k and 1M)')
+        parser.add_argument('--formats', nargs='+', choices=sorted(FORMATS), default=DEFAULT_FORMATS)
+        parser.add_argument('--days', type=int, default=365, help='Days the synthetic sales span')
+        parser.add_argument('--analytics', action='store_true',
+                            help='Also time the columnar report engine against ORM annotate queries')
+    
+    def handle(self, *args, **options):
+        if options['days'] < 1 or any(rows < 1 for rows in options['rows']):
+            raise CommandError('--rows and --days must be positive')
+        
+        with transaction.atomic():
+            products = [
+                Product.objects.create(
+                    name=f'Benchmark item {index}',
+                    category=Product.CATEGORY_CHOICES[index % len(Product.CATEGORY_CHOICES)][0],
+                    buying_price=Decimal('4.00'),
+                    selling_price=Decimal('6.50'),
+                    quantity=0,
+                    supplier='benchmark_reports',
+                )
+                for index in range(20)
+            ]
+            sales = Sale.objects.filter(product__in=products)
+            queryset = sales_export_queryset(sales)
+            
+            seeded = 0
+            for rows in sorted(options['rows']):
+                started = time.perf_counter()
+                seed_sales(products, rows - seeded, options['days'], start_index=seeded)
+                seeded = rows
+                self.stdout.write(f'Seeded {rows} sales in {time.perf_counter() - started:.1f}s')
+                for name in options['formats']:
+                    self.measure(name, FORMATS[name], queryset, rows)
+                if options['analytics']:
+                    self.measure_analytics(sales, rows)
+            
+            # Leave the database exactly as it was
+            transaction.set_rollback(True)
+    
+    def measure(self, name, export, queryset, rows):
+        # Timed and memory-traced in separate passes; tracing slows Python code severalfold
+        stats = {}
+        started = time.perf_counter()
+        size = sum(len(chunk) for chunk in export(queryset, stats))
+        elapsed = time.perf_counter() - started
+        
+        tracemalloc.start()
+        for chunk in export(queryset, {}):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        
+        pages = f", {stats['pages']} pages ({stats['pages'] / elapsed:,.0f} pages/sec)" if 'pages' in stats else ''
+        self.stdout.write(
+            f'  {name:>8}: {rows} rows in {elapsed:.2f}s ({rows / elapsed:,.0f} rows/sec){pages}, '
+            f'{size / 2 ** 20:.1f} MiB output, peak memory {peak / 2 ** 20:.1f} MiB'
+        )
+    
+    def measure_analytics(self, queryset, rows):
+        timings = {}
+        for name, group_bys in (('orm', orm_group_bys), ('columnar', columnar_group_bys)):
+            started = time.perf_counter()
+            groups = group_bys(queryset)
+            timings[name] = time.perf_counter() - started
+            self.stdout.write(
+                f'  {name:>8}: day/product/category totals over {rows} rows in {timings[name]:.2f}s '
+                f'({", ".join(str(len(group if isinstance(group, list) else group["key"])) for group in groups)} groups)'
+            )
+        self.stdout.write(f'  columnar is {timings["orm"] / timings["columnar"]:.1f}x the ORM annotate speed')
@@ -0,0 +1,82 @@
+import multiprocessing
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from reports.jobs import STALE_AFTER, claim_next_job, requeue_stale_jobs, run_job
+from reports.models import ReportJob
+from reports.worker import setup_worker
+
+
+class Command(BaseCommand):
+    help = ('Generate queued CSV and PDF report jobs in a pool of worker processes, '
+            'storing each artifact under MEDIA_ROOT/reports/')
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help='Reports generated in parallel')
+        parser.add_argument('--poll', type=float, default=2.0,
+                            help='Seconds to wait before checking an empty queue again')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty instead of waiting for new jobs')
+        parser.add_argument('--stale-after', type=int, default=int(STALE_AFTER.total_seconds()),
+                            help='Requeue jobs that have been running for longer than this many seconds')
+    
+    def handle(self, *args, **options):
+        if options['processes'] < 1:
+            raise CommandError('--processes must be at least 1')
+        
+        requeued = requeue_stale_jobs(timedelta(seconds=options['stale_after']))
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale job(s)'))
+        
+        # A crashed child breaks the whole pool; start a fresh one and carry on
+        while not self.run_pool(options):
+            self.stderr.write('Worker pool broke; restarting it')
+    
+    def run_pool(self, options):
+        """Feed claimed jobs to a process pool; returns False if the pool broke"""
+        processes = options['processes']
+        # Children are spawned rather than forked so none inherits an open connection
+        connections.close_all()
+        context = multiprocessing.get_context('spawn')
+        running = {}
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=setup_worker) as pool:
+            while True:
+                while len(running) < processes:
+                    job = claim_next_job()
+                    if job is None:
+                        break
+                    self.stdout.write(f'Started {job}')
+                    running[pool.submit(run_job, job.pk)] = job
+                
+                if not running:
+                    if options['once']:
+                        return True
+                    time.sleep(options['poll'])
+                    continue
+                
+                done, _ = wait(running, timeout=options['poll'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        status = future.result()
+                    except Exception as e:
+                        self.fail(job, e)
+                        if isinstance(e, BrokenProcessPool):
+                            for job in running.values():
+                                self.fail(job, e)
+                            return False
+                        continue
+                    style = self.style.SUCCESS if status == ReportJob.STATUS_DONE else self.style.ERROR
+                    self.stdout.write(style(f'Report job #{job.pk} {status}'))
+    
+    def fail(self, job, error):
+        ReportJob.objects.filter(pk=job.pk).update(
+            status=ReportJob.STATUS_FAILED,
+            error=f'Worker crashed: {type(error).__name__}: {error}',
+            finished_at=timezone.now(),
+        )
+        self.stderr.write(f'Report job #{job.pk} crashed: {error}')
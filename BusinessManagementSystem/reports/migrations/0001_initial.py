@@ -0,0 +1,41 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('report_format', models.CharField(choices=[('csv', 'CSV'), ('csv_gz', 'CSV (gzip)'), ('pdf', 'PDF')], max_length=10)),
+                ('params', models.JSONField(blank=True, default=dict, help_text='Normalised sales filters')),
+                ('signature', models.CharField(help_text='Hash of the format and filters', max_length=64)),
+                ('watermark', models.CharField(help_text='Data version the report was requested at', max_length=40)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'), ('expired', 'Expired')], default='pending', max_length=10)),
+                ('artifact', models.FileField(blank=True, upload_to='reports/')),
+                ('size', models.BigIntegerField(blank=True, help_text='Artifact size in bytes', null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, help_text='User who requested this report', null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Report Job',
+                'verbose_name_plural': 'Report Jobs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['signature', 'watermark'], name='report_job_signature_idx'), models.Index(fields=['status', 'created_at'], name='report_job_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='reportjob',
+            name='report_format',
+            field=models.CharField(choices=[('csv', 'CSV'), ('csv_gz', 'CSV (gzip)'), ('pdf', 'PDF'), ('parquet', 'Parquet'), ('arrow', 'Arrow IPC')], max_length=10),
+        ),
+    ]
@@ -1,3 +1,68 @@
 from django.db import models
+from django.contrib.auth.models import User
 
-# Create your models here.
+
+class ReportJob(models.Model):
+    """
+    A sales export generated in the background by run_report_worker.
+    
+    Jobs are identified by a signature of their format and normalised
+    filters plus the data watermark at request time; a repeat request
+    with the same signature and watermark reuses the job and its stored
+    artifact instead of generating the report again.
+    """
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('csv_gz', 'CSV (gzip)'),
+        ('pdf', 'PDF'),
+        ('parquet', 'Parquet'),
+        ('arrow', 'Arrow IPC'),
+    ]
+    
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_EXPIRED = 'expired'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+        (STATUS_EXPIRED, 'Expired'),
+    ]
+    
+    report_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    params = models.JSONField(default=dict, blank=True, help_text="Normalised sales filters")
+    signature = models.CharField(max_length=64, help_text="Hash of the format and filters")
+    watermark = models.CharField(max_length=40, help_text="Data version the report was requested at")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    artifact = models.FileField(upload_to='reports/', blank=True)
+    size = models.BigIntegerField(null=True, blank=True, help_text="Artifact size in bytes")
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        help_text="User who requested this report"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Report Job"
+        verbose_name_plural = "Report Jobs"
+        indexes = [
+            models.Index(fields=['signature', 'watermark'], name='report_job_signature_idx'),
+            models.Index(fields=['status', 'created_at'], name='report_job_queue_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_report_format_display()} report #{self.pk} ({self.status})"
+    
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED, self.STATUS_EXPIRED)
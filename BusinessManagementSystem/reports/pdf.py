@@ -0,0 +1,213 @@
+"""
+Paginated PDF sales reports built with reportlab's platypus.
+
+Sales are read in chunks and turned into flowables lazily while the
+document is laid out, so only a few tables are alive at a time. Each
+day gets a heading, its sales in bounded tables whose header row repeats
+on every page, and a subtotal; the report ends with grand totals. Pages
+are compressed as they are finished and the output goes to a file
+object (normally a temporary file) rather than an in-memory buffer.
+"""
+from decimal import Decimal
+from itertools import groupby
+from xml.sax.saxutils import escape
+from django.template.defaultfilters import pluralize
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.pdfbase import pdfdoc
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+
+PDF_HEADER = ['Time', 'Product', 'Qty', 'Total', 'Profit', 'Customer']
+
+PDF_FIELDS = ('date_sold', 'product__name', 'quantity_sold', 'total_cost', 'profit', 'customer_name')
+
+COLUMN_WIDTHS = [0.7 * inch, 2.6 * inch, 0.5 * inch, 1.0 * inch, 1.0 * inch, 1.7 * inch]
+
+# Rows fetched from the database per round-trip
+CHUNK_SIZE = 2000
+
+# Upper bound on rows per Table flowable; splitting a table across pages
+# costs time proportional to its size, so long days become several tables
+ROWS_PER_TABLE = 200
+
+TABLE_STYLE = TableStyle([
+    ('FONT', (0, 0), (-1, 0), 'Helvetica-Bold', 9),
+    ('FONT', (0, 1), (-1, -1), 'Helvetica', 8),
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e5e7eb')),
+    ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.grey),
+    ('ALIGN', (2, 0), (4, -1), 'RIGHT'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+    ('TOPPADDING', (0, 0), (-1, -1), 1),
+])
+
+TOTAL_STYLE = TableStyle([
+    ('FONT', (0, 0), (-1, -1), 'Helvetica-Bold', 8),
+    ('LINEABOVE', (0, 0), (-1, 0), 0.5, colors.grey),
+    ('ALIGN', (2, 0), (4, -1), 'RIGHT'),
+])
+
+
+def _money(value):
+    return f'${value:,.2f}'
+
+
+def _truncate(text, length):
+    text = text or ''
+    return text if len(text) <= length else text[:length - 1] + '…'
+
+
+class _AppliedFilter:
+    """Names a stream filter whose encoding has already been applied"""
+    
+    def __init__(self, stream_filter):
+        self.pdfname = stream_filter.pdfname
+    
+    def encode(self, content):
+        return content
+
+
+class _CompressingCanvas(Canvas):
+    """
+    Canvas that zlib-compresses each page's content stream as the page ends.
+    
+    reportlab keeps every page in memory until the document is saved and
+    normally compresses (and ASCII85-encodes) them only then; compressing
+    up front keeps a finished page at roughly 2 KB, so memory grows with
+    the compressed size of the report rather than its row count.
+    """
+    
+    def showPage(self):
+        super().showPage()
+        page = self._doc.Pages.pages[-1]
+        if not (self._pageCompression and page.stream):
+            return
+        stream = pdfdoc.PDFStream(
+            content=pdfdoc.PDFZCompress.encode(page.stream),
+            filters=[_AppliedFilter(pdfdoc.PDFZCompress)],
+        )
+        stream.__Comment__ = 'page stream'
+        page.Contents = stream
+        page.stream = None
+
+
+class _LazyStory(list):
+    """
+    A flowable list that pulls from a generator as platypus consumes it.
+    
+    BaseDocTemplate.build loops ``while len(flowables)`` and pops from the
+    front, so topping up inside ``__len__`` keeps a short lookahead buffer
+    (enough for keepWithNext) without materialising the whole report.
+    """
+    
+    def __init__(self, flowables, lookahead=4):
+        super().__init__()
+        self._source = iter(flowables)
+        self._lookahead = lookahead
+    
+    def __len__(self):
+        while self._source is not None and super().__len__() < self._lookahead:
+            try:
+                self.append(next(self._source))
+            except StopIteration:
+                self._source = None
+        return super().__len__()
+
+
+class SalesReport:
+    """Lay out a period sales report for a Sale queryset into a PDF file"""
+    
+    def __init__(self, queryset, title='Sales Report', subtitle='', chunk_size=CHUNK_SIZE):
+        self.queryset = queryset.order_by('date_sold', 'id')
+        self.title = title
+        self.subtitle = subtitle
+        self.chunk_size = chunk_size
+        self.styles = getSampleStyleSheet()
+        self.totals = {'transactions': 0, 'quantity': 0, 'revenue': Decimal('0'), 'profit': Decimal('0')}
+        self.days = 0
+        self.pages = 0
+    
+    def rows_by_day(self):
+        """Yield (local date, iterator of rows) in chronological order"""
+        rows = self.queryset.values_list(*PDF_FIELDS).iterator(chunk_size=self.chunk_size)
+        localized = ((timezone.localtime(row[0]), *row[1:]) for row in rows)
+        return groupby(localized, key=lambda row: row[0].date())
+    
+    def flowables(self):
+        # Paragraph parses its text as markup
+        yield Paragraph(escape(self.title), self.styles['Title'])
+        subtitle = self.subtitle or f"Generated on: {timezone.localtime().strftime('%Y-%m-%d %H:%M')}"
+        yield Paragraph(escape(subtitle), self.styles['Normal'])
+        yield Spacer(1, 0.2 * inch)
+        
+        for day, rows in self.rows_by_day():
+            self.days += 1
+            heading = Paragraph(day.strftime('%A, %B %d, %Y'), self.styles['Heading3'])
+            heading.keepWithNext = True
+            yield heading
+            
+            day_totals = {'transactions': 0, 'quantity': 0, 'revenue': Decimal('0'), 'profit': Decimal('0')}
+            block = [PDF_HEADER]
+            for date_sold, product, quantity, total_cost, profit, customer in rows:
+                block.append([
+                    date_sold.strftime('%H:%M'),
+                    _truncate(product, 40),
+                    quantity,
+                    _money(total_cost),
+                    _money(profit),
+                    _truncate(customer, 26),
+                ])
+                day_totals['transactions'] += 1
+                day_totals['quantity'] += quantity
+                day_totals['revenue'] += total_cost
+                day_totals['profit'] += profit
+                if len(block) > ROWS_PER_TABLE:
+                    yield self.table(block)
+                    block = [PDF_HEADER]
+            if len(block) > 1:
+                yield self.table(block)
+            
+            yield self.total_row(f"Subtotal ({day_totals['transactions']} sales)", day_totals)
+            for key, value in day_totals.items():
+                self.totals[key] += value
+        
+        yield Spacer(1, 0.3 * inch)
+        yield self.total_row(
+            f"Grand total ({self.totals['transactions']} sales over {self.days} day{pluralize(self.days)})",
+            self.totals)
+    
+    def table(self, rows):
+        return Table(rows, colWidths=COLUMN_WIDTHS, repeatRows=1, style=TABLE_STYLE)
+    
+    def total_row(self, label, totals):
+        row = [label, '', totals['quantity'], _money(totals['revenue']), _money(totals['profit']), '']
+        table = Table([row], colWidths=COLUMN_WIDTHS, style=TOTAL_STYLE)
+        table.setStyle([('SPAN', (0, 0), (1, 0))])
+        return table
+    
+    def on_page(self, canvas, doc):
+        self.pages = doc.page
+        canvas.saveState()
+        canvas.setFont('Helvetica', 8)
+        canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, 0.5 * inch, f'Page {doc.page}')
+        canvas.restoreState()
+    
+    def build(self, output):
+        """Write the report to ``output`` (a path or binary file object); returns the page count"""
+        doc = SimpleDocTemplate(
+            output,
+            pagesize=letter,
+            title=self.title,
+            leftMargin=0.6 * inch,
+            rightMargin=0.6 * inch,
+            topMargin=0.6 * inch,
+            bottomMargin=0.8 * inch,
+            pageCompression=1,
+        )
+        doc.build(_LazyStory(self.flowables()), onFirstPage=self.on_page, onLaterPages=self.on_page,
+                  canvasmaker=_CompressingCanvas)
+        return self.pages
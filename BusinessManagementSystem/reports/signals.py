@@ -0,0 +1,20 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from inventory.models import Product
+from sales.models import Sale
+from .cache import bump_rewrite_version
+
+
+@receiver(post_save, sender=Sale, dispatch_uid='reports_sale_saved')
+def sale_saved(sender, instance, created, **kwargs):
+    # New sales raise the highest id and are merged into cached results
+    if not created:
+        transaction.on_commit(bump_rewrite_version)
+
+
+@receiver(post_delete, sender=Sale, dispatch_uid='reports_sale_deleted')
+@receiver(post_delete, sender=Product, dispatch_uid='reports_product_deleted')
+def sales_removed(sender, **kwargs):
+    # Bump after commit so readers never cache the old sales under the new version
+    transaction.on_commit(bump_rewrite_version)
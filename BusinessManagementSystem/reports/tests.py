@@ -1,3 +1,637 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import random
+import re
+import shutil
+import tempfile
+import zlib
+import zoneinfo
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.contrib.auth.models import User
+from django.db.models import Count, Sum
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from dashboard.cache import bump_data_version, get_cache
+from inventory.models import Product
+from sales.models import Sale
+from sales.views import SalesHistoryView
+from .analytics import PeriodComparison, SalesColumns, local_days, product_performance, profit_report, sales_report
+from .cache import cache_stats, reset_cache_stats
+from .columnar import dataset_queryset, write_columnar
+from .exports import FLUSH_SIZE, iter_sales_csv, sales_export_queryset
+from .jobs import claim_next_job, request_report, run_job
+from .models import ReportJob
+from .pdf import SalesReport
+from .views import ProfitReportView
 
-# Create your tests here.
+
+class SalesCsvExportTests(TestCase):
+    """The CSV export streams, honours the history filters and can be gzipped."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('clerk', password='secret')
+        cls.widget = Product.objects.create(
+            name='Widget',
+            category='other',
+            buying_price=Decimal('5.00'),
+            selling_price=Decimal('8.00'),
+            quantity=100,
+            supplier='Acme',
+        )
+        cls.gadget = Product.objects.create(
+            name='Gadget',
+            category='other',
+            buying_price=Decimal('1.00'),
+            selling_price=Decimal('3.00'),
+            quantity=100,
+            supplier='Acme',
+        )
+        cls.old_sale = Sale.objects.create(product=cls.widget, quantity_sold=1, sold_by=cls.user)
+        Sale.objects.filter(pk=cls.old_sale.pk).update(date_sold=timezone.now() - timedelta(days=10))
+        cls.widget_sale = Sale.objects.create(product=cls.widget, quantity_sold=2, customer_name='Ann')
+        cls.gadget_sale = Sale.objects.create(product=cls.gadget, quantity_sold=3, notes='gift')
+    
+    def setUp(self):
+        self.client.force_login(self.user)
+    
+    def export(self, **params):
+        response = self.client.get(reverse('reports:export_csv'), params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content)
+        if params.get('gzip'):
+            self.assertEqual(response['Content-Type'], 'application/gzip')
+            content = gzip.decompress(content)
+        return list(csv.reader(io.StringIO(content.decode('utf-8'))))
+    
+    def test_exports_every_sale_newest_first(self):
+        rows = self.export()
+        self.assertEqual(rows[0], ['Date', 'Product', 'Quantity', 'Total Cost', 'Profit', 'Customer', 'Sold By'])
+        self.assertEqual([row[1:] for row in rows[1:]], [
+            ['Gadget', '3', '9.00', '6.00', 'N/A', 'N/A'],
+            ['Widget', '2', '16.00', '6.00', 'Ann', 'N/A'],
+            ['Widget', '1', '8.00', '3.00', 'N/A', 'clerk'],
+        ])
+    
+    def test_applies_history_filters(self):
+        today = timezone.localdate().isoformat()
+        self.assertEqual(len(self.export(start_date=today)), 3)
+        self.assertEqual(len(self.export(product=self.widget.pk)), 3)
+        self.assertEqual([row[1] for row in self.export(search='gif')[1:]], ['Gadget'])
+    
+    def test_invalid_product_is_ignored(self):
+        for product in ('abc', '²', '-1'):
+            self.assertEqual(len(self.export(product=product)), 4, product)
+        response = self.client.get(reverse('reports:export_pdf'), {'product': 'abc'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('reports:export_columnar', args=['sales', 'arrow']), {'product': 'abc'})
+        self.assertEqual(response.status_code, 200)
+        request = RequestFactory().get(reverse('sales:sales_history'), {'product': 'abc'})
+        request.user = self.user
+        view = SalesHistoryView(request=request, kwargs={})
+        self.assertEqual(view.get_queryset().count(), 3)
+    
+    def test_gzip_matches_plain_output(self):
+        self.assertEqual(self.export(gzip='1'), self.export())
+    
+    def test_large_exports_are_flushed_in_chunks(self):
+        Sale.objects.bulk_create([
+            Sale(product=self.gadget, quantity_sold=1, total_cost=Decimal('3.00'),
+                 profit=Decimal('2.00'), customer_name='x' * 100)
+            for _ in range(2000)
+        ])
+        chunks = list(iter_sales_csv(sales_export_queryset(), chunk_size=100))
+        self.assertGreater(len(chunks), 2)
+        self.assertTrue(all(len(chunk) < FLUSH_SIZE + 1024 for chunk in chunks))
+        self.assertEqual(''.join(chunks).count('\r\n'), 2004)
+
+
+class ColumnarExportTests(TestCase):
+    """Parquet and Arrow exports keep decimal and timestamp types and are written in batches."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('clerk', password='secret')
+        cls.widget = Product.objects.create(
+            name='Widget',
+            category='electronics',
+            buying_price=Decimal('5.25'),
+            selling_price=Decimal('8.10'),
+            quantity=100,
+            supplier='Acme',
+            added_by=cls.user,
+        )
+        cls.scarf = Product.objects.create(
+            name='Scarf',
+            category='clothing',
+            buying_price=Decimal('2.50'),
+            selling_price=Decimal('9.99'),
+            quantity=100,
+            supplier='Knits',
+        )
+        for quantity in (1, 2, 3):
+            Sale.objects.create(product=cls.widget, quantity_sold=quantity, sold_by=cls.user, customer_name='Ann')
+        Sale.objects.create(product=cls.scarf, quantity_sold=4)
+    
+    def setUp(self):
+        self.client.force_login(self.user)
+    
+    def download(self, dataset, report_format, **params):
+        response = self.client.get(reverse('reports:export_columnar', args=[dataset, report_format]), params)
+        self.assertEqual(response.status_code, 200)
+        data = pa.BufferReader(b''.join(response.streaming_content))
+        if report_format == 'parquet':
+            return pq.read_table(data)
+        return pa.ipc.open_file(data).read_all()
+    
+    def test_sales_keep_their_types(self):
+        table = self.download('sales', 'parquet')
+        self.assertEqual(table.schema.field('total_cost').type, pa.decimal128(10, 2))
+        self.assertEqual(table.schema.field('date_sold').type, pa.timestamp('us', tz='UTC'))
+        self.assertEqual(table.column('total_cost').to_pylist(),
+                         [Decimal('8.10'), Decimal('16.20'), Decimal('24.30'), Decimal('39.96')])
+        self.assertEqual(table.column('sold_by').to_pylist(), ['clerk', 'clerk', 'clerk', None])
+        first = Sale.objects.order_by('id').first()
+        self.assertEqual(table.column('date_sold')[0].as_py(), first.date_sold)
+        
+        filtered = self.download('sales', 'arrow', product=self.scarf.pk)
+        self.assertEqual(filtered.column('category').to_pylist(), ['clothing'])
+    
+    def test_products(self):
+        table = self.download('products', 'arrow', category='electronics')
+        self.assertEqual(table.to_pylist(), [{
+            'id': self.widget.pk,
+            'name': 'Widget',
+            'category': 'electronics',
+            'buying_price': Decimal('5.25'),
+            'selling_price': Decimal('8.10'),
+            'quantity': 94,
+            'supplier': 'Acme',
+            'date_added': Product.objects.get(pk=self.widget.pk).date_added,
+            'added_by': 'clerk',
+        }])
+        self.assertEqual(self.download('products', 'parquet').num_rows, 2)
+    
+    def test_batches_become_row_groups(self):
+        output = io.BytesIO()
+        rows = write_columnar('sales', dataset_queryset('sales'), output, 'parquet', batch_size=3)
+        self.assertEqual(rows, 4)
+        parquet = pq.ParquetFile(pa.BufferReader(output.getvalue()))
+        self.assertEqual([parquet.metadata.row_group(i).num_rows for i in range(parquet.num_row_groups)], [3, 1])
+    
+    def test_unknown_export_is_404(self):
+        self.assertEqual(self.client.get(reverse('reports:export_columnar', args=['orders', 'parquet'])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('reports:export_columnar', args=['sales', 'xlsx'])).status_code, 404)
+
+
+def pdf_text(data):
+    """Concatenate the decompressed content streams of a reportlab PDF"""
+    streams = re.findall(rb'/FlateDecode.*?stream\r?\n(.*?)endstream', data, re.S)
+    return b''.join(zlib.decompress(stream) for stream in streams).decode('latin-1')
+
+
+class SalesPdfReportTests(TestCase):
+    """The PDF report covers the full history with daily subtotals and grand totals."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('clerk', password='secret')
+        product = Product.objects.create(
+            name='Widget',
+            category='other',
+            buying_price=Decimal('5.00'),
+            selling_price=Decimal('8.00'),
+            quantity=1000,
+            supplier='Acme',
+        )
+        Sale.objects.bulk_create([
+            Sale(product=product, quantity_sold=1, total_cost=Decimal('8.00'), profit=Decimal('3.00'))
+            for _ in range(150)
+        ])
+        # Move 50 of them to yesterday
+        yesterday = Sale.objects.order_by('id').values_list('id', flat=True)[49]
+        Sale.objects.filter(id__lte=yesterday).update(date_sold=timezone.now() - timedelta(days=1))
+    
+    def test_report_has_every_row_subtotals_and_grand_total(self):
+        output = io.BytesIO()
+        pages = SalesReport(Sale.objects.all()).build(output)
+        text = pdf_text(output.getvalue())
+        
+        self.assertGreater(pages, 3)
+        self.assertEqual(text.count('(Widget)'), 150)
+        self.assertIn('Subtotal \\(50 sales\\)', text)
+        self.assertIn('Subtotal \\(100 sales\\)', text)
+        self.assertIn('Grand total \\(150 sales over 2 days\\)', text)
+        self.assertIn('($1,200.00)', text)
+        self.assertIn('($450.00)', text)
+        # The column header repeats on every page with rows (the last holds only totals)
+        self.assertGreaterEqual(text.count('(Product)'), pages - 1)
+    
+    def test_export_view_applies_filters(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('reports:export_pdf'), {'start_date': timezone.localdate().isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        text = pdf_text(b''.join(response.streaming_content))
+        self.assertIn('Grand total \\(100 sales over 1 day\\)', text)
+        self.assertIn(f'Period: {timezone.localdate().isoformat()} to today', text)
+    
+    def test_export_view_ignores_malformed_dates(self):
+        self.client.force_login(self.user)
+        for start_date in ('bogus', '<b', '2024-01-01<br/>'):
+            with self.subTest(start_date=start_date):
+                response = self.client.get(reverse('reports:export_pdf'),
+                                           {'start_date': start_date, 'end_date': '</para>'})
+                self.assertEqual(response.status_code, 200)
+                text = pdf_text(b''.join(response.streaming_content))
+                self.assertIn('Period: the beginning to today', text)
+                self.assertIn('Grand total \\(150 sales over 2 days\\)', text)
+    
+    def test_title_and_subtitle_are_not_parsed_as_markup(self):
+        output = io.BytesIO()
+        SalesReport(Sale.objects.none(), title='Sales <b', subtitle='Acme & Sons </i>').build(output)
+        # Lines are drawn as runs of (text) Tj operators
+        text = pdf_text(output.getvalue()).replace(') Tj (', '')
+        self.assertIn('Sales <b', text)
+        self.assertIn('Acme & Sons </i>', text)
+
+
+class ReportJobTests(TestCase):
+    """Queued exports are generated once per filter set and data version."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('clerk', password='secret')
+        cls.widget = Product.objects.create(
+            name='Widget',
+            category='other',
+            buying_price=Decimal('5.00'),
+            selling_price=Decimal('8.00'),
+            quantity=100,
+            supplier='Acme',
+        )
+        Sale.objects.create(product=cls.widget, quantity_sold=2, customer_name='Ann')
+        Sale.objects.create(product=cls.widget, quantity_sold=1, customer_name='Bob')
+    
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        get_cache().clear()
+        self.client.force_login(self.user)
+    
+    def run_queue(self):
+        while (job := claim_next_job()) is not None:
+            run_job(job.pk)
+    
+    def test_same_request_reuses_the_job_and_its_artifact(self):
+        job, created = request_report('csv', {'search': ' Ann ', 'end_date': ''})
+        self.assertTrue(created)
+        self.assertEqual(job.params, {'search': 'Ann'})
+        self.assertEqual(request_report('csv', {'search': 'Ann'}), (job, False))
+        
+        self.run_queue()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.STATUS_DONE)
+        rows = list(csv.reader(io.StringIO(job.artifact.open('rb').read().decode('utf-8'))))
+        self.assertEqual([row[5] for row in rows[1:]], ['Ann'])
+        self.assertEqual(job.size, job.artifact.size)
+        self.assertEqual(request_report('csv', {'search': 'Ann'}), (job, False))
+        
+        # Different filters or format make a different report
+        self.assertTrue(request_report('csv', {'search': 'Bob'})[1])
+        self.assertTrue(request_report('pdf', {'search': 'Ann'})[1])
+    
+    def test_data_change_supersedes_the_stored_artifact(self):
+        first, _ = request_report('csv_gz', {})
+        self.run_queue()
+        first.refresh_from_db()
+        old_name = first.artifact.name
+        
+        bump_data_version()
+        second, created = request_report('csv_gz', {})
+        self.assertTrue(created)
+        self.run_queue()
+        
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.status, ReportJob.STATUS_EXPIRED)
+        self.assertFalse(first.artifact.storage.exists(old_name))
+        self.assertEqual(second.status, ReportJob.STATUS_DONE)
+        content = gzip.decompress(second.artifact.open('rb').read()).decode('utf-8')
+        self.assertEqual(content.count('Widget'), 2)
+    
+    def test_failed_job_records_the_error(self):
+        job, _ = request_report('csv', {'start_date': 'not-a-date'})
+        with mock.patch('reports.jobs.filter_sales', side_effect=ValueError('boom')):
+            self.run_queue()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.STATUS_FAILED)
+        self.assertEqual(job.error, 'ValueError: boom')
+        # A failed job is not reused
+        self.assertTrue(request_report('csv', {'start_date': 'not-a-date'})[1])
+    
+    def test_create_poll_and_download_endpoints(self):
+        response = self.client.post(reverse('reports:job_create'), {'format': 'pdf', 'product': self.widget.pk})
+        self.assertEqual(response.status_code, 201)
+        payload = response.json()
+        self.assertEqual(payload['status'], ReportJob.STATUS_PENDING)
+        self.assertNotIn('download_url', payload)
+        
+        response = self.client.post(reverse('reports:job_create'), {'format': 'pdf', 'product': self.widget.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], payload['id'])
+        self.assertEqual(self.client.get(reverse('reports:job_download', args=[payload['id']])).status_code, 404)
+        
+        self.run_queue()
+        payload = self.client.get(payload['status_url']).json()
+        self.assertEqual(payload['status'], ReportJob.STATUS_DONE)
+        response = self.client.get(payload['download_url'])
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('sales_report.pdf', response['Content-Disposition'])
+        self.assertIn('Grand total \\(2 sales over 1 day\\)', pdf_text(b''.join(response.streaming_content)))
+        
+        self.assertEqual(self.client.post(reverse('reports:job_create'), {'format': 'xlsx'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('reports:job_create')).status_code, 405)
+    
+    def test_invalid_product_is_rejected_when_queued(self):
+        response = self.client.post(reverse('reports:job_create'), {'format': 'csv', 'product': 'abc'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'product must be a product id'})
+        self.assertFalse(ReportJob.objects.exists())
+        
+        # Equivalent ids share one job
+        first = self.client.post(reverse('reports:job_create'), {'format': 'csv', 'product': f' {self.widget.pk}'})
+        second = self.client.post(reverse('reports:job_create'), {'format': 'csv', 'product': f'0{self.widget.pk}'})
+        self.assertEqual(first.json()['id'], second.json()['id'])
+        self.assertEqual(ReportJob.objects.get().params, {'product': str(self.widget.pk)})
+
+
+class AnalyticsEngineTests(TestCase):
+    """The columnar reports agree with the ORM and compare against the previous period."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('clerk', password='secret')
+        cls.widget = Product.objects.create(
+            name='Widget',
+            category='electronics',
+            buying_price=Decimal('5.00'),
+            selling_price=Decimal('8.00'),
+            quantity=1000,
+            supplier='Acme',
+        )
+        cls.scarf = Product.objects.create(
+            name='Scarf',
+            category='clothing',
+            buying_price=Decimal('2.50'),
+            selling_price=Decimal('9.99'),
+            quantity=1000,
+            supplier='Acme',
+        )
+        today = timezone.localdate()
+        cls.start = today - timedelta(days=6)
+        # Days ago -> (product, quantity); days 7..13 are the previous period
+        for days_ago, product, quantity in [
+            (0, cls.widget, 2), (0, cls.scarf, 1), (2, cls.widget, 1), (6, cls.scarf, 3),
+            (7, cls.widget, 1), (10, cls.scarf, 1), (20, cls.widget, 5),
+        ]:
+            sale = Sale.objects.create(product=product, quantity_sold=quantity, sold_by=cls.user)
+            Sale.objects.filter(pk=sale.pk).update(date_sold=timezone.now() - timedelta(days=days_ago))
+    
+    def setUp(self):
+        get_cache().clear()
+    
+    def params(self, **extra):
+        return {'start_date': self.start.isoformat(), 'end_date': timezone.localdate().isoformat(), **extra}
+    
+    def test_group_by_matches_orm_annotate(self):
+        columns = SalesColumns.load(Sale.objects.all())
+        groups = columns.group_by('product')
+        expected = (Sale.objects.values('product_id')
+                    .annotate(n=Count('id'), units=Sum('quantity_sold'), revenue=Sum('total_cost'), profit=Sum('profit'))
+                    .order_by('product_id'))
+        self.assertEqual(groups['key'].tolist(), [row['product_id'] for row in expected])
+        self.assertEqual(groups['transactions'].tolist(), [row['n'] for row in expected])
+        self.assertEqual(groups['units'].tolist(), [row['units'] for row in expected])
+        self.assertEqual(groups['revenue'].tolist(), [int(row['revenue'] * 100) for row in expected])
+        self.assertEqual(groups['profit'].tolist(), [int(row['profit'] * 100) for row in expected])
+        self.assertEqual(len(columns.group_by('day')['key']), 6)
+    
+    def test_local_days_follow_daylight_saving(self):
+        when = np.array([b'2025-03-09 06:30:00', b'2025-11-02 03:59:59', b'2025-11-02 04:30:00'])
+        with timezone.override(zoneinfo.ZoneInfo('America/New_York')):
+            days = local_days(when)
+        self.assertEqual([str(day) for day in days], ['2025-03-09', '2025-11-01', '2025-11-02'])
+    
+    def test_sales_report_compares_with_previous_period(self):
+        report = sales_report(self.params())
+        totals = report['totals']
+        self.assertEqual((report['start'], report['days'], report['previous_end']),
+                         (self.start, 7, self.start - timedelta(days=1)))
+        self.assertEqual(totals['transactions'], 4)
+        self.assertEqual(totals['revenue'], Decimal('63.96'))
+        self.assertEqual(totals['previous_revenue'], Decimal('17.99'))
+        self.assertEqual(totals['changes']['revenue'], 255.5)
+        self.assertEqual(totals['profit'], Decimal('38.96'))
+        self.assertEqual(totals['margin'], 60.91)
+        
+        # Every day of the period, zero-filled, lined up with the same day a week earlier
+        daily = report['daily']
+        self.assertEqual([row['date'] for row in daily], [self.start + timedelta(days=i) for i in range(7)])
+        self.assertEqual([row['transactions'] for row in daily], [1, 0, 0, 0, 1, 0, 2])
+        self.assertEqual([row['previous_revenue'] for row in daily[3::3]], [Decimal('9.99'), Decimal('8.00')])
+        self.assertIsNone(daily[0]['changes']['revenue'])
+        self.assertEqual(daily[-1]['changes']['revenue'], 224.9)
+        
+        categories = {row['category']: row for row in report['categories']}
+        self.assertEqual(categories['clothing']['revenue'], Decimal('39.96'))
+        self.assertEqual(categories['clothing']['changes']['units'], 300.0)
+        self.assertEqual(categories['electronics']['revenue_share'], 37.52)
+    
+    def test_product_performance_and_filters(self):
+        products = product_performance(self.params())['products']
+        self.assertEqual([(row['rank'], row['name']) for row in products], [(1, 'Scarf'), (2, 'Widget')])
+        self.assertEqual(products[1]['margin'], 37.5)
+        
+        filtered = product_performance(self.params(category='electronics', product='not-a-number'))
+        self.assertEqual([row['name'] for row in filtered['products']], ['Widget'])
+        self.assertEqual(profit_report(self.params(product=str(self.scarf.pk)))['totals']['units'], 4)
+    
+    def test_reports_are_cached_per_filter_set(self):
+        sales_report(self.params())
+        with self.assertNumQueries(2):  # the watermark only
+            sales_report({**self.params(), 'unknown': 'ignored'})
+        with self.assertNumQueries(4):
+            sales_report(self.params(category='clothing'))
+    
+    def test_profit_view_context(self):
+        view = ProfitReportView()
+        view.setup(RequestFactory().get('/reports/profit-report/', self.params()))
+        context = view.get_context_data()
+        self.assertEqual(context['start_date'], self.start.isoformat())
+        self.assertEqual(len(context['chart_data']['labels']), 7)
+        self.assertEqual([row['name'] for row in context['margin_tables'][0][2]], ['Scarf', 'Widget'])
+
+
+class ReportResultCacheTests(TestCase):
+    """Cached report results are reused, merged with new sales or recomputed by watermark."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('clerk', password='secret')
+        cls.products = [
+            Product.objects.create(
+                name=f'Item {i}',
+                category=category,
+                buying_price=Decimal('2.00') + i,
+                selling_price=Decimal('3.49') + 2 * i,
+                quantity=10000,
+                supplier='Acme',
+            )
+            for i, category in enumerate(['books', 'toys', 'books'])
+        ]
+        for i in range(12):
+            cls.sell(cls.products[i % 3], 1 + i % 4, days_ago=i)
+    
+    @classmethod
+    def sell(cls, product, quantity, days_ago=0):
+        sale = Sale.objects.create(product=product, quantity_sold=quantity, sold_by=cls.user)
+        if days_ago:
+            Sale.objects.filter(pk=sale.pk).update(date_sold=timezone.now() - timedelta(days=days_ago))
+        return sale
+    
+    def setUp(self):
+        get_cache().clear()
+        reset_cache_stats()
+    
+    def fresh(self, build, params=None):
+        """The report computed without the result cache"""
+        with mock.patch('reports.analytics.cached_columns', lambda key, queryset, load: load(queryset)):
+            return build(params or {})
+    
+    def test_hit_then_merge_of_new_sales(self):
+        report = sales_report({})
+        self.assertEqual(report, sales_report({}))
+        self.assertEqual(cache_stats(), {'hits': 1, 'misses': 1, 'merges': 0})
+        
+        self.sell(self.products[1], 3)
+        self.sell(self.products[2], 2, days_ago=40)  # before both periods; filtered out
+        with mock.patch.object(SalesColumns, 'load', wraps=SalesColumns.load) as load:
+            merged = sales_report({})
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(load.call_args.args[0].count(), 2)  # only the new sales are read
+        self.assertEqual(cache_stats(), {'hits': 1, 'misses': 1, 'merges': 1})
+        self.assertEqual(merged['totals']['transactions'], report['totals']['transactions'] + 1)
+        self.assertEqual(merged, self.fresh(sales_report))
+    
+    def test_random_appends_merge_to_the_full_result(self):
+        rng = random.Random(19)
+        params = {'category': 'books'}
+        profit_report(params)
+        for _ in range(6):
+            for _ in range(rng.randint(1, 4)):
+                self.sell(rng.choice(self.products), rng.randint(1, 5), days_ago=rng.randint(0, 70))
+            merged = profit_report(params)
+            self.assertEqual(merged, self.fresh(profit_report, params))
+        self.assertEqual(cache_stats()['merges'], 6)
+    
+    def test_edits_deletes_and_catalog_changes_recompute(self):
+        product_performance({})
+        sale = Sale.objects.order_by('id').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            sale.quantity_sold += 1
+            sale.save()
+        self.assertEqual(product_performance({}), self.fresh(product_performance))
+        with self.captureOnCommitCallbacks(execute=True):
+            Sale.objects.order_by('-id').first().delete()
+        self.assertEqual(product_performance({}), self.fresh(product_performance))
+        
+        product = self.products[0]
+        product.name = 'Renamed'
+        product.save()
+        names = {row['name'] for row in product_performance({})['products']}
+        self.assertIn('Renamed', names)
+        self.assertEqual(cache_stats(), {'hits': 0, 'misses': 4, 'merges': 0})
+    
+    def test_only_catalog_fields_stamp_the_product(self):
+        product = Product.objects.get(pk=self.products[2].pk)
+        product.quantity -= 1
+        product.save()
+        self.assertIsNone(product.catalog_changed_at)
+        product.selling_price = Decimal('99.00')
+        product.save(update_fields=['selling_price'])
+        product.refresh_from_db()
+        self.assertIsNotNone(product.catalog_changed_at)
+    
+    def test_compacted_columns_keep_the_totals(self):
+        self.sell(self.products[0], 1)
+        self.sell(self.products[0], 2)
+        columns = SalesColumns.load(Sale.objects.all())
+        compact = columns.compact()
+        self.assertLess(len(compact), len(columns))
+        for key in ('day', 'product', 'category'):
+            for metric, values in columns.group_by(key).items():
+                self.assertEqual(compact.group_by(key)[metric].tolist(), values.tolist())
+        comparison = PeriodComparison({})
+        self.assertEqual(comparison.summary()['totals']['transactions'], 14)
+    
+    def test_stats_endpoint(self):
+        sales_report({})
+        sales_report({})
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('reports:cache_stats'))
+        self.assertEqual(response.json(), {'hits': 1, 'misses': 1, 'merges': 0, 'hit_rate': 50.0})
+
+
+class RangeSummaryApiTests(TestCase):
+    """The range summary endpoint answers from the running daily totals."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('clerk', password='secret')
+        product = Product.objects.create(
+            name='Widget',
+            category='other',
+            buying_price=Decimal('5.00'),
+            selling_price=Decimal('8.00'),
+            quantity=100,
+            supplier='Acme',
+        )
+        Sale.objects.create(product=product, quantity_sold=2)
+        Sale.objects.create(product=product, quantity_sold=1)
+    
+    def setUp(self):
+        self.client.force_login(self.user)
+    
+    def test_totals_for_a_range(self):
+        today = timezone.localdate().isoformat()
+        with self.assertNumQueries(4):  # session, user, two running-total lookups
+            response = self.client.get(reverse('reports:range_summary'), {'start_date': today, 'end_date': today})
+        self.assertEqual(response.json(), {
+            'start_date': today,
+            'end_date': today,
+            'revenue': '24.00',
+            'profit': '9.00',
+            'units': 3,
+            'transactions': 2,
+            'margin': '37.50',
+        })
+        
+        yesterday = (timezone.localdate() - timedelta(days=1)).isoformat()
+        self.assertEqual(self.client.get(reverse('reports:range_summary'), {'end_date': yesterday}).json()['transactions'], 0)
+    
+    def test_rejects_bad_dates(self):
+        url = reverse('reports:range_summary')
+        self.assertEqual(self.client.get(url, {'start_date': '2024-13-01'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start_date': '2024-02-01', 'end_date': '2024-01-01'}).status_code, 400)
@@ -10,4 +10,10 @@ urlpatterns = [
     path('product-performance/', views.ProductPerformanceView.as_view(), name='product_performance'),
     path('export/csv/', views.export_sales_csv, name='export_csv'),
     path('export/pdf/', views.export_sales_pdf, name='export_pdf'),
+    path('export/<str:dataset>/<str:report_format>/', views.export_columnar, name='export_columnar'),
+    path('api/range-summary/', views.range_summary, name='range_summary'),
+    path('api/cache-stats/', views.report_cache_stats, name='cache_stats'),
+    path('jobs/', views.report_job_create, name='job_create'),
+    path('jobs/<int:pk>/', views.report_job_status, name='job_status'),
+    path('jobs/<int:pk>/download/', views.report_job_download, name='job_download'),
 ]
\ No newline at end of file
@@ -1,100 +1,251 @@
-from django.shortcuts import render
+from django.shortcuts import get_object_or_404, render
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_GET, require_POST
 from django.views.generic import TemplateView
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.db.models import Sum, Count, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
-import csv
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+from decimal import Decimal
+import tempfile
+from dashboard.cache import get_versioned
 from inventory.models import Product
+from sales.filters import _parse_date as parse_filter_date, filter_sales, parse_product_id
 from sales.models import Sale
+from .analytics import product_performance, profit_report, report_params, sales_report
+from .cache import cache_stats
+from .columnar import COLUMNAR_FORMATS, COLUMNS, dataset_queryset, write_columnar
+from .exports import gzip_stream, iter_sales_csv, sales_export_queryset
+from .jobs import FORMATS, job_payload, request_report
+from .models import ReportJob
+from .pdf import SalesReport
 
 
 class ReportsView(LoginRequiredMixin, TemplateView):
     template_name = 'reports/home.html'
 
 
-class SalesReportView(LoginRequiredMixin, TemplateView):
+class AnalyticsReportMixin:
+    """
+    Shared filters and context for the analytics report pages.
+    
+    Subclasses set ``build_report`` to one of the reports.analytics
+    builders; the report is computed on the columnar engine from sales
+    kept in the watermarked result cache.
+    """
+    build_report = None
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        params = report_params(self.request.GET)
+        report = self.build_report(params)
+        
+        context['report'] = report
+        context['start_date'] = report['start'].isoformat()
+        context['end_date'] = report['end'].isoformat()
+        context['selected_category'] = params.get('category', '')
+        context['selected_product'] = params.get('product', '')
+        context['categories'] = Product.CATEGORY_CHOICES
+        context['products'] = get_versioned('product-filter-options', lambda: list(
+            Product.objects.order_by('name').values('id', 'name')))
+        
+        if 'daily' in report:
+            # Chart.js wants plain numbers
+            daily = report['daily']
+            context['chart_data'] = {
+                'labels': [row['date'].strftime('%m/%d') for row in daily],
+                'revenue': [float(row['revenue']) for row in daily],
+                'profit': [float(row['profit']) for row in daily],
+                'previous_revenue': [float(row['previous_revenue']) for row in daily],
+                'margin': [row['margin'] for row in daily],
+            }
+        return context
+
+
+class SalesReportView(LoginRequiredMixin, AnalyticsReportMixin, TemplateView):
     template_name = 'reports/sales_report.html'
+    build_report = staticmethod(sales_report)
 
 
-class ProfitReportView(LoginRequiredMixin, TemplateView):
+class ProfitReportView(LoginRequiredMixin, AnalyticsReportMixin, TemplateView):
     template_name = 'reports/profit_report.html'
+    build_report = staticmethod(profit_report)
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        report = context['report']
+        context['margin_tables'] = [
+            ('Highest Margins', 'fa-arrow-up', report['highest_margin']),
+            ('Lowest Margins', 'fa-arrow-down', report['lowest_margin']),
+        ]
+        return context
 
 
-class ProductPerformanceView(LoginRequiredMixin, TemplateView):
+class ProductPerformanceView(LoginRequiredMixin, AnalyticsReportMixin, TemplateView):
     template_name = 'reports/product_performance.html'
+    build_report = staticmethod(product_performance)
 
 
 @login_required
 def export_sales_csv(request):
-    """Export sales data to CSV"""
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="sales_report.csv"'
-    
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'Product', 'Quantity', 'Total Cost', 'Profit', 'Customer', 'Sold By'])
-    
-    sales = Sale.objects.select_related('product', 'sold_by').order_by('-date_sold')
-    for sale in sales:
-        writer.writerow([
-            sale.date_sold.strftime('%Y-%m-%d %H:%M'),
-            sale.product.name,
-            sale.quantity_sold,
-            sale.total_cost,
-            sale.profit,
-            sale.customer_name or 'N/A',
-            sale.sold_by.username if sale.sold_by else 'N/A'
-        ])
+    """
+    Stream sales data as CSV.
+    
+    Accepts the sales history filters (``start_date``, ``end_date``,
+    ``product``, ``search``); ``gzip=1`` returns a compressed .csv.gz.
+    """
+    queryset = sales_export_queryset(filter_sales(Sale.objects.all(), request.GET))
+    chunks = iter_sales_csv(queryset)
     
+    if request.GET.get('gzip') in ('1', 'true'):
+        response = StreamingHttpResponse(gzip_stream(chunks), content_type='application/gzip')
+        response['Content-Disposition'] = 'attachment; filename="sales_report.csv.gz"'
+    else:
+        response = StreamingHttpResponse(chunks, content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="sales_report.csv"'
     return response
 
 
 @login_required
 def export_sales_pdf(request):
-    """Export sales data to PDF"""
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="sales_report.pdf"'
-    
-    p = canvas.Canvas(response, pagesize=letter)
-    width, height = letter
-    
-    # Title
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(50, height - 50, "Sales Report")
-    
-    # Date
-    p.setFont("Helvetica", 10)
-    p.drawString(50, height - 70, f"Generated on: {timezone.now().strftime('%Y-%m-%d %H:%M')}")
-    
-    # Headers
-    y = height - 100
-    p.setFont("Helvetica-Bold", 10)
-    p.drawString(50, y, "Date")
-    p.drawString(150, y, "Product")
-    p.drawString(300, y, "Qty")
-    p.drawString(350, y, "Total")
-    p.drawString(400, y, "Profit")
-    
-    # Data
-    y -= 20
-    p.setFont("Helvetica", 9)
-    sales = Sale.objects.select_related('product').order_by('-date_sold')[:50]  # Limit for PDF
-    
-    for sale in sales:
-        if y < 50:  # Start new page if needed
-            p.showPage()
-            y = height - 50
-        
-        p.drawString(50, y, sale.date_sold.strftime('%m/%d/%Y'))
-        p.drawString(150, y, sale.product.name[:20])  # Truncate long names
-        p.drawString(300, y, str(sale.quantity_sold))
-        p.drawString(350, y, f"${sale.total_cost:.2f}")
-        p.drawString(400, y, f"${sale.profit:.2f}")
-        y -= 15
-    
-    p.save()
-    return response
+    """
+    Export a paginated PDF report of sales.
+    
+    Accepts the same filters as the CSV export. The report covers every
+    matching sale, grouped by day with subtotals, and is built in a
+    temporary file that is streamed back and then discarded.
+    """
+    queryset = filter_sales(Sale.objects.all(), request.GET)
+    
+    # The period the filters applied; invalid dates are ignored by filter_sales
+    start_date = parse_filter_date(request.GET.get('start_date')) or 'the beginning'
+    end_date = parse_filter_date(request.GET.get('end_date')) or 'today'
+    subtitle = (f"Period: {start_date} to {end_date} · "
+                f"Generated on: {timezone.localtime().strftime('%Y-%m-%d %H:%M')}")
+    
+    output = tempfile.TemporaryFile()
+    SalesReport(queryset, subtitle=subtitle).build(output)
+    output.seek(0)
+    return FileResponse(output, as_attachment=True, filename='sales_report.pdf',
+                        content_type='application/pdf')
+
+
+@login_required
+@require_GET
+def export_columnar(request, dataset, report_format):
+    """
+    Export sales or products as Parquet or an Arrow IPC file.
+    
+    Money columns are decimals and times UTC timestamps. Sales accept the
+    history filters of the CSV export and products a ``category``. The
+    file is written in record batches to a temporary file that is
+    streamed back and then discarded.
+    """
+    if dataset not in COLUMNS or report_format not in COLUMNAR_FORMATS:
+        raise Http404("Unknown export")
+    
+    if dataset == 'sales':
+        queryset = filter_sales(Sale.objects.all(), request.GET)
+    else:
+        queryset = Product.objects.all()
+        if request.GET.get('category'):
+            queryset = queryset.filter(category=request.GET['category'])
+    
+    extension, content_type = COLUMNAR_FORMATS[report_format]
+    output = tempfile.TemporaryFile()
+    write_columnar(dataset, dataset_queryset(dataset, queryset), output, report_format)
+    output.seek(0)
+    return FileResponse(output, as_attachment=True, filename=f'{dataset}.{extension}',
+                        content_type=content_type)
+
+
+@login_required
+@require_POST
+def report_job_create(request):
+    """
+    Queue a sales export (CSV, gzipped CSV, PDF, Parquet or Arrow) for
+    ``run_report_worker``.
+    
+    Takes ``format`` and the sales history filters. If the same report
+    was already requested since the data last changed, that job is
+    returned instead (200); a new job is answered with 201. Clients poll
+    ``status_url`` until the status is ``done`` and then fetch
+    ``download_url``.
+    """
+    params = request.POST if request.POST else request.GET
+    report_format = params.get('format', 'csv')
+    if report_format not in FORMATS:
+        return JsonResponse({'error': f"format must be one of: {', '.join(FORMATS)}"}, status=400)
+    if (params.get('product') or '').strip() and parse_product_id(params['product']) is None:
+        return JsonResponse({'error': "product must be a product id"}, status=400)
+    
+    job, created = request_report(report_format, params, user=request.user)
+    return JsonResponse(job_payload(job), status=201 if created else 200)
+
+
+@login_required
+@require_GET
+def report_job_status(request, pk):
+    job = get_object_or_404(ReportJob, pk=pk)
+    return JsonResponse(job_payload(job))
+
+
+@login_required
+@require_GET
+def report_job_download(request, pk):
+    """Serve the stored artifact of a finished report job"""
+    job = get_object_or_404(ReportJob, pk=pk, status=ReportJob.STATUS_DONE)
+    if not job.artifact or not job.artifact.storage.exists(job.artifact.name):
+        raise Http404("Report file is no longer available")
+    
+    extension, content_type, _ = FORMATS[job.report_format]
+    return FileResponse(job.artifact.open('rb'), as_attachment=True,
+                        filename=f'sales_report.{extension}', content_type=content_type)
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+@login_required
+@require_GET
+def range_summary(request):
+    """
+    API endpoint returning sales totals for any range of whole local days.
+    
+    Query parameters: ``start_date`` and ``end_date`` (YYYY-MM-DD), both
+    optional and inclusive. Answered from the running daily totals, so
+    the cost does not depend on the length of the range.
+    """
+    try:
+        start_date = _parse_date(request.GET.get('start_date'))
+        end_date = _parse_date(request.GET.get('end_date'))
+    except ValueError:
+        return JsonResponse({'error': 'dates must be YYYY-MM-DD'}, status=400)
+    if start_date and end_date and start_date > end_date:
+        return JsonResponse({'error': 'start_date must not be after end_date'}, status=400)
+    
+    summary = Sale.get_sales_summary(start_date, end_date)
+    revenue, profit = summary['total_sales'], summary['total_profit']
+    return JsonResponse({
+        'start_date': start_date,
+        'end_date': end_date,
+        'revenue': revenue,
+        'profit': profit,
+        'units': summary['total_units'],
+        'transactions': summary['total_transactions'],
+        'margin': round(profit / revenue * 100, 2) if revenue else Decimal('0.00'),
+    })
+
+
+@login_required
+@require_GET
+def report_cache_stats(request):
+    """API endpoint returning the report result cache hit, miss and merge counts"""
+    stats = cache_stats()
+    lookups = sum(stats.values())
+    stats['hit_rate'] = round((stats['hits'] + stats['merges']) / lookups * 100, 1) if lookups else None
+    return JsonResponse(stats)
@@ -0,0 +1,12 @@
+"""
+Process entry point for run_report_worker.
+
+Spawned pool processes unpickle their initializer by importing the module
+that defines it, so this module must not import models: the app registry
+is only ready once ``setup_worker`` has run.
+"""
+import django
+
+
+def setup_worker():
+    django.setup()
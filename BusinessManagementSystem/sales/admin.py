@@ -1,10 +1,14 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Sale
+from BusinessManagementSystem.pagination import CachedCountPaginator
+from .models import Sale, Order, OrderLine, DailySalesCumulative, DailySalesRollup, ProductSalesStats
 
 
 @admin.register(Sale)
 class SaleAdmin(admin.ModelAdmin):
+    # Page counts come from the cache or the table estimate, not a COUNT(*) per page
+    paginator = CachedCountPaginator
+    show_full_result_count = False
     list_display = [
         'id', 'product', 'quantity_sold', 'total_cost', 
         'profit', 'profit_margin_display', 'date_sold', 'sold_by'
@@ -38,8 +42,8 @@ class SaleAdmin(admin.ModelAdmin):
             color = 'red'
         
         return format_html(
-            '<span style="color: {}; font-weight: bold;">{:.1f}%</span>',
-            color, margin
+            '<span style="color: {}; font-weight: bold;">{}%</span>',
+            color, f'{margin:.1f}'
         )
     profit_margin_display.short_description = 'Profit Margin'
     
@@ -47,3 +51,65 @@ class SaleAdmin(admin.ModelAdmin):
         if not change:  # If creating new sale
             obj.sold_by = request.user
         super().save_model(request, obj, form, change)
+
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'product', 'category', 'units', 'revenue', 'profit', 'transactions']
+    list_filter = ['date', 'category']
+    date_hierarchy = 'date'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailySalesCumulative)
+class DailySalesCumulativeAdmin(admin.ModelAdmin):
+    list_display = ['date', 'transactions', 'units', 'revenue', 'profit']
+    date_hierarchy = 'date'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProductSalesStats)
+class ProductSalesStatsAdmin(admin.ModelAdmin):
+    list_display = ['product', 'units', 'revenue', 'profit', 'transactions', 'last_sold_at']
+    ordering = ['-units']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    fields = ['product', 'quantity_sold', 'total_cost', 'profit']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ['id', 'customer_name', 'total_cost', 'profit', 'date_created', 'sold_by']
+    list_filter = ['date_created', 'sold_by']
+    search_fields = ['customer_name', 'notes']
+    readonly_fields = ['total_cost', 'profit', 'date_created', 'sold_by']
+    date_hierarchy = 'date_created'
+    inlines = [OrderLineInline]
+    
+    def has_add_permission(self, request):
+        # Orders are recorded through the basket view so stock stays consistent
+        return False
@@ -0,0 +1,148 @@
+"""
+Batch recording of sales, e.g. end-of-day POS uploads.
+
+A batch is validated as a whole, quantities are aggregated per product,
+stock is decremented with chunked conditional UPDATEs and the Sale rows
+are bulk-inserted with precomputed totals, all in one transaction. Any
+error rejects the whole batch and is reported against its input line.
+"""
+from collections import defaultdict
+from django.db import transaction
+from inventory.models import Product
+from .models import Sale, DailySalesCumulative, DailySalesRollup, ProductSalesStats
+from .signals import sales_batch_recorded
+
+
+class SalesBatchError(Exception):
+    """Raised when a batch is rejected; ``errors`` lists per-line problems"""
+    
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} invalid line(s) in sales batch")
+
+
+class _StockChanged(Exception):
+    """Stock was taken by a concurrent sale between validation and update"""
+
+
+def _parse_int(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, str):
+        value = value.strip()
+    return int(value)
+
+
+def clean_line(raw):
+    """Validate one input line; returns (cleaned dict, list of error messages)"""
+    if not isinstance(raw, dict):
+        return None, ["Each line must be an object"]
+    
+    errors = []
+    cleaned = {}
+    
+    try:
+        cleaned['product_id'] = _parse_int(raw.get('product'))
+    except (TypeError, ValueError):
+        errors.append("'product' must be a product id")
+    
+    try:
+        cleaned['quantity'] = _parse_int(raw.get('quantity'))
+        if cleaned['quantity'] < 1:
+            errors.append("'quantity' must be at least 1")
+    except (TypeError, ValueError):
+        errors.append("'quantity' must be a whole number")
+    
+    customer_name = (raw.get('customer_name') or '').strip()
+    if len(customer_name) > 200:
+        errors.append("'customer_name' must be at most 200 characters")
+    cleaned['customer_name'] = customer_name or None
+    cleaned['notes'] = (raw.get('notes') or '').strip() or None
+    
+    return cleaned, errors
+
+
+def validate_batch(lines):
+    """
+    Validate every line against the current catalogue and stock.
+    
+    Returns (cleaned lines, products by id, quantities per product, errors).
+    """
+    errors = []
+    cleaned_lines = []
+    for number, raw in enumerate(lines, start=1):
+        cleaned, line_errors = clean_line(raw)
+        if line_errors:
+            errors.append({'line': number, 'errors': line_errors})
+        else:
+            cleaned['line'] = number
+            cleaned_lines.append(cleaned)
+    
+    quantities = defaultdict(int)
+    for line in cleaned_lines:
+        quantities[line['product_id']] += line['quantity']
+    
+    products = Product.objects.in_bulk(list(quantities))
+    for line in cleaned_lines:
+        product = products.get(line['product_id'])
+        if product is None:
+            errors.append({'line': line['line'], 'errors': [f"Product {line['product_id']} does not exist"]})
+        elif not product.can_sell(quantities[product.pk]):
+            errors.append({'line': line['line'], 'errors': [
+                f"Insufficient stock for {product.name}. "
+                f"Available: {product.quantity}, Requested in batch: {quantities[product.pk]}"
+            ]})
+    
+    errors.sort(key=lambda error: error['line'])
+    return cleaned_lines, products, dict(quantities), errors
+
+
+def record_sales_batch(lines, sold_by=None, order=None, batch_size=500):
+    """
+    Record a batch of sales atomically and return the created Sale rows.
+    
+    Each line is a dict with ``product`` (id), ``quantity`` and optional
+    ``customer_name`` / ``notes``. Lines are attached to ``order`` if
+    given. Raises SalesBatchError if any line is
+    invalid or stock ran out; nothing is written in that case.
+    """
+    if not lines:
+        raise SalesBatchError([{'line': 0, 'errors': ["The batch is empty"]}])
+    
+    cleaned_lines, products, quantities, errors = validate_batch(lines)
+    if errors:
+        raise SalesBatchError(errors)
+    
+    sales = []
+    for line in cleaned_lines:
+        product = products[line['product_id']]
+        sales.append(Sale(
+            product=product,
+            quantity_sold=line['quantity'],
+            total_cost=product.selling_price * line['quantity'],
+            profit=(product.selling_price - product.buying_price) * line['quantity'],
+            sold_by=sold_by,
+            customer_name=line['customer_name'],
+            notes=line['notes'],
+            order=order,
+        ))
+    
+    try:
+        with transaction.atomic():
+            if not Product.reduce_stock_bulk(quantities, user=sold_by):
+                raise _StockChanged
+            
+            Sale.objects.bulk_create(sales, batch_size=batch_size)
+            DailySalesRollup.record_sales(sales)
+            DailySalesCumulative.record_sales(sales)
+            ProductSalesStats.record_sales(sales)
+            
+            transaction.on_commit(
+                lambda: sales_batch_recorded.send(sender=Sale, sales=sales))
+    except _StockChanged:
+        # Everything was rolled back; re-validate to say which lines fell short
+        raise SalesBatchError(validate_batch(lines)[3] or [
+            {'line': 0, 'errors': ["Stock changed while recording the batch; please retry"]}
+        ])
+    
+    return sales
@@ -0,0 +1,51 @@
+"""
+Query-string filters shared by the sales history page and the exports.
+
+``filter_sales`` applies the ``start_date`` / ``end_date`` (YYYY-MM-DD),
+``product`` and ``search`` parameters to a Sale queryset, so a CSV or PDF
+export contains exactly the rows the history page shows for the same URL.
+"""
+from datetime import datetime
+from .search import search_sales
+from .utils import date_range_filter
+
+
+FILTER_PARAMS = ('start_date', 'end_date', 'product', 'search')
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_product_id(value):
+    """A product id given as a plain number, or None for anything else"""
+    value = (value or '').strip()
+    # isdigit() also accepts digits int() refuses, such as superscripts
+    if value.isascii() and value.isdigit():
+        return int(value)
+    return None
+
+
+def filter_sales(queryset, params):
+    """Apply the history filters in ``params`` (e.g. request.GET); invalid values are ignored"""
+    start_date = _parse_date(params.get('start_date'))
+    if start_date:
+        queryset = queryset.filter(**date_range_filter(start_date=start_date))
+    
+    end_date = _parse_date(params.get('end_date'))
+    if end_date:
+        queryset = queryset.filter(**date_range_filter(end_date=end_date))
+    
+    product_id = parse_product_id(params.get('product'))
+    if product_id is not None:
+        queryset = queryset.filter(product_id=product_id)
+    
+    # Adds a search_rank annotation when the full-text index is used
+    search_query = params.get('search')
+    if search_query:
+        queryset = search_sales(queryset, search_query)
+    
+    return queryset
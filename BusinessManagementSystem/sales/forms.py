@@ -1,5 +1,6 @@
 from django import forms
-from .models import Sale
+from .models import Sale, Order
+from inventory.forms import ProductAutocompleteWidget
 from inventory.models import Product
 
 
@@ -8,7 +9,7 @@ class SaleForm(forms.ModelForm):
         model = Sale
         fields = ['product', 'quantity_sold', 'customer_name', 'notes']
         widgets = {
-            'product': forms.Select(attrs={
+            'product': ProductAutocompleteWidget(attrs={
                 'class': 'mt-1 block w-full border-gray-300 rounded-md shadow-sm focus:ring-blue-500 focus:border-blue-500'
             }),
             'quantity_sold': forms.NumberInput(attrs={
@@ -29,9 +30,8 @@ class SaleForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Only show products that are in stock
-        self.fields['product'].queryset = Product.objects.filter(quantity__gt=0).order_by('name')
-        self.fields['product'].empty_label = "Select a product"
+        # Only in-stock products are offered; the widget never lists them all
+        self.fields['product'].queryset = Product.objects.filter(quantity__gt=0)
     
     def clean(self):
         cleaned_data = super().clean()
@@ -45,4 +45,54 @@ class SaleForm(forms.ModelForm):
                     f"Available: {product.quantity}, Requested: {quantity_sold}"
                 )
         
-        return cleaned_data
\ No newline at end of file
+        return cleaned_data
+
+
+class OrderForm(forms.ModelForm):
+    class Meta:
+        model = Order
+        fields = ['customer_name', 'notes']
+        widgets = {
+            'customer_name': forms.TextInput(attrs={
+                'class': 'mt-1 block w-full border-gray-300 rounded-md shadow-sm focus:ring-blue-500 focus:border-blue-500',
+                'placeholder': 'Enter customer name (optional)'
+            }),
+            'notes': forms.Textarea(attrs={
+                'class': 'mt-1 block w-full border-gray-300 rounded-md shadow-sm focus:ring-blue-500 focus:border-blue-500',
+                'rows': 3,
+                'placeholder': 'Additional notes about this order (optional)'
+            }),
+        }
+
+
+class OrderLineForm(forms.Form):
+    """
+    One basket line. Products are validated for the whole basket at once
+    by Order.create_with_lines, so this form runs no per-line queries.
+    """
+    product = forms.TypedChoiceField(
+        coerce=int,
+        widget=forms.Select(attrs={
+            'class': 'mt-1 block w-full border-gray-300 rounded-md shadow-sm focus:ring-blue-500 focus:border-blue-500'
+        })
+    )
+    quantity = forms.IntegerField(
+        min_value=1,
+        widget=forms.NumberInput(attrs={
+            'class': 'mt-1 block w-full border-gray-300 rounded-md shadow-sm focus:ring-blue-500 focus:border-blue-500',
+            'min': '1',
+            'placeholder': '1'
+        })
+    )
+    
+    def __init__(self, *args, product_choices=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['product'].choices = [('', 'Select a product'), *product_choices]
+
+
+OrderLineFormSet = forms.formset_factory(
+    OrderLineForm,
+    extra=5,
+    min_num=1,
+    validate_min=True,
+)
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from sales.models import ProductSalesStats
+
+
+class Command(BaseCommand):
+    help = 'Compare per-product sales counters with the raw sales table'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute every counter from the raw sales table'
+        )
+    
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            count = ProductSalesStats.rebuild()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt sales counters for {count} products.'))
+            return
+        
+        fields = ['units', 'revenue', 'profit', 'transactions', 'last_sold_at']
+        stored = {
+            row['product_id']: row
+            for row in ProductSalesStats.objects.filter(transactions__gt=0).values('product_id', *fields)
+        }
+        
+        mismatches = 0
+        for expected in ProductSalesStats.compute_from_sales():
+            actual = stored.pop(expected.product_id, None)
+            if actual is None:
+                mismatches += 1
+                self.stdout.write(self.style.WARNING(f'Product {expected.product_id}: missing counters'))
+                continue
+            for field in fields:
+                if actual[field] != getattr(expected, field):
+                    mismatches += 1
+                    self.stdout.write(self.style.WARNING(
+                        f'Product {expected.product_id}: {field} is {actual[field]}, '
+                        f'expected {getattr(expected, field)}'
+                    ))
+        
+        for product_id in stored:
+            mismatches += 1
+            self.stdout.write(self.style.WARNING(f'Product {product_id}: counters without sales'))
+        
+        if mismatches:
+            # Exit non-zero so cron and CI notice the drift
+            raise CommandError(f'{mismatches} mismatches found; run with --rebuild to fix them.')
+        self.stdout.write(self.style.SUCCESS('Product sales counters are consistent.'))
@@ -0,0 +1,60 @@
+import csv
+import json
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from sales.batch import SalesBatchError, record_sales_batch, validate_batch
+
+
+class Command(BaseCommand):
+    help = ('Import a batch of sales (e.g. an end-of-day POS upload) from a JSON or CSV file '
+            'in a single transaction')
+    
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON list of sales or CSV with product,quantity,customer_name,notes columns')
+        parser.add_argument('--format', choices=['json', 'csv'], help='Input format (default: from file extension)')
+        parser.add_argument('--user', help='Username to record as the seller')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the batch without recording it')
+    
+    def read_lines(self, path, file_format):
+        file_format = file_format or ('csv' if path.lower().endswith('.csv') else 'json')
+        try:
+            with open(path, newline='', encoding='utf-8') as f:
+                if file_format == 'csv':
+                    return list(csv.DictReader(f))
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {path}: {e}')
+        
+        lines = data.get('sales') if isinstance(data, dict) else data
+        if not isinstance(lines, list):
+            raise CommandError("Expected a JSON list of sales or an object with a 'sales' list")
+        return lines
+    
+    def handle(self, *args, **options):
+        lines = self.read_lines(options['path'], options['format'])
+        
+        sold_by = None
+        if options['user']:
+            try:
+                sold_by = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User '{options['user']}' does not exist")
+        
+        try:
+            if options['dry_run']:
+                errors = validate_batch(lines)[3]
+                if errors:
+                    raise SalesBatchError(errors)
+                self.stdout.write(self.style.SUCCESS(f'{len(lines)} sales are valid.'))
+                return
+            sales = record_sales_batch(lines, sold_by=sold_by)
+        except SalesBatchError as e:
+            for error in e.errors:
+                self.stderr.write(f"Line {error['line']}: {'; '.join(error['errors'])}")
+            raise CommandError(f'{e}; nothing was imported.')
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {len(sales)} sales: '
+            f'${sum(sale.total_cost for sale in sales):.2f} revenue, '
+            f'${sum(sale.profit for sale in sales):.2f} profit.'
+        ))
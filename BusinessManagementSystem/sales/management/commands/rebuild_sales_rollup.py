@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from sales.models import DailySalesCumulative, DailySalesRollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily sales rollup and running daily totals from the raw sales history'
+    
+    def handle(self, *args, **options):
+        count = DailySalesRollup.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} daily rollup rows.'))
+        count = DailySalesCumulative.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} running daily total rows.'))
@@ -0,0 +1,97 @@
+import threading
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from inventory.models import Product
+from sales.models import Sale
+
+
+def legacy_checkout(product_id, quantity):
+    """The previous checkout path: Python-side stock check and a full-row save"""
+    product = Product.objects.get(pk=product_id)
+    with transaction.atomic():
+        if not product.can_sell(quantity):
+            raise ValueError("Insufficient stock")
+        product.quantity -= quantity
+        # Write back the value computed from the read, as a full-row save used to
+        Product.objects.filter(pk=product.pk).update(quantity=product.quantity)
+        sale = Sale(product=product, quantity_sold=quantity)
+        sale.total_cost = product.selling_price * quantity
+        sale.profit = (product.selling_price - product.buying_price) * quantity
+        super(Sale, sale).save()
+        sale.update_aggregates()
+
+
+def conditional_checkout(product_id, quantity):
+    """The current checkout path: Sale.save with a conditional stock UPDATE"""
+    Sale(product=Product.objects.get(pk=product_id), quantity_sold=quantity).save()
+
+
+class Command(BaseCommand):
+    help = ('Hammer a scratch product with concurrent sales through the legacy and the '
+            'conditional-update checkout paths and compare oversell and sales/sec')
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--attempts', type=int, default=50, help='Sales attempted per thread')
+        parser.add_argument('--stock', type=int, default=200, help='Initial stock of the scratch product')
+    
+    def handle(self, *args, **options):
+        for name, checkout in [('legacy', legacy_checkout), ('conditional', conditional_checkout)]:
+            self.run_path(name, checkout, options['threads'], options['attempts'], options['stock'])
+    
+    def run_path(self, name, checkout, threads, attempts, stock):
+        product = Product.objects.create(
+            name=f'Stress test item ({name})',
+            category='other',
+            buying_price=Decimal('1.00'),
+            selling_price=Decimal('2.00'),
+            quantity=stock,
+            supplier='stress_checkout',
+        )
+        results = {'sold': 0, 'rejected': 0, 'errors': 0}
+        lock = threading.Lock()
+        barrier = threading.Barrier(threads)
+        
+        def worker():
+            barrier.wait()
+            try:
+                for _ in range(attempts):
+                    try:
+                        checkout(product.pk, 1)
+                        outcome = 'sold'
+                    except ValueError:
+                        outcome = 'rejected'
+                    except Exception:
+                        outcome = 'errors'
+                    with lock:
+                        results[outcome] += 1
+            finally:
+                connections.close_all()
+        
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        started = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        
+        product.refresh_from_db()
+        recorded = Sale.objects.filter(product=product).count()
+        # Sales recorded beyond what actually left the shelf were lost updates
+        oversold = recorded - (stock - product.quantity)
+        
+        self.stdout.write(
+            f'{name:>11}: {recorded} sales recorded, {results["rejected"]} rejected, '
+            f'{results["errors"]} errors, final stock {product.quantity}, '
+            f'oversold {max(oversold, 0)} units, {recorded / elapsed:.0f} sales/sec'
+        )
+        
+        # The threads commit on their own connections, so the run cannot be
+        # rolled back. Deleting the sales sends pre_delete for each one, which
+        # takes it back out of the rollup, running totals and product stats
+        with transaction.atomic():
+            Sale.objects.filter(product=product).delete()
+            product.delete()
@@ -0,0 +1,61 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:12
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_rollup(apps, schema_editor):
+    Sale = apps.get_model('sales', 'Sale')
+    DailySalesRollup = apps.get_model('sales', 'DailySalesRollup')
+    rows = (Sale.objects
+            .annotate(day=TruncDate('date_sold'))
+            .values('day', 'product_id', 'product__category')
+            .annotate(total_revenue=Sum('total_cost'), total_profit=Sum('profit'),
+                      total_units=Sum('quantity_sold'), total_transactions=Count('id'))
+            .order_by())
+    DailySalesRollup.objects.bulk_create(
+        [DailySalesRollup(date=row['day'], product_id=row['product_id'],
+                          category=row['product__category'], revenue=row['total_revenue'],
+                          profit=row['total_profit'], units=row['total_units'],
+                          transactions=row['total_transactions'])
+         for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+        ('sales', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Local calendar day of the sales')),
+                ('category', models.CharField(choices=[('electronics', 'Electronics'), ('clothing', 'Clothing'), ('food', 'Food & Beverages'), ('books', 'Books'), ('home', 'Home & Garden'), ('sports', 'Sports & Outdoors'), ('toys', 'Toys & Games'), ('beauty', 'Beauty & Personal Care'), ('automotive', 'Automotive'), ('other', 'Other')], help_text='Product category at the time of sale', max_length=50)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('profit', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('units', models.IntegerField(default=0)),
+                ('transactions', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(help_text='Product sold', on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Daily Sales Rollup',
+                'verbose_name_plural': 'Daily Sales Rollups',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'category'], name='sales_daily_date_c7e38f_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'product'), name='unique_daily_rollup_per_product'),
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
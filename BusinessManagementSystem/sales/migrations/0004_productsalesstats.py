@@ -0,0 +1,54 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:17
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Max, Sum
+
+
+def populate_stats(apps, schema_editor):
+    Sale = apps.get_model('sales', 'Sale')
+    ProductSalesStats = apps.get_model('sales', 'ProductSalesStats')
+    rows = (Sale.objects
+            .values('product_id')
+            .annotate(total_units=Sum('quantity_sold'), total_revenue=Sum('total_cost'),
+                      total_profit=Sum('profit'), total_transactions=Count('id'),
+                      last_sale=Max('date_sold'))
+            .order_by())
+    ProductSalesStats.objects.bulk_create(
+        [ProductSalesStats(product_id=row['product_id'], units=row['total_units'],
+                           revenue=row['total_revenue'], profit=row['total_profit'],
+                           transactions=row['total_transactions'],
+                           last_sold_at=row['last_sale'])
+         for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+        ('sales', '0003_sale_date_sold_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSalesStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('profit', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('transactions', models.IntegerField(default=0)),
+                ('last_sold_at', models.DateTimeField(blank=True, null=True)),
+                ('product', models.OneToOneField(help_text='Product these counters belong to', on_delete=django.db.models.deletion.CASCADE, related_name='sales_stats', to='inventory.product')),
+            ],
+            options={
+                'verbose_name': 'Product Sales Stats',
+                'verbose_name_plural': 'Product Sales Stats',
+                'indexes': [models.Index(fields=['-units'], name='product_stats_units_idx'), models.Index(fields=['-profit'], name='product_stats_profit_idx')],
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
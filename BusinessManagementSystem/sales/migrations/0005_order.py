@@ -0,0 +1,52 @@
+# Generated by Django 5.0.14 on 2026-10-18 08:21
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0004_productsalesstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+            ],
+            options={
+                'verbose_name': 'Order Line',
+                'verbose_name_plural': 'Order Lines',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('sales.sale',),
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_name', models.CharField(blank=True, help_text='Optional customer name', max_length=200, null=True)),
+                ('notes', models.TextField(blank=True, help_text='Optional order notes', null=True)),
+                ('total_cost', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Total selling price of all lines (auto-calculated)', max_digits=12)),
+                ('profit', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Total profit of all lines (auto-calculated)', max_digits=12)),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('sold_by', models.ForeignKey(blank=True, help_text='User who made this order', null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Order',
+                'verbose_name_plural': 'Orders',
+                'ordering': ['-date_created'],
+            },
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='order',
+            field=models.ForeignKey(blank=True, help_text='Order this sale is a line of, if any', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='sales.order'),
+        ),
+    ]
@@ -0,0 +1,89 @@
+# Full-text search index over sales, kept in sync by triggers
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+
+CREATE_STATEMENTS = [
+    # rowid is the Sale id; prefix indexes make "term*" queries cheap
+    """
+    CREATE VIRTUAL TABLE sales_sale_fts USING fts5(
+        product_name, customer_name, notes,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER sales_sale_fts_insert AFTER INSERT ON sales_sale BEGIN
+        INSERT INTO sales_sale_fts (rowid, product_name, customer_name, notes)
+        SELECT new.id, p.name, coalesce(new.customer_name, ''), coalesce(new.notes, '')
+        FROM inventory_product p WHERE p.id = new.product_id;
+    END
+    """,
+    """
+    CREATE TRIGGER sales_sale_fts_update AFTER UPDATE OF product_id, customer_name, notes ON sales_sale BEGIN
+        DELETE FROM sales_sale_fts WHERE rowid = old.id;
+        INSERT INTO sales_sale_fts (rowid, product_name, customer_name, notes)
+        SELECT new.id, p.name, coalesce(new.customer_name, ''), coalesce(new.notes, '')
+        FROM inventory_product p WHERE p.id = new.product_id;
+    END
+    """,
+    """
+    CREATE TRIGGER sales_sale_fts_delete AFTER DELETE ON sales_sale BEGIN
+        DELETE FROM sales_sale_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER sales_sale_fts_product_rename AFTER UPDATE OF name ON inventory_product
+    WHEN new.name IS NOT old.name BEGIN
+        UPDATE sales_sale_fts SET product_name = new.name
+        WHERE rowid IN (SELECT id FROM sales_sale WHERE product_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO sales_sale_fts (rowid, product_name, customer_name, notes)
+    SELECT s.id, p.name, coalesce(s.customer_name, ''), coalesce(s.notes, '')
+    FROM sales_sale s JOIN inventory_product p ON p.id = s.product_id
+    """,
+]
+
+DROP_STATEMENTS = [
+    'DROP TRIGGER IF EXISTS sales_sale_fts_insert',
+    'DROP TRIGGER IF EXISTS sales_sale_fts_update',
+    'DROP TRIGGER IF EXISTS sales_sale_fts_delete',
+    'DROP TRIGGER IF EXISTS sales_sale_fts_product_rename',
+    'DROP TABLE IF EXISTS sales_sale_fts',
+]
+
+
+def create_search_index(apps, schema_editor):
+    # Other databases, and SQLite builds without FTS5, keep the icontains search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(CREATE_STATEMENTS[0])
+        except OperationalError:
+            return
+        for statement in CREATE_STATEMENTS[1:]:
+            cursor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in DROP_STATEMENTS:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('inventory', '0002_product_date_added_idx'),
+        ('sales', '0005_order'),
+    ]
+    
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.0.14 on 2026-10-18 09:33
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate_cumulative(apps, schema_editor):
+    Sale = apps.get_model('sales', 'Sale')
+    DailySalesCumulative = apps.get_model('sales', 'DailySalesCumulative')
+    days = (Sale.objects
+            .annotate(day=TruncDate('date_sold'))
+            .values('day')
+            .annotate(total_revenue=Sum('total_cost'), total_profit=Sum('profit'),
+                      total_units=Sum('quantity_sold'), total_transactions=Count('id'))
+            .order_by('day'))
+    rows = []
+    revenue, profit, units, transactions = Decimal('0.00'), Decimal('0.00'), 0, 0
+    for row in days:
+        revenue += row['total_revenue']
+        profit += row['total_profit']
+        units += row['total_units']
+        transactions += row['total_transactions']
+        rows.append(DailySalesCumulative(date=row['day'], revenue=revenue, profit=profit,
+                                         units=units, transactions=transactions))
+    DailySalesCumulative.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0006_sale_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesCumulative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='Local calendar day', unique=True)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16)),
+                ('profit', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=16)),
+                ('units', models.BigIntegerField(default=0)),
+                ('transactions', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Cumulative Daily Sales',
+                'verbose_name_plural': 'Cumulative Daily Sales',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.RunPython(populate_cumulative, migrations.RunPython.noop),
+    ]
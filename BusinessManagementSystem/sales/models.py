@@ -2,10 +2,91 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator
 from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
 from inventory.models import Product
+from .utils import date_range_filter
+from datetime import datetime, timedelta
 from decimal import Decimal
 
 
+class Order(models.Model):
+    """
+    A customer basket grouping several sale lines into one transaction.
+    
+    Each line is a regular Sale row pointing back at its order, so sales
+    lists and reports keep working on line-level data.
+    """
+    customer_name = models.CharField(
+        max_length=200, 
+        blank=True, 
+        null=True,
+        help_text="Optional customer name"
+    )
+    notes = models.TextField(
+        blank=True, 
+        null=True,
+        help_text="Optional order notes"
+    )
+    total_cost = models.DecimalField(
+        max_digits=12, 
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Total selling price of all lines (auto-calculated)"
+    )
+    profit = models.DecimalField(
+        max_digits=12, 
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Total profit of all lines (auto-calculated)"
+    )
+    date_created = models.DateTimeField(auto_now_add=True)
+    sold_by = models.ForeignKey(
+        User, 
+        on_delete=models.SET_NULL, 
+        null=True, 
+        blank=True,
+        help_text="User who made this order"
+    )
+    
+    class Meta:
+        ordering = ['-date_created']
+        verbose_name = "Order"
+        verbose_name_plural = "Orders"
+    
+    def __str__(self):
+        return f"Order #{self.id}"
+    
+    @classmethod
+    def create_with_lines(cls, lines, sold_by=None, customer_name=None, notes=None):
+        """
+        Record a whole basket in one transaction and return the order.
+        
+        ``lines`` is a list of ``{'product': id, 'quantity': n}`` dicts.
+        Stock checks, stock decrements and line inserts are batched, so the
+        query count does not grow with the number of lines. Raises
+        sales.batch.SalesBatchError with per-line errors if the basket is
+        rejected; nothing is written in that case.
+        """
+        from .batch import record_sales_batch
+        
+        lines = [dict(line, customer_name=customer_name) for line in lines]
+        with transaction.atomic():
+            order = cls.objects.create(customer_name=customer_name, notes=notes, sold_by=sold_by)
+            sales = record_sales_batch(lines, sold_by=sold_by, order=order)
+            order.total_cost = sum(sale.total_cost for sale in sales)
+            order.profit = sum(sale.profit for sale in sales)
+            cls.objects.filter(pk=order.pk).update(total_cost=order.total_cost, profit=order.profit)
+        return order
+    
+    @property
+    def profit_margin(self):
+        """Calculate profit margin percentage for this order"""
+        if self.total_cost > 0:
+            return (self.profit / self.total_cost) * 100
+        return 0
+
+
 class Sale(models.Model):
     """
     Sale model to track all sales transactions with automatic profit calculation.
@@ -48,11 +129,23 @@ class Sale(models.Model):
         null=True,
         help_text="Optional sale notes"
     )
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='lines',
+        help_text="Order this sale is a line of, if any"
+    )
     
     class Meta:
         ordering = ['-date_sold']
         verbose_name = "Sale"
         verbose_name_plural = "Sales"
+        indexes = [
+            models.Index(fields=['date_sold'], name='sale_date_sold_idx'),
+            models.Index(fields=['product', 'date_sold'], name='sale_product_date_sold_idx'),
+        ]
     
     def __str__(self):
         return f"Sale #{self.id} - {self.product.name} x{self.quantity_sold}"
@@ -67,14 +160,26 @@ class Sale(models.Model):
         with transaction.atomic():
             # Check if this is a new sale (not an update)
             if not self.pk:
-                # Verify stock availability
-                if not self.product.can_sell(self.quantity_sold):
+                # Reduce stock with a conditional UPDATE; fails if stock ran out
+                if not self.product.reduce_stock(self.quantity_sold, user=self.sold_by):
                     raise ValueError(f"Insufficient stock. Available: {self.product.quantity}, Requested: {self.quantity_sold}")
-                
-                # Reduce stock
-                self.product.reduce_stock(self.quantity_sold)
+            else:
+                # Take the previous version of this sale out of the aggregates
+                previous = Sale.objects.select_related('product').get(pk=self.pk)
+                previous.update_aggregates(sign=-1)
             
             super().save(*args, **kwargs)
+            self.update_aggregates()
+    
+    def update_aggregates(self, sign=1):
+        """
+        Add (sign=1) or remove (sign=-1) this sale from the daily rollup,
+        running totals and product stats. Deleted sales are removed by the
+        pre_delete receiver in sales.signals.
+        """
+        DailySalesRollup.record_sale(self, sign)
+        DailySalesCumulative.record_sale(self, sign)
+        ProductSalesStats.record_sale(self, sign)
     
     @property
     def profit_margin(self):
@@ -85,37 +190,485 @@ class Sale(models.Model):
     
     @classmethod
     def get_sales_summary(cls, start_date=None, end_date=None):
-        """Get sales summary for a date range"""
-        queryset = cls.objects.all()
+        """
+        Get sales summary for a date range (dates are whole local days).
         
-        if start_date:
-            queryset = queryset.filter(date_sold__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(date_sold__lte=end_date)
+        Whole-day ranges are answered from the running daily totals in two
+        lookups, whatever their length; datetime bounds fall back to
+        aggregating the matching sales.
+        """
+        if isinstance(start_date, datetime) or isinstance(end_date, datetime):
+            from django.db.models import Sum, Count
+            queryset = cls.objects.filter(**date_range_filter(start_date, end_date))
+            totals = queryset.aggregate(
+                revenue=Sum('total_cost'),
+                profit=Sum('profit'),
+                units=Sum('quantity_sold'),
+                transactions=Count('id'),
+            )
+            totals = {name: value if value is not None else DailySalesCumulative.EMPTY[name]
+                      for name, value in totals.items()}
+        else:
+            totals = DailySalesCumulative.range_totals(start_date, end_date)
         
-        from django.db.models import Sum, Count
-        summary = queryset.aggregate(
-            total_sales=Sum('total_cost') or 0,
-            total_profit=Sum('profit') or 0,
-            total_transactions=Count('id')
-        )
-        
-        return summary
+        return {
+            'total_sales': totals['revenue'],
+            'total_profit': totals['profit'],
+            'total_units': totals['units'],
+            'total_transactions': totals['transactions'],
+        }
     
     @classmethod
     def get_top_selling_products(cls, limit=10):
         """Get top selling products by quantity"""
-        from django.db.models import Sum
-        return (cls.objects
-                .values('product__name', 'product__id')
-                .annotate(total_quantity=Sum('quantity_sold'))
-                .order_by('-total_quantity')[:limit])
+        return (ProductSalesStats.objects
+                .filter(transactions__gt=0)
+                .order_by('-units')
+                .values('product__name', 'product__id', total_quantity=F('units'))[:limit])
     
     @classmethod
     def get_most_profitable_products(cls, limit=10):
         """Get most profitable products"""
-        from django.db.models import Sum
-        return (cls.objects
-                .values('product__name', 'product__id')
-                .annotate(total_profit=Sum('profit'))
-                .order_by('-total_profit')[:limit])
+        return (ProductSalesStats.objects
+                .filter(transactions__gt=0)
+                .order_by('-profit')
+                .values('product__name', 'product__id', total_profit=F('profit'))[:limit])
+
+
+
+class OrderLine(Sale):
+    """A Sale viewed as one line of an Order"""
+    
+    class Meta:
+        proxy = True
+        verbose_name = "Order Line"
+        verbose_name_plural = "Order Lines"
+
+
+def _sum_sales(sales, key):
+    """Group sales by key(sale) and total their revenue, profit, units and count"""
+    totals = {}
+    for sale in sales:
+        entry = totals.setdefault(key(sale), {
+            'product': sale.product,
+            'revenue': Decimal('0.00'),
+            'profit': Decimal('0.00'),
+            'units': 0,
+            'transactions': 0,
+            'last_sold_at': sale.date_sold,
+        })
+        entry['revenue'] += sale.total_cost
+        entry['profit'] += sale.profit
+        entry['units'] += sale.quantity_sold
+        entry['transactions'] += 1
+        entry['last_sold_at'] = max(entry['last_sold_at'], sale.date_sold)
+    return totals
+
+
+class DailySalesRollup(models.Model):
+    """
+    Pre-aggregated sales totals with one row per day and product.
+    
+    Maintained by Sale.save and the Sale delete signals inside the sale's
+    transaction, so the dashboard can read a handful of rollup rows
+    instead of scanning the raw sales table. Rebuild it with ``manage.py rebuild_sales_rollup``.
+    """
+    date = models.DateField(help_text="Local calendar day of the sales")
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='daily_rollups',
+        help_text="Product sold"
+    )
+    category = models.CharField(
+        max_length=50,
+        choices=Product.CATEGORY_CHOICES,
+        help_text="Product category at the time of sale"
+    )
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    profit = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    units = models.IntegerField(default=0)
+    transactions = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-date']
+        verbose_name = "Daily Sales Rollup"
+        verbose_name_plural = "Daily Sales Rollups"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'product'], name='unique_daily_rollup_per_product'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'category']),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} - {self.product_id}: {self.units} units"
+    
+    @classmethod
+    def record(cls, day, product, revenue, profit, units, transactions=1):
+        """Add the given totals to the rollup row for a day and product"""
+        updated = cls.objects.filter(date=day, product=product).update(
+            revenue=F('revenue') + revenue,
+            profit=F('profit') + profit,
+            units=F('units') + units,
+            transactions=F('transactions') + transactions,
+        )
+        if not updated:
+            cls.objects.create(
+                date=day,
+                product=product,
+                category=product.category,
+                revenue=revenue,
+                profit=profit,
+                units=units,
+                transactions=transactions,
+            )
+    
+    @classmethod
+    def record_sale(cls, sale, sign=1):
+        """Add (sign=1) or remove (sign=-1) a single sale from the rollup"""
+        cls.record(
+            timezone.localdate(sale.date_sold),
+            sale.product,
+            revenue=sale.total_cost * sign,
+            profit=sale.profit * sign,
+            units=sale.quantity_sold * sign,
+            transactions=sign,
+        )
+    
+    @classmethod
+    def record_sales(cls, sales):
+        """Add many new sales with one read, one bulk update and one bulk insert"""
+        totals = _sum_sales(sales, key=lambda sale: (timezone.localdate(sale.date_sold), sale.product_id))
+        if not totals:
+            return
+        
+        existing = {
+            (row.date, row.product_id): row
+            for row in cls.objects.filter(
+                date__in={day for day, _ in totals},
+                product_id__in={product_id for _, product_id in totals})
+        }
+        to_update = []
+        to_create = []
+        for (day, product_id), entry in totals.items():
+            row = existing.get((day, product_id))
+            if row is None:
+                to_create.append(cls(
+                    date=day,
+                    product_id=product_id,
+                    category=entry['product'].category,
+                    revenue=entry['revenue'],
+                    profit=entry['profit'],
+                    units=entry['units'],
+                    transactions=entry['transactions'],
+                ))
+                continue
+            row.revenue = F('revenue') + entry['revenue']
+            row.profit = F('profit') + entry['profit']
+            row.units = F('units') + entry['units']
+            row.transactions = F('transactions') + entry['transactions']
+            to_update.append(row)
+        
+        cls.objects.bulk_update(to_update, ['revenue', 'profit', 'units', 'transactions'], batch_size=500)
+        cls.objects.bulk_create(to_create, batch_size=500)
+    
+    @classmethod
+    def rebuild(cls):
+        """Recompute every rollup row from the raw sales table"""
+        from django.db.models import Sum, Count
+        from django.db.models.functions import TruncDate
+        
+        rows = (Sale.objects
+                .annotate(day=TruncDate('date_sold'))
+                .values('day', 'product_id', 'product__category')
+                .annotate(
+                    total_revenue=Sum('total_cost'),
+                    total_profit=Sum('profit'),
+                    total_units=Sum('quantity_sold'),
+                    total_transactions=Count('id'))
+                .order_by())
+        
+        with transaction.atomic():
+            cls.objects.all().delete()
+            created = cls.objects.bulk_create(
+                (cls(date=row['day'],
+                     product_id=row['product_id'],
+                     category=row['product__category'],
+                     revenue=row['total_revenue'],
+                     profit=row['total_profit'],
+                     units=row['total_units'],
+                     transactions=row['total_transactions'])
+                 for row in rows.iterator()),
+                batch_size=1000,
+            )
+        return len(created)
+
+
+
+class DailySalesCumulative(models.Model):
+    """
+    Running sales totals with one row per local day that had sales.
+    
+    Each row holds the totals of every sale up to and including its day,
+    so the totals of any range of days are the row at its end minus the
+    row just before its start: two indexed lookups and a subtraction,
+    however long the range. Sale.save and the Sale delete signals keep it
+    current; appending to today touches a single row, while a backdated
+    change also shifts the rows of the days after it.
+    """
+    date = models.DateField(unique=True, help_text="Local calendar day")
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'))
+    profit = models.DecimalField(max_digits=16, decimal_places=2, default=Decimal('0.00'))
+    units = models.BigIntegerField(default=0)
+    transactions = models.BigIntegerField(default=0)
+    
+    TOTALS = ('revenue', 'profit', 'units', 'transactions')
+    EMPTY = {'revenue': Decimal('0.00'), 'profit': Decimal('0.00'), 'units': 0, 'transactions': 0}
+    
+    class Meta:
+        ordering = ['-date']
+        verbose_name = "Cumulative Daily Sales"
+        verbose_name_plural = "Cumulative Daily Sales"
+    
+    def __str__(self):
+        return f"Through {self.date}: {self.transactions} sales"
+    
+    @classmethod
+    def record(cls, day, revenue, profit, units, transactions=1):
+        """Add the given totals to the running totals of ``day`` and every later day"""
+        if not cls.objects.filter(date=day).exists():
+            # Start the day from the running totals of the last day before it
+            previous = cls.totals_through(day - timedelta(days=1))
+            cls.objects.create(date=day, **previous)
+        cls.objects.filter(date__gte=day).update(
+            revenue=F('revenue') + revenue,
+            profit=F('profit') + profit,
+            units=F('units') + units,
+            transactions=F('transactions') + transactions,
+        )
+    
+    @classmethod
+    def record_sale(cls, sale, sign=1):
+        """Add (sign=1) or remove (sign=-1) a single sale from the running totals"""
+        cls.record(
+            timezone.localdate(sale.date_sold),
+            revenue=sale.total_cost * sign,
+            profit=sale.profit * sign,
+            units=sale.quantity_sold * sign,
+            transactions=sign,
+        )
+    
+    @classmethod
+    def record_sales(cls, sales):
+        """Add many new sales with one running-totals update per day they fall on"""
+        totals = _sum_sales(sales, key=lambda sale: timezone.localdate(sale.date_sold))
+        for day, entry in sorted(totals.items()):
+            cls.record(day, entry['revenue'], entry['profit'], entry['units'], entry['transactions'])
+    
+    @classmethod
+    def totals_through(cls, day=None):
+        """Running totals at the end of ``day`` (default: the latest day), zeros before the first sale"""
+        queryset = cls.objects.order_by('-date')
+        if day is not None:
+            queryset = queryset.filter(date__lte=day)
+        totals = queryset.values(*cls.TOTALS).first()
+        return totals or dict(cls.EMPTY)
+    
+    @classmethod
+    def range_totals(cls, start_date=None, end_date=None):
+        """Totals of the local days start_date..end_date inclusive; None leaves that side open"""
+        end = cls.totals_through(end_date)
+        if start_date is None:
+            return end
+        before = cls.totals_through(start_date - timedelta(days=1))
+        return {name: end[name] - before[name] for name in cls.TOTALS}
+    
+    @classmethod
+    def rebuild(cls):
+        """Recompute every running total from the raw sales table"""
+        from django.db.models import Sum, Count
+        from django.db.models.functions import TruncDate
+        
+        days = (Sale.objects
+                .annotate(day=TruncDate('date_sold'))
+                .values('day')
+                .annotate(
+                    total_revenue=Sum('total_cost'),
+                    total_profit=Sum('profit'),
+                    total_units=Sum('quantity_sold'),
+                    total_transactions=Count('id'))
+                .order_by('day'))
+        
+        rows = []
+        running = dict(cls.EMPTY)
+        for row in days:
+            running = {
+                'revenue': running['revenue'] + row['total_revenue'],
+                'profit': running['profit'] + row['total_profit'],
+                'units': running['units'] + row['total_units'],
+                'transactions': running['transactions'] + row['total_transactions'],
+            }
+            rows.append(cls(date=row['day'], **running))
+        
+        with transaction.atomic():
+            cls.objects.all().delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+
+class ProductSalesStats(models.Model):
+    """
+    Lifetime sales counters with one row per product.
+    
+    Updated with F() expressions inside the Sale.save transaction so the
+    leaderboards are an indexed ORDER BY ... LIMIT over one row per
+    product. Check or rebuild it with ``manage.py check_product_stats``.
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='sales_stats',
+        help_text="Product these counters belong to"
+    )
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    profit = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    transactions = models.IntegerField(default=0)
+    last_sold_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Product Sales Stats"
+        verbose_name_plural = "Product Sales Stats"
+        indexes = [
+            models.Index(fields=['-units'], name='product_stats_units_idx'),
+            models.Index(fields=['-profit'], name='product_stats_profit_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id}: {self.units} units"
+    
+    @classmethod
+    def record(cls, product, revenue, profit, units, transactions=1, sold_at=None):
+        """Add the given totals to a product's counters"""
+        from django.db.models import Value
+        from django.db.models.functions import Coalesce, Greatest
+        
+        changes = {
+            'revenue': F('revenue') + revenue,
+            'profit': F('profit') + profit,
+            'units': F('units') + units,
+            'transactions': F('transactions') + transactions,
+        }
+        if sold_at:
+            changes['last_sold_at'] = Greatest(Coalesce('last_sold_at', Value(sold_at)), Value(sold_at))
+        
+        updated = cls.objects.filter(product=product).update(**changes)
+        if not updated:
+            cls.objects.create(
+                product=product,
+                revenue=revenue,
+                profit=profit,
+                units=units,
+                transactions=transactions,
+                last_sold_at=sold_at,
+            )
+    
+    @classmethod
+    def record_sale(cls, sale, sign=1):
+        """
+        Add (sign=1) or remove (sign=-1) a single sale from the counters.
+        A removal leaves last_sold_at to refresh_last_sold_at, which runs
+        once the sale is gone.
+        """
+        cls.record(
+            sale.product,
+            revenue=sale.total_cost * sign,
+            profit=sale.profit * sign,
+            units=sale.quantity_sold * sign,
+            transactions=sign,
+            sold_at=sale.date_sold if sign > 0 else None,
+        )
+    
+    @classmethod
+    def refresh_last_sold_at(cls, product_id, deleted_at):
+        """
+        Re-read a product's last_sold_at from its remaining sales after a
+        sale sold at ``deleted_at`` was deleted. Unlike the counters it
+        cannot be reversed arithmetically; an older sale leaves it as is.
+        """
+        from django.db.models import OuterRef, Subquery
+        
+        latest = (Sale.objects
+                  .filter(product_id=OuterRef('product_id'))
+                  .order_by('-date_sold')
+                  .values('date_sold')[:1])
+        cls.objects.filter(product_id=product_id, last_sold_at__lte=deleted_at).update(
+            last_sold_at=Subquery(latest))
+    
+    @classmethod
+    def record_sales(cls, sales):
+        """Add many new sales with one read, one bulk update and one bulk insert"""
+        from django.db.models import Value
+        from django.db.models.functions import Coalesce, Greatest
+        
+        totals = _sum_sales(sales, key=lambda sale: sale.product_id)
+        if not totals:
+            return
+        
+        existing = cls.objects.in_bulk(list(totals), field_name='product_id')
+        to_update = []
+        to_create = []
+        for product_id, entry in totals.items():
+            row = existing.get(product_id)
+            if row is None:
+                to_create.append(cls(
+                    product_id=product_id,
+                    revenue=entry['revenue'],
+                    profit=entry['profit'],
+                    units=entry['units'],
+                    transactions=entry['transactions'],
+                    last_sold_at=entry['last_sold_at'],
+                ))
+                continue
+            sold_at = Value(entry['last_sold_at'])
+            row.revenue = F('revenue') + entry['revenue']
+            row.profit = F('profit') + entry['profit']
+            row.units = F('units') + entry['units']
+            row.transactions = F('transactions') + entry['transactions']
+            row.last_sold_at = Greatest(Coalesce('last_sold_at', sold_at), sold_at)
+            to_update.append(row)
+        
+        cls.objects.bulk_update(
+            to_update, ['revenue', 'profit', 'units', 'transactions', 'last_sold_at'], batch_size=500)
+        cls.objects.bulk_create(to_create, batch_size=500)
+    
+    @classmethod
+    def compute_from_sales(cls):
+        """Yield unsaved counters recomputed from the raw sales table"""
+        from django.db.models import Sum, Count, Max
+        
+        rows = (Sale.objects
+                .values('product_id')
+                .annotate(
+                    total_units=Sum('quantity_sold'),
+                    total_revenue=Sum('total_cost'),
+                    total_profit=Sum('profit'),
+                    total_transactions=Count('id'),
+                    last_sale=Max('date_sold'))
+                .order_by())
+        for row in rows.iterator():
+            yield cls(product_id=row['product_id'],
+                      units=row['total_units'],
+                      revenue=row['total_revenue'],
+                      profit=row['total_profit'],
+                      transactions=row['total_transactions'],
+                      last_sold_at=row['last_sale'])
+    
+    @classmethod
+    def rebuild(cls):
+        """Recompute every product's counters from the raw sales table"""
+        with transaction.atomic():
+            cls.objects.all().delete()
+            created = cls.objects.bulk_create(cls.compute_from_sales(), batch_size=1000)
+        return len(created)
@@ -0,0 +1,92 @@
+"""
+Full-text search over sales.
+
+On SQLite with FTS5, the ``sales_sale_fts`` table (created by migration
+0006 and kept in sync by triggers) indexes each sale's product name,
+customer name and notes. Every search word is matched as a prefix and
+results are ranked by bm25. Databases without the table fall back to
+``icontains`` filters.
+
+The triggers are restored after every migrate by
+``restore_search_index``, in case a migration remade sales_sale or
+inventory_product and dropped them.
+"""
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from BusinessManagementSystem.search import fts_table_exists, prefix_match_expression, restore_triggers
+
+
+FTS_TABLE = 'sales_sale_fts'
+
+# The triggers of migration 0006
+TRIGGERS = {
+    'sales_sale_fts_insert': f"""
+        CREATE TRIGGER sales_sale_fts_insert AFTER INSERT ON sales_sale BEGIN
+            INSERT INTO {FTS_TABLE} (rowid, product_name, customer_name, notes)
+            SELECT new.id, p.name, coalesce(new.customer_name, ''), coalesce(new.notes, '')
+            FROM inventory_product p WHERE p.id = new.product_id;
+        END
+    """,
+    'sales_sale_fts_update': f"""
+        CREATE TRIGGER sales_sale_fts_update AFTER UPDATE OF product_id, customer_name, notes ON sales_sale BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+            INSERT INTO {FTS_TABLE} (rowid, product_name, customer_name, notes)
+            SELECT new.id, p.name, coalesce(new.customer_name, ''), coalesce(new.notes, '')
+            FROM inventory_product p WHERE p.id = new.product_id;
+        END
+    """,
+    'sales_sale_fts_delete': f"""
+        CREATE TRIGGER sales_sale_fts_delete AFTER DELETE ON sales_sale BEGIN
+            DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        END
+    """,
+    'sales_sale_fts_product_rename': f"""
+        CREATE TRIGGER sales_sale_fts_product_rename AFTER UPDATE OF name ON inventory_product
+        WHEN new.name IS NOT old.name BEGIN
+            UPDATE {FTS_TABLE} SET product_name = new.name
+            WHERE rowid IN (SELECT id FROM sales_sale WHERE product_id = new.id);
+        END
+    """,
+}
+
+REBUILD = f"""
+    INSERT INTO {FTS_TABLE} (rowid, product_name, customer_name, notes)
+    SELECT s.id, p.name, coalesce(s.customer_name, ''), coalesce(s.notes, '')
+    FROM sales_sale s JOIN inventory_product p ON p.id = s.product_id
+"""
+
+
+def fts_available(using='default'):
+    """Whether the sales FTS5 table exists on the given database"""
+    return fts_table_exists(FTS_TABLE, using)
+
+
+def search_sales(queryset, query):
+    """
+    Filter a Sale queryset to sales matching ``query``.
+    
+    With FTS5 the queryset is annotated with ``search_rank`` (lower is
+    better) for ordering; otherwise it is filtered with the original
+    ``icontains`` lookups and left unannotated.
+    """
+    expression = prefix_match_expression(query)
+    if not expression or not fts_available(queryset.db):
+        return queryset.filter(
+            Q(product__name__icontains=query) |
+            Q(customer_name__icontains=query) |
+            Q(notes__icontains=query)
+        )
+    
+    matches = RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [expression])
+    rank = RawSQL(
+        f'SELECT rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = sales_sale.id',
+        [expression],
+    )
+    return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+
+def restore_search_index(sender, using='default', verbosity=1, **kwargs):
+    """post_migrate handler recreating dropped index triggers and reindexing the sales"""
+    restored = restore_triggers(FTS_TABLE, TRIGGERS, REBUILD, using)
+    if restored and verbosity >= 1:
+        print(f"  Restored sales search triggers: {', '.join(restored)}")
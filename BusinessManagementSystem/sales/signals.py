@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import Signal, receiver
+from .models import OrderLine, ProductSalesStats, Sale
+
+
+# Sent after a batch of sales written with bulk_create has been committed.
+# Bulk inserts skip post_save, so listeners get the new Sale rows here.
+# Arguments: sales (list of Sale)
+sales_batch_recorded = Signal()
+
+
+@receiver(pre_delete, sender=Sale, dispatch_uid='sales_sale_deleting')
+@receiver(pre_delete, sender=OrderLine, dispatch_uid='sales_order_line_deleting')
+def sale_deleting(sender, instance, **kwargs):
+    # Sent for every row, including queryset deletes and the cascades from
+    # Product and Order, which never call Sale.delete. Runs in the delete's
+    # transaction before any row is removed.
+    instance.update_aggregates(sign=-1)
+
+
+@receiver(post_delete, sender=Sale, dispatch_uid='sales_sale_deleted')
+@receiver(post_delete, sender=OrderLine, dispatch_uid='sales_order_line_deleted')
+def sale_deleted(sender, instance, **kwargs):
+    # The product's latest sale time has to be read from the sales left
+    ProductSalesStats.refresh_last_sold_at(instance.product_id, instance.date_sold)
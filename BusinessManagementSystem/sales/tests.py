@@ -1,3 +1,733 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+import io
+import random
+import threading
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.db import connection, connections
+from django.core.management import CommandError, call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db.models import Count, Sum
+from django.http import Http404
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from dashboard.cache import bump_data_version, get_cache
+from inventory import search as product_search
+from inventory.models import Product
+from BusinessManagementSystem.pagination import CachedCountPaginator, estimate_row_count, query_signature
+from .models import DailySalesCumulative, DailySalesRollup, ProductSalesStats, Sale, Order
+from .batch import SalesBatchError, record_sales_batch
+from . import search as sales_search
+from .search import search_sales
+from .utils import date_range_filter
+from .views import OrderCreateView, SaleListView, SalesHistoryView
 
-# Create your tests here.
+
+class DateRangeIndexTests(TestCase):
+    """Date range filters on Sale.date_sold must stay on an index."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = Product.objects.create(
+            name='Widget',
+            category='other',
+            buying_price=Decimal('5.00'),
+            selling_price=Decimal('8.00'),
+            quantity=100,
+            supplier='Acme',
+        )
+        Sale.objects.create(product=cls.product, quantity_sold=2)
+    
+    def query_plan(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return ' '.join(row[-1] for row in cursor.fetchall())
+    
+    def assertUsesIndex(self, queryset, index_name):
+        plan = self.query_plan(*queryset.query.sql_with_params())
+        self.assertRegex(plan, rf'SEARCH sales_sale USING (COVERING )?INDEX {index_name}\b')
+    
+    def test_filter_uses_half_open_range(self):
+        today = timezone.localdate()
+        filters = date_range_filter(today, today)
+        self.assertEqual(filters['date_sold__lt'] - filters['date_sold__gte'], timedelta(days=1))
+        self.assertEqual(Sale.objects.filter(**filters).count(), 1)
+        self.assertEqual(Sale.objects.filter(**date_range_filter(end_date=today - timedelta(days=1))).count(), 0)
+    
+    def test_date_range_uses_date_sold_index(self):
+        today = timezone.localdate()
+        queryset = Sale.objects.filter(**date_range_filter(today - timedelta(days=30), today))
+        self.assertUsesIndex(queryset, 'sale_date_sold_idx')
+    
+    def test_product_and_date_range_uses_composite_index(self):
+        today = timezone.localdate()
+        queryset = Sale.objects.filter(
+            product=self.product, **date_range_filter(today - timedelta(days=7), today))
+        self.assertUsesIndex(queryset, 'sale_product_date_sold_idx')
+    
+    def test_sales_summary_datetime_range_uses_index(self):
+        now = timezone.now()
+        with CaptureQueriesContext(connection) as ctx:
+            summary = Sale.get_sales_summary(now - timedelta(hours=1), now)
+        self.assertEqual(summary['total_transactions'], 1)
+        self.assertEqual(summary['total_sales'], Decimal('16.00'))
+        plan = self.query_plan(ctx.captured_queries[-1]['sql'])
+        self.assertRegex(plan, r'SEARCH sales_sale USING (COVERING )?INDEX sale_date_sold_idx\b')
+
+
+
+class DailySalesCumulativeTests(TestCase):
+    """Range totals from the running daily totals match brute-force sums."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(
+                name=f'Item {i}',
+                category='other',
+                buying_price=Decimal('1.25') * (i + 1),
+                selling_price=Decimal('2.99') * (i + 1),
+                quantity=10000,
+                supplier='Acme',
+            )
+            for i in range(3)
+        ]
+    
+    def sell(self, days_ago, **kwargs):
+        """Record a sale through Sale.save as if it happened ``days_ago`` days ago"""
+        sold_at = timezone.now() - timedelta(days=days_ago)
+        with mock.patch('django.utils.timezone.now', return_value=sold_at):
+            return Sale.objects.create(**kwargs)
+    
+    def brute_force(self, start_date, end_date):
+        totals = Sale.objects.filter(**date_range_filter(start_date, end_date)).aggregate(
+            revenue=Sum('total_cost'), profit=Sum('profit'), units=Sum('quantity_sold'), transactions=Count('id'))
+        # SQLite sums decimals as floats, so compare to the cent
+        cents = Decimal('0.01')
+        return {
+            'total_sales': (totals['revenue'] or Decimal('0')).quantize(cents),
+            'total_profit': (totals['profit'] or Decimal('0')).quantize(cents),
+            'total_units': totals['units'] or 0,
+            'total_transactions': totals['transactions'],
+        }
+    
+    def test_random_ranges_match_brute_force(self):
+        rng = random.Random(18)
+        sales = []
+        # Appends, backdated sales, edits and deletes in random order
+        for _ in range(120):
+            action = rng.random()
+            if action < 0.75 or not sales:
+                sales.append(self.sell(rng.randint(0, 60), product=rng.choice(self.products),
+                                       quantity_sold=rng.randint(1, 5)))
+            elif action < 0.9:
+                sale = rng.choice(sales)
+                sale.quantity_sold = rng.randint(1, 5)
+                sale.save()
+            else:
+                sales.remove(sale := rng.choice(sales))
+                sale.delete()
+        record_sales_batch([{'product': self.products[0].pk, 'quantity': 2}] * 3)
+        
+        today = timezone.localdate()
+        for _ in range(200):
+            start = today - timedelta(days=rng.randint(-2, 65)) if rng.random() > 0.1 else None
+            end = today - timedelta(days=rng.randint(-2, 65)) if rng.random() > 0.1 else None
+            if start and end and start > end:
+                start, end = end, start
+            self.assertEqual(Sale.get_sales_summary(start, end), self.brute_force(start, end), (start, end))
+        
+        # Incremental maintenance agrees with a rebuild on every day's running totals
+        # (a day whose sales were all deleted keeps a row equal to the day before)
+        incremental = list(DailySalesCumulative.objects.values('date', *DailySalesCumulative.TOTALS))
+        DailySalesCumulative.rebuild()
+        for row in incremental:
+            self.assertEqual(DailySalesCumulative.totals_through(row.pop('date')), row)
+    
+    def assertMatchesRebuild(self):
+        incremental = {row.pop('date'): row for row in
+                       DailySalesCumulative.objects.values('date', *DailySalesCumulative.TOTALS)}
+        DailySalesCumulative.rebuild()
+        for day, totals in incremental.items():
+            self.assertEqual(DailySalesCumulative.totals_through(day), totals, day)
+        self.assertEqual(Sale.get_sales_summary(), self.brute_force(None, None))
+    
+    def test_queryset_delete_reverses_the_running_totals(self):
+        for days_ago in (9, 5, 5, 1):
+            self.sell(days_ago, product=self.products[0], quantity_sold=2)
+        self.sell(3, product=self.products[1], quantity_sold=1)
+        Sale.objects.filter(product=self.products[0], date_sold__lt=timezone.now() - timedelta(days=2)).delete()
+        self.assertEqual(Sale.get_sales_summary()['total_transactions'], 2)
+        self.assertMatchesRebuild()
+    
+    def test_product_delete_reverses_the_running_totals(self):
+        for days_ago in (8, 4, 0):
+            self.sell(days_ago, product=self.products[2], quantity_sold=3)
+            self.sell(days_ago, product=self.products[1], quantity_sold=1)
+        self.products[2].delete()
+        self.assertEqual(Sale.get_sales_summary()['total_transactions'], 3)
+        self.assertMatchesRebuild()
+    
+    def test_order_delete_reverses_the_running_totals(self):
+        self.sell(6, product=self.products[0], quantity_sold=1)
+        order = Order.create_with_lines([
+            {'product': self.products[0].pk, 'quantity': 2},
+            {'product': self.products[1].pk, 'quantity': 4},
+        ])
+        order.delete()
+        self.assertEqual(Sale.get_sales_summary()['total_transactions'], 1)
+        self.assertMatchesRebuild()
+    
+    def test_range_is_two_lookups(self):
+        for days_ago in (40, 20, 3, 0):
+            self.sell(days_ago, product=self.products[1], quantity_sold=1)
+        today = timezone.localdate()
+        with self.assertNumQueries(2):
+            summary = Sale.get_sales_summary(today - timedelta(days=30), today - timedelta(days=1))
+        self.assertEqual(summary['total_transactions'], 2)
+        self.assertEqual(summary['total_sales'], Decimal('11.96'))
+        with self.assertNumQueries(1):
+            self.assertEqual(Sale.get_sales_summary()['total_transactions'], 4)
+
+
+class ProductSalesStatsTests(TestCase):
+    """Per-product counters follow every write and delete path and pass check_product_stats."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(
+                name=f'Item {i}',
+                category='other',
+                buying_price=Decimal('1.50'),
+                selling_price=Decimal('4.00') + i,
+                quantity=1000,
+                supplier='Acme',
+            )
+            for i in range(3)
+        ]
+    
+    def sell(self, days_ago, product, quantity=1):
+        sold_at = timezone.now() - timedelta(days=days_ago)
+        with mock.patch('django.utils.timezone.now', return_value=sold_at):
+            return Sale.objects.create(product=product, quantity_sold=quantity)
+    
+    def assertConsistent(self):
+        fields = ['units', 'revenue', 'profit', 'transactions', 'last_sold_at']
+        stored = {row.pop('product_id'): row for row in
+                  ProductSalesStats.objects.filter(transactions__gt=0).values('product_id', *fields)}
+        expected = {stats.product_id: {field: getattr(stats, field) for field in fields}
+                    for stats in ProductSalesStats.compute_from_sales()}
+        self.assertEqual(stored, expected)
+        call_command('check_product_stats', stdout=io.StringIO())
+    
+    def test_counters_and_leaderboards(self):
+        for days_ago, product, quantity in [(5, 0, 2), (3, 1, 6), (1, 0, 3), (0, 2, 1)]:
+            self.sell(days_ago, self.products[product], quantity)
+        record_sales_batch([{'product': self.products[2].pk, 'quantity': 1}])
+        self.assertConsistent()
+        
+        top = Sale.get_top_selling_products()
+        self.assertEqual([(row['product__id'], row['total_quantity']) for row in top],
+                         [(self.products[1].pk, 6), (self.products[0].pk, 5), (self.products[2].pk, 2)])
+        profitable = Sale.get_most_profitable_products(limit=1)
+        self.assertEqual([row['total_profit'] for row in profitable], [Decimal('21.00')])
+    
+    def test_deleting_the_latest_sale_rolls_last_sold_at_back(self):
+        earlier = self.sell(4, self.products[0])
+        latest = self.sell(1, self.products[0])
+        latest.delete()
+        stats = ProductSalesStats.objects.get(product=self.products[0])
+        self.assertEqual((stats.transactions, stats.last_sold_at), (1, earlier.date_sold))
+        
+        earlier.delete()
+        stats.refresh_from_db()
+        self.assertEqual((stats.transactions, stats.last_sold_at), (0, None))
+        self.assertConsistent()
+    
+    def test_queryset_product_and_order_deletes(self):
+        for days_ago in (6, 4, 2, 0):
+            self.sell(days_ago, self.products[0], 2)
+            self.sell(days_ago, self.products[1])
+        order = Order.create_with_lines([{'product': self.products[1].pk, 'quantity': 3},
+                                         {'product': self.products[2].pk, 'quantity': 1}])
+        
+        Sale.objects.filter(product=self.products[0], date_sold__gte=timezone.now() - timedelta(days=3)).delete()
+        self.assertConsistent()
+        order.delete()
+        self.assertConsistent()
+        self.products[1].delete()
+        self.assertConsistent()
+        self.assertFalse(ProductSalesStats.objects.filter(product_id=self.products[1].pk).exists())
+    
+    def test_check_command_fails_on_drift_and_rebuild_fixes_it(self):
+        self.sell(2, self.products[0], 4)
+        self.sell(0, self.products[1])
+        ProductSalesStats.objects.filter(product=self.products[0]).update(units=1)
+        ProductSalesStats.objects.filter(product=self.products[1]).delete()
+        
+        output = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '2 mismatches found'):
+            call_command('check_product_stats', stdout=output)
+        self.assertIn(f'Product {self.products[0].pk}: units is 1, expected 4', output.getvalue())
+        self.assertIn(f'Product {self.products[1].pk}: missing counters', output.getvalue())
+        
+        call_command('check_product_stats', rebuild=True, stdout=io.StringIO())
+        self.assertConsistent()
+
+
+class CursorPaginationTests(TestCase):
+    """Cursor pages walk the full ordering, ties included, without OFFSET or COUNT."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        product = Product.objects.create(
+            name='Widget',
+            category='other',
+            buying_price=Decimal('5.00'),
+            selling_price=Decimal('8.00'),
+            quantity=100,
+            supplier='Acme',
+        )
+        for _ in range(45):
+            Sale.objects.create(product=product, quantity_sold=1)
+        # Groups of three sales share a timestamp to exercise the id tie-breaker
+        now = timezone.now()
+        for index, sale in enumerate(Sale.objects.order_by('id')):
+            Sale.objects.filter(pk=sale.pk).update(date_sold=now + timedelta(seconds=index // 3))
+        cls.expected = list(Sale.objects.order_by('-date_sold', '-id').values_list('id', flat=True))
+    
+    def setUp(self):
+        # Page counts are cached per data version, which TestCase never bumps
+        get_cache().clear()
+    
+    def get_page(self, **params):
+        view = SaleListView()
+        view.setup(RequestFactory().get('/sales/', params))
+        view.object_list = view.get_queryset()
+        return view.get_context_data()
+    
+    def test_next_and_previous_walk_every_row_once(self):
+        context = self.get_page(paginate='cursor')
+        self.assertTrue(context['cursor_paginated'])
+        pages = [context['page_obj']]
+        while pages[-1].has_next():
+            pages.append(self.get_page(cursor=pages[-1].next_cursor)['page_obj'])
+        
+        self.assertEqual(len(pages), 3)
+        self.assertFalse(pages[0].has_previous())
+        self.assertEqual([sale.id for page in pages for sale in page], self.expected)
+        
+        previous = self.get_page(cursor=pages[-1].previous_cursor)['page_obj']
+        self.assertEqual([sale.id for sale in previous], [sale.id for sale in pages[1]])
+        self.assertTrue(previous.has_next())
+        self.assertTrue(previous.has_previous())
+    
+    def test_deep_page_runs_one_query_without_offset_or_count(self):
+        first = self.get_page(paginate='cursor')['page_obj']
+        token = self.get_page(cursor=first.next_cursor)['page_obj'].next_cursor
+        with CaptureQueriesContext(connection) as ctx:
+            self.get_page(cursor=token)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        sql = ctx.captured_queries[0]['sql'].upper()
+        self.assertNotIn('OFFSET', sql)
+        self.assertNotIn('COUNT(', sql)
+    
+    def test_tampered_cursor_is_rejected(self):
+        with self.assertRaises(Http404):
+            self.get_page(cursor='not-a-token')
+    
+    def test_offset_pagination_is_still_the_default(self):
+        context = self.get_page()
+        self.assertFalse(context['cursor_paginated'])
+        self.assertEqual(context['paginator'].count, 45)
+        self.assertEqual(context['pagination_toggle_query'], 'paginate=cursor')
+
+
+class CachedCountPaginatorTests(TestCase):
+    """Page counts are cached per query and data version, or estimated for whole tables."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(username='pager', password='testpass123')
+        cls.products = [
+            Product.objects.create(
+                name=name, category='other', buying_price=Decimal('5.00'),
+                selling_price=Decimal('8.00'), quantity=100, supplier='Acme')
+            for name in ('Widget', 'Gadget')
+        ]
+        for product, count in zip(cls.products, (12, 3)):
+            for _ in range(count):
+                Sale.objects.create(product=product, quantity_sold=1)
+    
+    def setUp(self):
+        get_cache().clear()
+    
+    def count_queries(self, ctx):
+        return sum('COUNT(' in query['sql'].upper() for query in ctx.captured_queries)
+    
+    def test_filtered_count_is_cached_until_the_data_changes(self):
+        queryset = Sale.objects.filter(product=self.products[0]).order_by('-date_sold')
+        self.assertEqual(CachedCountPaginator(queryset, 5).count, 12)
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedCountPaginator(queryset.order_by('id'), 5).num_pages, 3)
+        
+        other = Sale.objects.filter(product=self.products[1])
+        self.assertNotEqual(query_signature(queryset), query_signature(other))
+        self.assertEqual(CachedCountPaginator(other, 5).count, 3)
+        
+        Sale.objects.create(product=self.products[0], quantity_sold=1)
+        bump_data_version()  # sent on commit outside tests
+        self.assertEqual(CachedCountPaginator(queryset, 5).count, 13)
+    
+    def test_large_unfiltered_tables_use_the_estimate(self):
+        view = SaleListView()
+        view.setup(RequestFactory().get('/sales/'))
+        view.object_list = view.get_queryset()
+        with mock.patch('BusinessManagementSystem.pagination.ESTIMATE_THRESHOLD', 10):
+            with CaptureQueriesContext(connection) as ctx:
+                paginator = view.get_context_data()['paginator']
+        self.assertTrue(paginator.count_is_estimate)
+        self.assertEqual(paginator.count, 15)
+        self.assertEqual(self.count_queries(ctx), 0)
+        
+        # Small tables and filtered lists are counted exactly
+        exact = CachedCountPaginator(Sale.objects.all(), 5)
+        self.assertEqual(exact.count, 15)
+        self.assertFalse(exact.count_is_estimate)
+        filtered = CachedCountPaginator(Sale.objects.filter(product=self.products[1]), 5)
+        with mock.patch('BusinessManagementSystem.pagination.ESTIMATE_THRESHOLD', 10):
+            self.assertEqual(filtered.count, 3)
+        self.assertFalse(filtered.count_is_estimate)
+    
+    def test_estimate_inflated_by_deleted_rows_is_counted(self):
+        ids = list(Sale.objects.order_by('id').values_list('id', flat=True))
+        # Keep the first and last rowids so the SQLite estimate stays at 15
+        Sale.objects.filter(id__in=ids[1:11]).delete()
+        self.assertEqual(estimate_row_count(Sale), 15)
+        with mock.patch('BusinessManagementSystem.pagination.ESTIMATE_THRESHOLD', 10):
+            paginator = CachedCountPaginator(Sale.objects.all(), 5)
+            self.assertEqual(paginator.count, 5)
+        self.assertFalse(paginator.count_is_estimate)
+    
+    def test_admin_changelist_reuses_the_count(self):
+        self.client.force_login(self.user)
+        url = reverse('admin:sales_sale_changelist')
+        params = {'product__category__exact': 'other', 'q': 'Widget'}
+        self.client.get(url, params)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.context['cl'].result_count, 12)
+        self.assertEqual(self.count_queries(ctx), 0)
+
+
+class SalesHistoryQueryTests(TestCase):
+    """The history view filters once and summarises and counts in one aggregate."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(
+                name=name,
+                category='other',
+                buying_price=Decimal('5.00'),
+                selling_price=Decimal('8.00'),
+                quantity=100,
+                supplier='Acme',
+            )
+            for name in ('Widget', 'Gadget')
+        ]
+        for product in cls.products:
+            for _ in range(30):
+                Sale.objects.create(product=product, quantity_sold=1)
+    
+    def setUp(self):
+        # Product options are cached per data version, which TestCase never bumps
+        get_cache().clear()
+    
+    def get_context(self, **params):
+        view = SalesHistoryView()
+        view.setup(RequestFactory().get('/sales/history/', params))
+        view.object_list = view.get_queryset()
+        return view.get_context_data()
+    
+    def test_filtered_page_costs_two_queries(self):
+        self.get_context()  # caches the product filter options
+        params = {'product': self.products[0].pk, 'start_date': timezone.localdate().isoformat()}
+        with CaptureQueriesContext(connection) as ctx:
+            context = self.get_context(**params)
+            self.assertEqual(len(context['sales']), 30)
+        
+        # One aggregate for summary and paginator count, one for the page rows
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertEqual(context['summary']['total_transactions'], 30)
+        self.assertEqual(context['summary']['total_sales'], Decimal('240.00'))
+        self.assertEqual(context['summary']['total_profit'], Decimal('90.00'))
+        self.assertEqual(context['paginator'].count, 30)
+        self.assertEqual(
+            [product['name'] for product in context['products']], ['Gadget', 'Widget'])
+    
+    def test_empty_filter_summary_is_zero(self):
+        context = self.get_context(search='no such sale')
+        self.assertEqual(context['summary']['total_sales'], 0)
+        self.assertEqual(context['summary']['total_transactions'], 0)
+        self.assertEqual(context['paginator'].count, 0)
+
+
+class SalesSearchTests(TestCase):
+    """Sales search uses the FTS5 index with prefix matching and falls back to icontains."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.widget = Product.objects.create(
+            name='Blue Widget',
+            category='other',
+            buying_price=Decimal('5.00'),
+            selling_price=Decimal('8.00'),
+            quantity=100,
+            supplier='Acme',
+        )
+        cls.gadget = Product.objects.create(
+            name='Gadget',
+            category='other',
+            buying_price=Decimal('5.00'),
+            selling_price=Decimal('8.00'),
+            quantity=100,
+            supplier='Acme',
+        )
+        cls.widget_sale = Sale.objects.create(product=cls.widget, quantity_sold=1)
+        cls.customer_sale = Sale.objects.create(
+            product=cls.gadget, quantity_sold=1, customer_name='Widgetworks Ltd')
+        cls.noted_sale = Sale.objects.create(
+            product=cls.gadget, quantity_sold=1, notes='gift wrapped')
+    
+    def search(self, query):
+        return list(search_sales(Sale.objects.all(), query).order_by('search_rank', '-id'))
+    
+    def test_prefix_matches_across_fields(self):
+        self.assertEqual(set(self.search('widg')), {self.widget_sale, self.customer_sale})
+        self.assertEqual(self.search('wrap'), [self.noted_sale])
+        self.assertEqual(self.search('blue widg'), [self.widget_sale])
+    
+    def test_operators_in_user_input_are_literal(self):
+        self.assertEqual(self.search('widget" OR gadget*'), [])
+        self.assertEqual(self.search('NOT'), [])
+    
+    def test_index_follows_edits_renames_and_deletes(self):
+        Sale.objects.filter(pk=self.noted_sale.pk).update(notes='express delivery')
+        self.assertEqual(self.search('gift'), [])
+        self.assertEqual(self.search('expr'), [self.noted_sale])
+        
+        Product.objects.filter(pk=self.widget.pk).update(name='Red Sprocket')
+        self.assertEqual(self.search('sprock'), [self.widget_sale])
+        
+        self.widget_sale.delete()
+        self.assertEqual(self.search('sprock'), [])
+    
+    def test_falls_back_to_icontains_without_fts(self):
+        with mock.patch('sales.search.fts_available', return_value=False):
+            queryset = search_sales(Sale.objects.all(), 'idgetwor')
+            self.assertNotIn('search_rank', queryset.query.annotations)
+            self.assertEqual(list(queryset), [self.customer_sale])
+    
+    def stored_triggers(self, names):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")
+            return {name: ' '.join(sql.split()) for name, sql in cursor.fetchall() if name in names}
+    
+    def test_restored_triggers_match_the_migrations(self):
+        for triggers in [sales_search.TRIGGERS, *(product_search.search_triggers(table) for table in
+                                                  (product_search.PREFIX_TABLE, product_search.TRIGRAM_TABLE))]:
+            expected = {name: ' '.join(sql.split()) for name, sql in triggers.items()}
+            self.assertEqual(self.stored_triggers(triggers), expected)
+    
+    def test_migrate_restores_dropped_triggers_and_reindexes(self):
+        # What SQLite does to the triggers when a migration remakes the tables
+        with connection.cursor() as cursor:
+            for name in [*sales_search.TRIGGERS, 'inventory_product_fts_insert']:
+                cursor.execute(f'DROP TRIGGER {name}')
+        missed = Sale.objects.create(product=self.gadget, quantity_sold=1, customer_name='Unindexed Co')
+        Product.objects.create(name='Sprocket', category='other', buying_price=Decimal('1.00'),
+                               selling_price=Decimal('2.00'), quantity=1, supplier='Acme')
+        self.assertEqual(self.search('unindexed'), [])
+        
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+        self.assertEqual(self.search('unindexed'), [missed])
+        self.assertEqual(len(self.stored_triggers(sales_search.TRIGGERS)), 4)
+        self.assertEqual([product.name for product in product_search.search_products(Product.objects.all(), 'sprock')],
+                         ['Sprocket'])
+        added = Sale.objects.create(product=self.widget, quantity_sold=1, notes='after the restore')
+        self.assertEqual(self.search('restore'), [added])
+    
+    def test_history_search_keeps_rank_order_in_cursor_mode(self):
+        request = RequestFactory().get(reverse('sales:sales_history'), {'search': 'widg', 'paginate': 'cursor'})
+        request.user = User.objects.create_user('searcher', password='secret')
+        view = SalesHistoryView(request=request, kwargs={})
+        self.assertFalse(view.use_cursor_pagination())
+        self.assertEqual(list(view.get_queryset()), self.search('widg'))
+
+
+class OrderTests(TestCase):
+    """A basket is recorded in one transaction with a fixed query count."""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = [
+            Product.objects.create(
+                name=f'Item {i}',
+                category='other',
+                buying_price=Decimal('2.00'),
+                selling_price=Decimal('3.00'),
+                quantity=10,
+                supplier='Acme',
+            )
+            for i in range(6)
+        ]
+    
+    def basket(self, size):
+        return [{'product': product.pk, 'quantity': 2} for product in self.products[:size]]
+    
+    def test_query_count_does_not_grow_with_lines(self):
+        # Create the aggregate rows first so both baskets take the update path
+        Order.create_with_lines(self.basket(6))
+        with CaptureQueriesContext(connection) as small:
+            Order.create_with_lines(self.basket(2))
+        with CaptureQueriesContext(connection) as large:
+            order = Order.create_with_lines(self.basket(6), customer_name='Jane')
+        
+        self.assertEqual(len(large.captured_queries), len(small.captured_queries))
+        self.assertEqual(order.lines.count(), 6)
+        self.assertEqual(order.total_cost, Decimal('36.00'))
+        self.assertEqual(order.profit, Decimal('12.00'))
+        self.assertEqual(set(order.lines.values_list('customer_name', flat=True)), {'Jane'})
+        self.products[5].refresh_from_db()
+        self.assertEqual(self.products[5].quantity, 6)
+    
+    def test_rejected_basket_writes_nothing(self):
+        basket = self.basket(2) + [{'product': self.products[0].pk, 'quantity': 9}]
+        with self.assertRaises(SalesBatchError) as raised:
+            Order.create_with_lines(basket)
+        
+        self.assertEqual([error['line'] for error in raised.exception.errors], [1, 3])
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(Sale.objects.exists())
+        self.products[0].refresh_from_db()
+        self.assertEqual(self.products[0].quantity, 10)
+    
+    def test_errors_name_the_formset_line(self):
+        user = User.objects.create_user('cashier', password='pw')
+        data = {
+            'lines-TOTAL_FORMS': '4', 'lines-INITIAL_FORMS': '0',
+            'lines-MIN_NUM_FORMS': '1', 'lines-MAX_NUM_FORMS': '1000',
+            # The second form is left blank
+            'lines-0-product': str(self.products[1].pk), 'lines-0-quantity': '1',
+            'lines-2-product': str(self.products[0].pk), 'lines-2-quantity': '11',
+        }
+        request = RequestFactory().post(reverse('sales:order_add'), data)
+        request.user = user
+        response = OrderCreateView.as_view()(request)
+        
+        errors = response.context_data['form'].non_field_errors()
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith('Line 3: '), errors)
+        self.assertFalse(Order.objects.exists())
+    
+    def assertAggregatesMatchSales(self):
+        rollup_fields = ['date', 'product_id', 'revenue', 'profit', 'units', 'transactions']
+        rollup = set(DailySalesRollup.objects.exclude(transactions=0).values_list(*rollup_fields))
+        cumulative = list(DailySalesCumulative.objects.values('date', *DailySalesCumulative.TOTALS))
+        DailySalesRollup.rebuild()
+        self.assertEqual(rollup, set(DailySalesRollup.objects.values_list(*rollup_fields)))
+        for row in cumulative:
+            self.assertEqual(DailySalesCumulative.totals_through(row.pop('date')), row)
+        call_command('check_product_stats', stdout=io.StringIO())
+    
+    def test_admin_deletes_keep_the_aggregates(self):
+        admin_user = User.objects.create_superuser('admin', password='pw')
+        self.client.force_login(admin_user)
+        first = Order.create_with_lines(self.basket(3))
+        second = Order.create_with_lines(self.basket(2))
+        for product in self.products[3:]:
+            Sale.objects.create(product=product, quantity_sold=1)
+        
+        response = self.client.post(reverse('admin:sales_order_delete', args=[first.pk]), {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Sale.objects.filter(order_id=first.pk).exists())
+        self.assertAggregatesMatchSales()
+        
+        selected = list(second.lines.values_list('pk', flat=True)[:1]) + [Sale.objects.filter(order=None).first().pk]
+        response = self.client.post(reverse('admin:sales_sale_changelist'), {
+            'action': 'delete_selected', '_selected_action': selected, 'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Sale.objects.count(), 3)
+        self.assertAggregatesMatchSales()
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Concurrent sales must never sell more stock than exists."""
+    
+    threads = 8
+    attempts_per_thread = 10
+    initial_stock = 50
+    
+    def test_concurrent_sales_do_not_oversell(self):
+        product = Product.objects.create(
+            name='Hot Item',
+            category='other',
+            buying_price=Decimal('5.00'),
+            selling_price=Decimal('8.00'),
+            quantity=self.initial_stock,
+            supplier='Acme',
+        )
+        results = {'sold': 0, 'rejected': 0}
+        lock = threading.Lock()
+        start = threading.Barrier(self.threads)
+        
+        def checkout():
+            start.wait()
+            try:
+                for _ in range(self.attempts_per_thread):
+                    # Each sale loads its own (soon stale) copy of the product
+                    sale = Sale(product=Product.objects.get(pk=product.pk), quantity_sold=1)
+                    try:
+                        sale.save()
+                        outcome = 'sold'
+                    except ValueError:
+                        outcome = 'rejected'
+                    with lock:
+                        results[outcome] += 1
+            finally:
+                connections.close_all()
+        
+        workers = [threading.Thread(target=checkout) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        
+        product.refresh_from_db()
+        self.assertEqual(results['sold'], self.initial_stock)
+        self.assertEqual(results['rejected'], self.threads * self.attempts_per_thread - self.initial_stock)
+        self.assertEqual(product.quantity, 0)
+        self.assertEqual(Sale.objects.filter(product=product).count(), self.initial_stock)
+    
+    def test_stress_command_leaves_the_aggregates_as_it_found_them(self):
+        product = Product.objects.create(
+            name='Regular Item',
+            category='other',
+            buying_price=Decimal('2.00'),
+            selling_price=Decimal('3.50'),
+            quantity=20,
+            supplier='Acme',
+        )
+        Sale.objects.create(product=product, quantity_sold=3)
+        before = Sale.get_sales_summary()
+        
+        call_command('stress_checkout', threads=2, attempts=5, stock=6, stdout=io.StringIO())
+        
+        self.assertEqual(Sale.get_sales_summary(), before)
+        self.assertEqual(Sale.get_sales_summary(timezone.localdate(), timezone.localdate()), before)
+        self.assertEqual(list(Product.objects.values_list('name', flat=True)), ['Regular Item'])
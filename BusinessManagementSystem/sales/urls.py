@@ -6,6 +6,8 @@ app_name = 'sales'
 urlpatterns = [
     path('', views.SaleListView.as_view(), name='sale_list'),
     path('add/', views.SaleCreateView.as_view(), name='sale_add'),
+    path('order/add/', views.OrderCreateView.as_view(), name='order_add'),
     path('<int:pk>/', views.SaleDetailView.as_view(), name='sale_detail'),
+    path('api/batch/', views.sales_batch_api, name='sales_batch_api'),
     path('history/', views.SalesHistoryView.as_view(), name='sales_history'),
 ]
\ No newline at end of file
@@ -0,0 +1,45 @@
+from datetime import datetime, time, timedelta
+from django.utils import timezone
+
+
+def local_day_start(day):
+    """Return the timezone-aware datetime at local midnight of a calendar day"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def local_date_range(start_date=None, end_date=None):
+    """
+    Turn inclusive local calendar dates into a half-open datetime range.
+    
+    Returns ``(start, end)`` where ``start`` is local midnight of
+    ``start_date`` and ``end`` is local midnight of the day after
+    ``end_date``. Either bound is None when the matching date is None.
+    """
+    start = local_day_start(start_date) if start_date else None
+    end = local_day_start(end_date + timedelta(days=1)) if end_date else None
+    return start, end
+
+
+def date_range_filter(start_date=None, end_date=None, field='date_sold'):
+    """
+    Build index-friendly filter kwargs for a date range on a datetime field.
+    
+    Plain dates are treated as whole local calendar days and become
+    ``field >= start`` / ``field < end`` comparisons on the raw column,
+    instead of ``__date`` lookups that wrap it in a cast. Datetimes are
+    used as given, with an inclusive upper bound.
+    """
+    filters = {}
+    
+    if start_date:
+        if not isinstance(start_date, datetime):
+            start_date = local_day_start(start_date)
+        filters[f'{field}__gte'] = start_date
+    
+    if end_date:
+        if isinstance(end_date, datetime):
+            filters[f'{field}__lte'] = end_date
+        else:
+            filters[f'{field}__lt'] = local_day_start(end_date + timedelta(days=1))
+    
+    return filters
@@ -1,21 +1,31 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
 from django.views.generic import ListView, DetailView, CreateView
 from django.urls import reverse_lazy
-from django.db.models import Q, Sum
+from django.db.models import Count, Sum
 from django.utils import timezone
 from datetime import datetime, timedelta
-from .models import Sale
-from .forms import SaleForm
+import json
+from .models import Sale, Order
+from .batch import SalesBatchError, record_sales_batch
+from .filters import filter_sales
+from .forms import SaleForm, OrderForm, OrderLineFormSet
 from inventory.models import Product
+from dashboard.cache import get_versioned
+from BusinessManagementSystem.pagination import CachedCountPaginator, CountedPaginator, CursorPaginationMixin
 
 
-class SaleListView(LoginRequiredMixin, ListView):
+class SaleListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = Sale
     template_name = 'sales/sale_list.html'
     context_object_name = 'sales'
     paginate_by = 20
+    paginator_class = CachedCountPaginator
+    cursor_ordering = ('-date_sold', '-id')
     
     def get_queryset(self):
         return Sale.objects.select_related('product', 'sold_by').order_by('-date_sold')
@@ -47,48 +57,98 @@ class SaleCreateView(LoginRequiredMixin, CreateView):
             return self.form_invalid(form)
 
 
-class SalesHistoryView(LoginRequiredMixin, ListView):
+class OrderCreateView(LoginRequiredMixin, CreateView):
+    """Record a whole basket of products as one order in a single transaction"""
+    model = Order
+    form_class = OrderForm
+    template_name = 'sales/order_form.html'
+    success_url = reverse_lazy('sales:sale_list')
+    
+    def get_line_formset(self):
+        # One query for the product choices shared by every line
+        product_choices = list(
+            Product.objects.filter(quantity__gt=0).order_by('name').values_list('id', 'name'))
+        data = self.request.POST if self.request.method == 'POST' else None
+        return OrderLineFormSet(data, prefix='lines', form_kwargs={'product_choices': product_choices})
+    
+    def get_context_data(self, **kwargs):
+        kwargs.setdefault('line_formset', self.get_line_formset())
+        return super().get_context_data(**kwargs)
+    
+    def post(self, request, *args, **kwargs):
+        self.object = None
+        form = self.get_form()
+        line_formset = self.get_line_formset()
+        if not (form.is_valid() and line_formset.is_valid()):
+            return self.render_to_response(self.get_context_data(form=form, line_formset=line_formset))
+        
+        # Blank forms are skipped, so remember each line's position in the formset
+        positions = []
+        lines = []
+        for position, line in enumerate(line_formset, start=1):
+            if line.has_changed():
+                positions.append(position)
+                lines.append({'product': line.cleaned_data['product'], 'quantity': line.cleaned_data['quantity']})
+        try:
+            self.object = Order.create_with_lines(
+                lines,
+                sold_by=request.user,
+                customer_name=form.cleaned_data['customer_name'],
+                notes=form.cleaned_data['notes'],
+            )
+        except SalesBatchError as e:
+            for error in e.errors:
+                for message in error['errors']:
+                    if error['line']:
+                        message = f"Line {positions[error['line'] - 1]}: {message}"
+                    form.add_error(None, message)
+            return self.render_to_response(self.get_context_data(form=form, line_formset=line_formset))
+        
+        messages.success(
+            request,
+            f'Order #{self.object.pk} recorded with {len(lines)} lines! '
+            f'Total: ${self.object.total_cost:.2f}, Profit: ${self.object.profit:.2f}'
+        )
+        return redirect(self.get_success_url())
+
+
+class SalesHistoryView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     model = Sale
     template_name = 'sales/sales_history.html'
     context_object_name = 'sales'
     paginate_by = 50
+    cursor_ordering = ('-date_sold', '-id')
+    
+    def use_cursor_pagination(self):
+        # Cursors follow the date order, which would discard the search ranking
+        return not self.request.GET.get('search') and super().use_cursor_pagination()
     
     def get_queryset(self):
-        queryset = Sale.objects.select_related('product', 'sold_by')
-        
-        # Date filtering
-        start_date = self.request.GET.get('start_date')
-        end_date = self.request.GET.get('end_date')
+        queryset = filter_sales(Sale.objects.select_related('product', 'sold_by'), self.request.GET)
         
-        if start_date:
-            try:
-                start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-                queryset = queryset.filter(date_sold__date__gte=start_date)
-            except ValueError:
-                pass
-        
-        if end_date:
-            try:
-                end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-                queryset = queryset.filter(date_sold__date__lte=end_date)
-            except ValueError:
-                pass
-        
-        # Product filtering
-        product_id = self.request.GET.get('product')
-        if product_id:
-            queryset = queryset.filter(product_id=product_id)
-        
-        # Search
-        search_query = self.request.GET.get('search')
-        if search_query:
-            queryset = queryset.filter(
-                Q(product__name__icontains=search_query) |
-                Q(customer_name__icontains=search_query) |
-                Q(notes__icontains=search_query)
+        # Best matches first when the search used the full-text index
+        if 'search_rank' in queryset.query.annotations:
+            return queryset.order_by('search_rank', '-date_sold', '-id')
+        return queryset.order_by('-date_sold', '-id')
+    
+    def get_summary(self):
+        """Totals, transaction count and row count of the filtered sales in one query"""
+        if not hasattr(self, '_summary'):
+            summary = self.object_list.aggregate(
+                total_sales=Sum('total_cost'),
+                total_profit=Sum('profit'),
+                total_transactions=Count('id'),
             )
-        
-        return queryset.order_by('-date_sold')
+            summary['total_sales'] = summary['total_sales'] or 0
+            summary['total_profit'] = summary['total_profit'] or 0
+            self._summary = summary
+        return self._summary
+    
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        # The summary aggregate already counted the rows
+        return CountedPaginator(
+            queryset, per_page, count=self.get_summary()['total_transactions'],
+            orphans=orphans, allow_empty_first_page=allow_empty_first_page, **kwargs)
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -99,15 +159,42 @@ class SalesHistoryView(LoginRequiredMixin, ListView):
         context['selected_product'] = self.request.GET.get('product', '')
         context['search_query'] = self.request.GET.get('search', '')
         
-        # Get products for filter
-        context['products'] = Product.objects.all().order_by('name')
+        # Product filter options, rebuilt only when sales or products change
+        context['products'] = get_versioned('product-filter-options', lambda: list(
+            Product.objects.order_by('name').values('id', 'name')))
         
-        # Calculate summary for filtered results
-        filtered_sales = self.get_queryset()
-        context['summary'] = filtered_sales.aggregate(
-            total_sales=Sum('total_cost') or 0,
-            total_profit=Sum('profit') or 0,
-            total_transactions=filtered_sales.count()
-        )
+        # Summary for filtered results, reusing the queryset built by get()
+        context['summary'] = self.get_summary()
         
         return context
+
+
+@login_required
+@require_POST
+def sales_batch_api(request):
+    """
+    API endpoint recording a batch of sales in one transaction.
+    
+    Expects a JSON body ``{"sales": [{"product": id, "quantity": n,
+    "customer_name": "...", "notes": "..."}, ...]}``. The whole batch is
+    rejected with per-line errors if any line is invalid.
+    """
+    try:
+        payload = json.loads(request.body)
+    except (TypeError, ValueError):
+        return JsonResponse({'error': 'Request body must be valid JSON'}, status=400)
+    
+    lines = payload.get('sales') if isinstance(payload, dict) else payload
+    if not isinstance(lines, list):
+        return JsonResponse({'error': "Expected a list of sales under 'sales'"}, status=400)
+    
+    try:
+        sales = record_sales_batch(lines, sold_by=request.user)
+    except SalesBatchError as e:
+        return JsonResponse({'error': str(e), 'errors': e.errors}, status=400)
+    
+    return JsonResponse({
+        'created': len(sales),
+        'total_sales': sum(sale.total_cost for sale in sales),
+        'total_profit': sum(sale.profit for sale in sales),
+    }, status=201)
@@ -19,7 +19,7 @@ def test_system():
     print(f'Users: {User.objects.count()}')
     print(f'Products: {Product.objects.count()}')
     print(f'Sales: {Sale.objects.count()}')
-    print(f'Low Stock Products: {Product.objects.filter(quantity__lte=5).count()}')
+    print(f'Low Stock Products: {Product.needing_reorder().count()}')
 
     # Test calculations
     if Product.objects.exists():